@@ -0,0 +1,85 @@
+"""Benchmark: Project model validation vs the fast payload path.
+
+Usage: python bench_validation.py [--days 120] [--rows 40] [--repeat 5]
+
+Times what a save spends turning the request body into a storable dict:
+``Project`` validation plus ``model_dump()`` against ``parse_project``.
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+
+from server import Project  # noqa: E402
+from payloads import parse_project  # noqa: E402
+
+
+def build_payload(days: int, rows: int, with_ids: bool) -> bytes:
+    project = {
+        "name": "Benchmark Feature",
+        "notes": "Generated for bench_validation.py",
+        "days": [],
+        "calltimes": [],
+    }
+    for day_index in range(days):
+        day = {
+            "date": f"{(day_index % 28) + 1:02d}-{(day_index // 28) % 12 + 1:02d}-2030",
+            "position": day_index,
+            "rows": [],
+        }
+        for row_index in range(rows):
+            row = {
+                "type": "item" if row_index % 8 else "text",
+                "time": f"{8 + row_index // 4:02d}:{(row_index % 4) * 15:02d}",
+                "scene": f"{day_index}.{row_index}",
+                "location": "Studio B",
+                "cast": "Anna, Ben, Clara",
+                "notes": "Bring rain machine",
+            }
+            if with_ids:
+                row["id"] = f"row-{day_index}-{row_index}"
+            day["rows"].append(row)
+        if with_ids:
+            day["id"] = f"day-{day_index}"
+        project["days"].append(day)
+    return json.dumps(project).encode("utf-8")
+
+
+def model_path(body: bytes):
+    return Project.model_validate(json.loads(body)).model_dump()
+
+
+def fast_path(body: bytes):
+    return parse_project(body)
+
+
+def best_of(func, body: bytes, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(body)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--rows", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.days} days x {args.rows} rows = {args.days * args.rows} rows")
+    for with_ids in (True, False):
+        body = build_payload(args.days, args.rows, with_ids)
+        model = best_of(model_path, body, args.repeat)
+        fast = best_of(fast_path, body, args.repeat)
+        label = "client ids" if with_ids else "server ids"
+        print(f"{label:>10}: model {model * 1000:8.1f} ms   fast {fast * 1000:8.1f} ms   "
+              f"speedup {model / fast:5.2f}x   ({len(body) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Call times derived from the schedule.
+
+A person's call on a shoot day is their earliest scene that day minus a
+lead time. All days are processed in a single pass over the rows; the
+result uses the stored ``Calltime`` layout so it can be written straight
+into ``project.calltimes``.
+"""
+from typing import Dict, List
+import uuid
+
+from conflicts import format_minutes, parse_cast, parse_time_range, person_key
+
+
+def earliest_scenes(day: Dict) -> Dict[str, tuple]:
+    """Earliest start (minutes) per person on one day, keyed by normalised name"""
+    earliest = {}
+    for row in day.get('rows', []):
+        if row.get('type', 'item') != 'item':
+            continue
+        start, _ = parse_time_range(row.get('time', ''))
+        if start is None:
+            continue
+        for name in parse_cast(row.get('cast', '')):
+            key = person_key(name)
+            if key not in earliest:
+                earliest[key] = (name, start)
+            elif start < earliest[key][1]:
+                # Keep the spelling the name first appeared with
+                earliest[key] = (earliest[key][0], start)
+    return earliest
+
+
+def generate_calltimes(days: List[Dict], lead_minutes: int) -> List[Dict]:
+    """One generated calltime block per shoot day that has cast with times"""
+    calltimes = []
+    for day in days:
+        earliest = earliest_scenes(day)
+        if not earliest:
+            continue
+        calls = sorted(
+            (max(start - lead_minutes, 0), name)
+            for name, start in earliest.values()
+        )
+        calltimes.append({
+            "id": str(uuid.uuid4()),
+            "title": f"Calltime {day.get('date', '')}".strip(),
+            "headers": {"time": "Time", "name": "Name"},
+            "rows": [
+                {"id": str(uuid.uuid4()), "time": format_minutes(call), "name": name, "type": "item"}
+                for call, name in calls
+            ],
+            "position": 0,
+            "source_day_id": day.get('id'),
+        })
+    return calltimes
+
+
+def merge_calltimes(existing: List[Dict], generated: List[Dict]) -> List[Dict]:
+    """Replace previously generated blocks, keeping hand-written ones first"""
+    manual = [calltime for calltime in existing if not calltime.get('source_day_id')]
+    merged = manual + generated
+    for position, calltime in enumerate(merged):
+        calltime['position'] = position
+    return merged
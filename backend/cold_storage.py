@@ -0,0 +1,232 @@
+"""Cold storage tier for long-archived projects.
+
+Projects archived for longer than a configurable age are moved out of the
+``projects`` collection into ``projects_cold``. Each cold document keeps
+the listing fields uncompressed and the full project as compressed
+extended JSON (zstd when the ``zstandard`` package is installed, zlib
+otherwise), so the hot collection and its indexes only grow with live work.
+Cold projects are thawed back on demand. Freezing leaves a "cold" tombstone
+in the change log and thawing stamps a new change, so synced clients follow
+projects between the tiers. Cold projects stay in their workspace and count
+against its usage with the size they had when hot.
+
+Run a sweep from the command line with::
+
+    python cold_storage.py --older-than-days 180
+"""
+from bson import Binary, ObjectId, json_util
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import re
+import zlib
+
+from workspaces import ALL_WORKSPACES, DEFAULT_WORKSPACE, in_workspace, workspace_query
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the installation
+    zstandard = None
+
+# Fields kept readable on cold documents so listings never decompress
+LISTING_FIELDS = ("workspace", "name", "created_at", "updated_at", "archived_at", "logo_url")
+
+
+def compress(doc: Dict) -> Tuple[str, bytes]:
+    payload = json_util.dumps(doc).encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(payload)
+    return "zlib", zlib.compress(payload, 9)
+
+
+def decompress(codec: str, blob: bytes) -> Dict:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to thaw this project")
+        payload = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        payload = zlib.decompress(blob)
+    return json_util.loads(payload.decode("utf-8"))
+
+
+class ColdStorage:
+    """Cold projects of the active workspace; sweeps in ``ALL_WORKSPACES`` freeze every tenant's"""
+
+    def __init__(self, hot, cold, changes, usage=None):
+        self.hot = hot
+        self.cold = cold
+        self.changes = changes
+        self.usage = usage
+
+    async def ensure_indexes(self):
+        await self.cold.update_many(
+            {"workspace": {"$exists": False}}, {"$set": {"workspace": DEFAULT_WORKSPACE}}
+        )
+        await self.cold.create_index([("workspace", 1), ("name", 1)])
+        await self.cold.create_index([("workspace", 1), ("_id", -1)])
+        await self.hot.create_index([("archived", 1), ("archived_at", 1)])
+        await self.hot.create_index([("workspace", 1), ("archived", 1), ("archived_at", 1)])
+
+    async def freeze(self, project: Dict) -> bool:
+        """Move one project document into cold storage
+
+        Returns False, leaving the project hot, when it was written after ``project`` was read.
+        """
+        codec, blob = compress({key: value for key, value in project.items() if key != "_id"})
+        cold_doc = {field: project.get(field) for field in LISTING_FIELDS}
+        cold_doc.update({
+            "day_count": len(project.get("days", [])),
+            "project_size": project.get("size", 0),
+            "codec": codec,
+            "size": len(blob),
+            "blob": Binary(blob),
+            "frozen_at": datetime.now(),
+        })
+        # Write the cold copy first so an interrupted move never loses data
+        await self.cold.replace_one({"_id": project["_id"]}, cold_doc, upsert=True)
+        # Only the version that was copied may go; a save in between keeps the project hot
+        deleted = await self.hot.delete_one({
+            "_id": project["_id"],
+            "version": project.get("version"),
+            "change_seq": project.get("change_seq"),
+        })
+        if deleted.deleted_count == 0:
+            await self.cold.delete_one({"_id": project["_id"]})
+            return False
+        await self.changes.record_removal(
+            project["_id"], "cold", project.get("workspace", DEFAULT_WORKSPACE)
+        )
+        return True
+
+    async def thaw(self, project_id: ObjectId) -> Optional[Dict]:
+        """Move a project back into the hot collection; returns it or None"""
+        cold_doc = await self.cold.find_one(workspace_query({"_id": project_id}))
+        if cold_doc is None:
+            return None
+        project = decompress(cold_doc["codec"], cold_doc["blob"])
+        project["_id"] = project_id
+        # Restart the archive clock so the next sweep does not freeze it again at once
+        if project.get("archived"):
+            project["archived_at"] = datetime.now()
+        async with self.changes.stamp() as seq:
+            project["change_seq"] = seq
+            await self.hot.replace_one({"_id": project_id}, project, upsert=True)
+        await self.cold.delete_one({"_id": project_id})
+        await self.changes.forget_removal(project_id)
+        return project
+
+    async def thaw_by_name(self, name: str) -> Optional[Dict]:
+        cold_doc = await self.cold.find_one(workspace_query({"name": name}), {"_id": 1})
+        if cold_doc is None:
+            return None
+        return await self.thaw(cold_doc["_id"])
+
+    async def _release(self, cold_docs: List[Dict]):
+        """Tombstones and usage for deleted cold projects, per workspace"""
+        by_workspace: Dict[str, List[Dict]] = {}
+        for doc in cold_docs:
+            by_workspace.setdefault(doc["workspace"], []).append(doc)
+        for name, removed in by_workspace.items():
+            await self.changes.record_removals([doc["_id"] for doc in removed], "deleted", name)
+            if self.usage:
+                await self.usage.add(name, -len(removed), -sum(doc.get("project_size", 0) for doc in removed))
+
+    async def delete(self, project_id: ObjectId) -> bool:
+        return await self.delete_many([project_id]) > 0
+
+    async def find(self, project_ids: List[ObjectId], fields: Tuple[str, ...] = ()) -> List[Dict]:
+        """Cold listing documents of the given projects that are in cold storage"""
+        cursor = self.cold.find(
+            workspace_query({"_id": {"$in": project_ids}}), {"_id": 1, **{field: 1 for field in fields}}
+        )
+        return await cursor.to_list(length=None)
+
+    async def ids(self, name_contains: Optional[str] = None) -> List[ObjectId]:
+        """Ids of all cold projects, or those whose name contains a string (any case)"""
+        query = {"name": {"$regex": re.escape(name_contains), "$options": "i"}} if name_contains else {}
+        return [doc["_id"] async for doc in self.cold.find(workspace_query(query), {"_id": 1})]
+
+    async def delete_many(self, project_ids: List[ObjectId]) -> int:
+        cold_docs = await self.find(project_ids, ("workspace", "project_size"))
+        result = await self.cold.delete_many({"_id": {"$in": [doc["_id"] for doc in cold_docs]}})
+        await self._release(cold_docs)
+        return result.deleted_count
+
+    async def sweep(self, older_than: timedelta, limit: Optional[int] = None,
+                    progress: Optional[Callable[[int], Awaitable]] = None) -> Dict:
+        """Freeze every project archived for longer than ``older_than``
+
+        ``progress`` is awaited with the number of projects frozen so far.
+        """
+        now = datetime.now()
+        # Projects archived before archived_at was tracked start aging now
+        await self.hot.update_many(
+            workspace_query({"archived": True, "archived_at": None}),
+            {"$set": {"archived_at": now}}
+        )
+
+        cursor = self.hot.find(workspace_query({"archived": True, "archived_at": {"$lt": now - older_than}}))
+        if limit:
+            cursor = cursor.limit(limit)
+        frozen = []
+        async for project in cursor:
+            if not await self.freeze(project):
+                continue
+            frozen.append(str(project["_id"]))
+            if progress is not None:
+                await progress(len(frozen))
+        return {"frozen": len(frozen), "project_ids": frozen}
+
+    async def page(self, cursor: Optional[str], limit: int) -> Dict:
+        """One page of cold projects, newest first, continuing after ``cursor``"""
+        query = {"_id": {"$lt": ObjectId(cursor)}} if cursor else {}
+        docs = await self.cold.find(
+            workspace_query(query),
+            {field: 1 for field in (*LISTING_FIELDS, "day_count")}
+        ).sort("_id", -1).limit(limit).to_list(length=None)
+        items: List[Dict] = [
+            {
+                "id": str(doc["_id"]),
+                "name": doc.get("name", ""),
+                "created_at": doc.get("created_at", ""),
+                "updated_at": doc.get("updated_at", ""),
+                "archived": True,
+                "day_count": doc.get("day_count", 0),
+                "cold": True,
+            }
+            for doc in docs
+        ]
+        next_cursor = items[-1]["id"] if items and len(items) == limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+
+async def _main():
+    import argparse
+    import os
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from repository import ChangeLog, client_from_env
+
+    parser = argparse.ArgumentParser(description="Move long-archived projects into cold storage")
+    parser.add_argument("--older-than-days", type=int,
+                        default=int(os.environ.get("COLD_STORAGE_AFTER_DAYS", "180")))
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = client_from_env(Path(__file__).parent)
+    db = client[os.environ.get('DB_NAME', 'filmschedule')]
+    try:
+        changes = ChangeLog(db.counters, db.project_tombstones)
+        with in_workspace(ALL_WORKSPACES):
+            result = await ColdStorage(db.projects, db.projects_cold, changes).sweep(
+                timedelta(days=args.older_than_days), args.limit
+            )
+        print(f"Moved {result['frozen']} projects to cold storage")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(_main())
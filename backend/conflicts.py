@@ -0,0 +1,236 @@
+"""Cast double-booking and overlap detection across active projects.
+
+``ScheduleRow.cast`` and ``time`` are free text. They are parsed into
+bookings (person, date, start/end minutes) and kept in an in-memory index
+keyed by date and person, with per-project and per-person key sets so a
+save only touches that project's entries and a query only looks at the
+bookings of the people or dates involved, never at every document.
+
+A conflict is either a person booked on two different projects on the
+same date, or two rows of one project whose times overlap. Bookings only
+meet within a workspace: ``WorkspaceConflictIndex`` keeps one index each.
+Archived projects and templates book nobody and are not indexed.
+
+The index lives in the memory of the server process. It is loaded from
+the store at startup and then only follows the writes that process makes,
+so with several workers each one misses the saves handled by the others
+until it restarts. Run the API as a single worker where conflict reports
+have to be complete.
+"""
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import re
+
+from workspaces import DEFAULT_WORKSPACE, workspace
+
+# Assumed length of a scene whose end time cannot be derived
+DEFAULT_SCENE_MINUTES = 60
+
+Booking = namedtuple("Booking", "project_id project_name day_id row_id date person start end")
+
+CAST_SEPARATORS = re.compile(r"[,;/&+\n]|\s+(?:and|und)\s+", re.IGNORECASE)
+TIME_PATTERN = re.compile(r"(\d{1,2})(?:[:.h](\d{2}))?")
+
+
+def person_key(name: str) -> str:
+    return " ".join(name.split()).casefold()
+
+
+def parse_cast(text: str) -> List[str]:
+    """Split a free-text cast list into individual names"""
+    names = []
+    seen = set()
+    for part in CAST_SEPARATORS.split(text or ""):
+        name = " ".join(part.split())
+        if name and person_key(name) not in seen:
+            seen.add(person_key(name))
+            names.append(name)
+    return names
+
+
+def parse_time_range(text: str) -> Tuple[Optional[int], Optional[int]]:
+    """Parse "8:00", "08.30", "9h", "8:00-10:30" into start/end minutes"""
+    minutes = []
+    for hours, mins in TIME_PATTERN.findall(text or ""):
+        hours, mins = int(hours), int(mins or 0)
+        if hours > 24 or mins > 59:
+            continue
+        minutes.append(hours * 60 + mins)
+        if len(minutes) == 2:
+            break
+    if not minutes:
+        return None, None
+    if len(minutes) == 1 or minutes[1] <= minutes[0]:
+        return minutes[0], None
+    return minutes[0], minutes[1]
+
+
+def project_bookings(project_id: str, project: Dict) -> List[Booking]:
+    """Every (person, row) booking of a project; end times default to the next row's start"""
+    bookings = []
+    for day in project.get('days', []):
+        rows = [row for row in day.get('rows', []) if row.get('type', 'item') == 'item']
+        starts = [parse_time_range(row.get('time', '')) for row in rows]
+        for index, row in enumerate(rows):
+            names = parse_cast(row.get('cast', ''))
+            if not names:
+                continue
+            start, end = starts[index]
+            if start is not None and end is None:
+                following = [s for s, _ in starts[index + 1:] if s is not None and s > start]
+                end = following[0] if following else start + DEFAULT_SCENE_MINUTES
+            for name in names:
+                bookings.append(Booking(
+                    project_id, project.get('name', ''), day.get('id'), row.get('id'),
+                    day.get('date', ''), name, start, end,
+                ))
+    return bookings
+
+
+def _overlaps(a: Booking, b: Booking) -> bool:
+    if a.start is None or b.start is None:
+        return False
+    return a.start < b.end and b.start < a.end
+
+
+def format_minutes(value: Optional[int]) -> Optional[str]:
+    if value is None:
+        return None
+    return f"{value // 60:02d}:{value % 60:02d}"
+
+
+def booking_dict(booking: Booking) -> Dict:
+    return {
+        "project_id": booking.project_id,
+        "project_name": booking.project_name,
+        "day_id": booking.day_id,
+        "row_id": booking.row_id,
+        "date": booking.date,
+        "person": booking.person,
+        "start": format_minutes(booking.start),
+        "end": format_minutes(booking.end),
+    }
+
+
+def is_indexed(project: Optional[Dict]) -> bool:
+    """Only active productions book people; templates and archived projects do not"""
+    return bool(project) and not project.get('archived') and not project.get('is_template')
+
+
+class ConflictIndex:
+    def __init__(self):
+        # date -> person key -> bookings
+        self._by_date: Dict[str, Dict[str, List[Booking]]] = {}
+        # project id -> (date, person key) slots it occupies
+        self._by_project: Dict[str, Set[Tuple[str, str]]] = {}
+        # person key -> dates with at least one booking
+        self._by_person: Dict[str, Set[str]] = {}
+
+    def remove(self, project_id: str):
+        for date, key in self._by_project.pop(project_id, set()):
+            people = self._by_date.get(date, {})
+            remaining = [b for b in people.get(key, []) if b.project_id != project_id]
+            if remaining:
+                people[key] = remaining
+                continue
+            people.pop(key, None)
+            if not people:
+                self._by_date.pop(date, None)
+            dates = self._by_person.get(key)
+            if dates is not None:
+                dates.discard(date)
+                if not dates:
+                    self._by_person.pop(key, None)
+
+    def update(self, project_id: str, project: Optional[Dict]):
+        """Replace a project's bookings; missing, archived and template projects drop out"""
+        self.remove(project_id)
+        if not is_indexed(project):
+            return
+        slots = set()
+        for booking in project_bookings(project_id, project):
+            key = person_key(booking.person)
+            self._by_date.setdefault(booking.date, {}).setdefault(key, []).append(booking)
+            self._by_person.setdefault(key, set()).add(booking.date)
+            slots.add((booking.date, key))
+        if slots:
+            self._by_project[project_id] = slots
+
+    def _slot_conflicts(self, date: str, key: str) -> Iterable[Dict]:
+        bookings = self._by_date.get(date, {}).get(key, [])
+        for i, first in enumerate(bookings):
+            for second in bookings[i + 1:]:
+                if first.project_id != second.project_id:
+                    kind = "double_booking"
+                elif first.row_id != second.row_id and _overlaps(first, second):
+                    kind = "overlap"
+                else:
+                    continue
+                yield {
+                    "kind": kind,
+                    "person": first.person,
+                    "date": date,
+                    "overlapping": _overlaps(first, second),
+                    "bookings": [booking_dict(first), booking_dict(second)],
+                }
+
+    def for_project(self, project_id: str) -> List[Dict]:
+        conflicts = []
+        for date, key in sorted(self._by_project.get(project_id, set())):
+            conflicts.extend(
+                conflict for conflict in self._slot_conflicts(date, key)
+                if any(b["project_id"] == project_id for b in conflict["bookings"])
+            )
+        return conflicts
+
+    def for_person(self, name: str) -> List[Dict]:
+        key = person_key(name)
+        conflicts = []
+        for date in sorted(self._by_person.get(key, set())):
+            conflicts.extend(self._slot_conflicts(date, key))
+        return conflicts
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "projects": len(self._by_project),
+            "people": len(self._by_person),
+            "dates": len(self._by_date),
+        }
+
+
+class WorkspaceConflictIndex:
+    """One ``ConflictIndex`` per workspace; queries answer for the active workspace"""
+
+    def __init__(self):
+        self._indexes: Dict[str, ConflictIndex] = {}
+        # project id -> workspace whose index holds its bookings
+        self._workspaces: Dict[str, str] = {}
+
+    def remove(self, project_id: str):
+        name = self._workspaces.pop(project_id, None)
+        if name is not None:
+            self._indexes[name].remove(project_id)
+
+    def update(self, project_id: str, project: Optional[Dict]):
+        """Replace a project's bookings in the index of the project's own workspace"""
+        self.remove(project_id)
+        if not is_indexed(project):
+            return
+        name = project.get('workspace', DEFAULT_WORKSPACE)
+        self._indexes.setdefault(name, ConflictIndex()).update(project_id, project)
+        self._workspaces[project_id] = name
+
+    def for_project(self, project_id: str) -> List[Dict]:
+        index = self._indexes.get(workspace())
+        return index.for_project(project_id) if index else []
+
+    def for_person(self, name: str) -> List[Dict]:
+        index = self._indexes.get(workspace())
+        return index.for_person(name) if index else []
+
+    def stats(self) -> Dict[str, int]:
+        totals = {"workspaces": len(self._indexes), "projects": 0, "people": 0, "dates": 0}
+        for index in self._indexes.values():
+            for key, value in index.stats().items():
+                totals[key] += value
+        return totals
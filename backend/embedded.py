@@ -0,0 +1,569 @@
+"""Embedded document store on SQLite for tests and single-machine installs.
+
+Implements the part of the Motor collection API this backend uses, so the
+stores (projects, revisions, shared days, cold storage, media) run
+unchanged without a MongoDB server. Each collection is a table of
+``(id, doc)`` rows with the document stored as extended JSON, which keeps
+ObjectIds, datetimes and binary data intact.
+
+Queries support equality and the ``$eq``, ``$ne``, ``$lt``, ``$lte``,
+``$gt``, ``$gte``, ``$in``, ``$nin``, ``$exists``, ``$regex``, ``$and``,
+``$or`` and ``$nor`` operators; updates support ``$set``, ``$unset`` and
+``$inc``; projections include or exclude fields and ``$slice`` arrays.
+Lookups by ``_id`` use the primary key, equality on top-level fields is
+narrowed in SQL with ``json_extract`` (indexed by ``create_index``), and
+everything else is matched in Python. Calls run on the event loop thread,
+which is fine for the small databases this is meant for.
+"""
+from bson import ObjectId, json_util
+from bson.json_util import JSONMode, JSONOptions
+from datetime import datetime
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+from typing import Any, Dict, List, Optional, Tuple
+import copy
+import re
+import sqlite3
+
+JSON_OPTIONS = JSONOptions(json_mode=JSONMode.RELAXED, tz_aware=False)
+
+_MISSING = object()
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _dumps(value: Any) -> str:
+    return json_util.dumps(value, json_options=JSON_OPTIONS)
+
+
+def _loads(text: str) -> Any:
+    return json_util.loads(text, json_options=JSON_OPTIONS)
+
+
+def _candidates(doc: Any, path: str) -> List[Any]:
+    """Values at a dotted path, descending into arrays like MongoDB does"""
+    values = [doc]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                else:
+                    found.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = found
+    # An array matches a condition if the array or one of its elements does
+    expanded = []
+    for value in values:
+        expanded.append(value)
+        if isinstance(value, list):
+            expanded.extend(value)
+    return expanded
+
+
+def _equal(a: Any, b: Any) -> bool:
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    return a == b
+
+
+def _type_rank(value: Any) -> int:
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, (bytes, bytearray)):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _compare(op: str, value: Any, target: Any) -> bool:
+    # Like MongoDB, range operators only compare values of the same type
+    if value is None or target is None or _type_rank(value) != _type_rank(target):
+        return False
+    try:
+        if op == "$lt":
+            return value < target
+        if op == "$lte":
+            return value <= target
+        if op == "$gt":
+            return value > target
+        return value >= target
+    except TypeError:
+        return False
+
+
+def _matches_condition(values: List[Any], condition: Any) -> bool:
+    if isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+        options = condition.get("$options", "")
+        return all(
+            _matches_operator(values, op, target, options)
+            for op, target in condition.items() if op != "$options"
+        )
+    if condition is None:
+        return not values or any(value is None for value in values)
+    return any(_equal(value, condition) for value in values)
+
+
+def _matches_operator(values: List[Any], op: str, target: Any, options: str = "") -> bool:
+    if op == "$eq":
+        return _matches_condition(values, target)
+    if op == "$ne":
+        return not _matches_condition(values, target)
+    if op == "$in":
+        return any(_matches_condition(values, item) for item in target)
+    if op == "$nin":
+        return not any(_matches_condition(values, item) for item in target)
+    if op in ("$lt", "$lte", "$gt", "$gte"):
+        return any(_compare(op, value, target) for value in values)
+    if op == "$exists":
+        return bool(values) == bool(target)
+    if op == "$regex":
+        flags = (re.IGNORECASE if "i" in options else 0) | (re.MULTILINE if "m" in options else 0)
+        pattern = re.compile(target, flags)
+        return any(isinstance(value, str) and pattern.search(value) for value in values)
+    raise NotImplementedError(f"Query operator {op} is not supported by the embedded store")
+
+
+def matches(doc: Dict, query: Optional[Dict]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            if not all(matches(doc, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, part) for part in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, part) for part in condition):
+                return False
+        elif not _matches_condition(_candidates(doc, key), condition):
+            return False
+    return True
+
+
+def _include(value: Any, tree: Dict) -> Any:
+    if isinstance(value, list):
+        return [_include(item, tree) for item in value if isinstance(item, (dict, list))]
+    result = {}
+    for key, subtree in tree.items():
+        if key not in value:
+            continue
+        if subtree is True:
+            result[key] = value[key]
+        elif isinstance(value[key], (dict, list)):
+            result[key] = _include(value[key], subtree)
+    return result
+
+
+def _exclude(value: Any, path: List[str]):
+    if isinstance(value, list):
+        for item in value:
+            _exclude(item, path)
+    elif isinstance(value, dict) and path[0] in value:
+        if len(path) == 1:
+            del value[path[0]]
+        else:
+            _exclude(value[path[0]], path[1:])
+
+
+def _slice(values: List, spec) -> List:
+    if isinstance(spec, list):
+        skip, limit = spec
+        start = skip if skip >= 0 else max(len(values) + skip, 0)
+        return values[start:start + limit]
+    return values[:spec] if spec >= 0 else values[spec:]
+
+
+def project(doc: Dict, projection: Optional[Dict]) -> Dict:
+    """Apply a MongoDB-style inclusion or exclusion projection, with ``$slice`` on arrays"""
+    if not projection:
+        return doc
+    slices = {
+        key: value["$slice"] for key, value in projection.items()
+        if isinstance(value, dict) and "$slice" in value
+    }
+    fields = {key: value for key, value in projection.items() if key != "_id" and key not in slices}
+    keep_id = bool(projection.get("_id", 1))
+    if fields and all(fields.values()):
+        tree: Dict = {}
+        for path in [*fields, *slices]:
+            node = tree
+            parts = path.split(".")
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+                if node is True:
+                    break
+            else:
+                node[parts[-1]] = True
+        result = _include(doc, tree)
+        if keep_id and "_id" in doc:
+            result = {"_id": doc["_id"], **result}
+    else:
+        for path in fields:
+            _exclude(doc, path.split("."))
+        if not keep_id:
+            doc.pop("_id", None)
+        result = doc
+
+    for path, spec in slices.items():
+        values = _get_path(result, path)
+        if isinstance(values, list):
+            _set_path(result, path, _slice(values, spec))
+    return result
+
+
+def _set_path(doc: Dict, path: str, value: Any):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        # Numeric parts index into arrays, as in "days.3.rank"
+        doc = doc[int(part)] if isinstance(doc, list) else doc.setdefault(part, {})
+    if isinstance(doc, list):
+        doc[int(parts[-1])] = value
+    else:
+        doc[parts[-1]] = value
+
+
+def _get_path(doc: Dict, path: str) -> Any:
+    for part in path.split("."):
+        if isinstance(doc, list) and part.isdigit() and int(part) < len(doc):
+            doc = doc[int(part)]
+            continue
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _unset_path(doc: Dict, path: str):
+    _exclude(doc, path.split("."))
+
+
+def apply_update(doc: Dict, update: Dict):
+    for op, fields in update.items():
+        if op == "$set":
+            for path, value in fields.items():
+                _set_path(doc, path, copy.deepcopy(value))
+        elif op == "$unset":
+            for path in fields:
+                _unset_path(doc, path)
+        elif op == "$inc":
+            for path, amount in fields.items():
+                current = _get_path(doc, path)
+                _set_path(doc, path, (0 if current is _MISSING else current) + amount)
+        else:
+            raise NotImplementedError(f"Update operator {op} is not supported by the embedded store")
+
+
+def _sort_key(value: Any) -> Tuple:
+    if value is _MISSING:
+        value = None
+    if isinstance(value, (dict, list)):
+        return (_type_rank(value), _dumps(value))
+    if isinstance(value, ObjectId):
+        return (_type_rank(value), str(value))
+    return (_type_rank(value), value)
+
+
+def _sort_spec(key_or_list, direction=None) -> List[Tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    return [(key, value) for key, value in key_or_list]
+
+
+def _sort(docs: List[Dict], spec: List[Tuple[str, int]]) -> List[Dict]:
+    # Stable sorts from the last key to the first give mixed directions
+    for key, direction in reversed(spec):
+        docs.sort(key=lambda doc: _sort_key(_get_path(doc, key)), reverse=direction < 0)
+    return docs
+
+
+def _upsert_seed(query: Dict) -> Dict:
+    """The equality fields of a query, which an upserted document starts from"""
+    seed = {}
+    for key, condition in query.items():
+        if key.startswith("$"):
+            continue
+        if isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+            if "$eq" in condition:
+                _set_path(seed, key, condition["$eq"])
+            continue
+        _set_path(seed, key, copy.deepcopy(condition))
+    return seed
+
+
+class EmbeddedCursor:
+    def __init__(self, collection: "EmbeddedCollection", query: Optional[Dict],
+                 projection: Optional[Dict]):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=None) -> "EmbeddedCursor":
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, count: int) -> "EmbeddedCursor":
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> "EmbeddedCursor":
+        self._limit = count
+        return self
+
+    def _results(self) -> List[Dict]:
+        docs = self._collection._select(self._query)
+        if self._sort:
+            docs = _sort(docs, self._sort)
+        docs = docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        return [project(doc, self._projection) for doc in docs]
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict]:
+        docs = self._results()
+        return docs[:length] if length else docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._results():
+            yield doc
+
+
+class EmbeddedCollection:
+    def __init__(self, database: "EmbeddedDatabase", name: str):
+        self.database = database
+        self.name = name
+        self.table = f"{database.name}.{name}"
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.table}" (id TEXT PRIMARY KEY, doc TEXT NOT NULL)'
+        )
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        return self.database.client.connection
+
+    def _select(self, query: Dict) -> List[Dict]:
+        sql = f'SELECT doc FROM "{self.table}"'
+        clauses, params = [], []
+        for key, condition in query.items():
+            if key == "_id":
+                if isinstance(condition, dict) and set(condition) == {"$in"}:
+                    ids = [_dumps(value) for value in condition["$in"]]
+                    if not ids:
+                        return []
+                    clauses.append(f"id IN ({', '.join('?' * len(ids))})")
+                    params.extend(ids)
+                elif not isinstance(condition, dict):
+                    clauses.append("id = ?")
+                    params.append(_dumps(condition))
+            elif _FIELD_NAME.match(key) and isinstance(condition, (str, int, float)):
+                # Narrow in SQL; arrays are left for the Python match to decide
+                clauses.append(
+                    f"(json_extract(doc, '$.{key}') = ? OR json_type(doc, '$.{key}') = 'array')"
+                )
+                params.append(condition)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        docs = (_loads(row[0]) for row in self._conn.execute(sql, params))
+        return [doc for doc in docs if matches(doc, query)]
+
+    def _write(self, doc: Dict):
+        self._conn.execute(
+            f'INSERT OR REPLACE INTO "{self.table}" (id, doc) VALUES (?, ?)',
+            (_dumps(doc["_id"]), _dumps(doc))
+        )
+
+    def _delete(self, doc: Dict):
+        self._conn.execute(f'DELETE FROM "{self.table}" WHERE id = ?', (_dumps(doc["_id"]),))
+
+    def _insert(self, doc: Dict):
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        try:
+            self._conn.execute(
+                f'INSERT INTO "{self.table}" (id, doc) VALUES (?, ?)',
+                (_dumps(doc["_id"]), _dumps(doc))
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.table} _id: {doc['_id']}")
+
+    async def create_index(self, keys, **kwargs) -> str:
+        spec = _sort_spec(keys, 1)
+        name = kwargs.get("name") or "_".join(f"{key}_{direction}" for key, direction in spec)
+        # Only top-level fields can use an expression index on the JSON column
+        if all(_FIELD_NAME.match(key) for key, _ in spec):
+            columns = ", ".join(f"json_extract(doc, '$.{key}')" for key, _ in spec)
+            self._conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "{self.table}.{name}" ON "{self.table}" ({columns})'
+            )
+        return name
+
+    async def find_one(self, filter: Optional[Dict] = None, projection: Optional[Dict] = None,
+                       sort=None) -> Optional[Dict]:
+        cursor = EmbeddedCursor(self, filter, projection).limit(1)
+        if sort:
+            cursor.sort(sort)
+        docs = await cursor.to_list()
+        return docs[0] if docs else None
+
+    def find(self, filter: Optional[Dict] = None, projection: Optional[Dict] = None) -> EmbeddedCursor:
+        return EmbeddedCursor(self, filter, projection)
+
+    async def count_documents(self, filter: Dict) -> int:
+        return len(self._select(filter))
+
+    async def insert_one(self, document: Dict) -> InsertOneResult:
+        self._insert(document)
+        return InsertOneResult(document["_id"], True)
+
+    async def insert_many(self, documents: List[Dict], ordered: bool = True) -> InsertManyResult:
+        inserted, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                self._insert(document)
+                inserted.append(document["_id"])
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({
+                "writeErrors": errors, "writeConcernErrors": [], "nInserted": len(inserted),
+                "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+            })
+        return InsertManyResult(inserted, True)
+
+    def _update(self, filter: Dict, update: Dict, upsert: bool, many: bool) -> UpdateResult:
+        if not update or not all(op.startswith("$") for op in update):
+            raise ValueError("update only works with $ operators")
+        docs = self._select(filter)
+        if not many:
+            docs = docs[:1]
+        modified = 0
+        for doc in docs:
+            before = _dumps(doc)
+            apply_update(doc, update)
+            if _dumps(doc) != before:
+                self._write(doc)
+                modified += 1
+        raw = {"n": len(docs), "nModified": modified}
+        if not docs and upsert:
+            doc = _upsert_seed(filter)
+            apply_update(doc, update)
+            self._insert(doc)
+            raw.update({"n": 1, "upserted": doc["_id"]})
+        return UpdateResult(raw, True)
+
+    async def update_one(self, filter: Dict, update: Dict, upsert: bool = False) -> UpdateResult:
+        return self._update(filter, update, upsert, many=False)
+
+    async def update_many(self, filter: Dict, update: Dict, upsert: bool = False) -> UpdateResult:
+        return self._update(filter, update, upsert, many=True)
+
+    async def find_one_and_update(self, filter: Dict, update: Dict, projection: Optional[Dict] = None,
+                                  sort=None, upsert: bool = False,
+                                  return_document: bool = False) -> Optional[Dict]:
+        docs = self._select(filter)
+        if sort:
+            docs = _sort(docs, _sort_spec(sort))
+        if not docs:
+            if not upsert:
+                return None
+            doc = _upsert_seed(filter)
+            apply_update(doc, update)
+            self._insert(doc)
+            return project(copy.deepcopy(doc), projection) if return_document else None
+        doc = docs[0]
+        before = copy.deepcopy(doc)
+        apply_update(doc, update)
+        self._write(doc)
+        return project(doc if return_document else before, projection)
+
+    async def replace_one(self, filter: Dict, replacement: Dict, upsert: bool = False) -> UpdateResult:
+        docs = self._select(filter)[:1]
+        if docs:
+            doc = {"_id": docs[0]["_id"], **{k: v for k, v in replacement.items() if k != "_id"}}
+            self._write(doc)
+            return UpdateResult({"n": 1, "nModified": 1}, True)
+        if not upsert:
+            return UpdateResult({"n": 0, "nModified": 0}, True)
+        doc = {**_upsert_seed(filter), **replacement}
+        self._insert(doc)
+        return UpdateResult({"n": 1, "nModified": 0, "upserted": doc["_id"]}, True)
+
+    async def delete_one(self, filter: Dict) -> DeleteResult:
+        docs = self._select(filter)[:1]
+        for doc in docs:
+            self._delete(doc)
+        return DeleteResult({"n": len(docs)}, True)
+
+    async def delete_many(self, filter: Dict) -> DeleteResult:
+        docs = self._select(filter)
+        for doc in docs:
+            self._delete(doc)
+        return DeleteResult({"n": len(docs)}, True)
+
+
+class EmbeddedDatabase:
+    def __init__(self, client: "EmbeddedClient", name: str):
+        self.client = client
+        self.name = name
+        self._collections: Dict[str, EmbeddedCollection] = {}
+
+    def __getitem__(self, name: str) -> EmbeddedCollection:
+        if name not in self._collections:
+            self._collections[name] = EmbeddedCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> EmbeddedCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, command: str, *args, **kwargs) -> Dict:
+        if command == "ping":
+            return {"ok": 1.0}
+        raise NotImplementedError(f"Command {command} is not supported by the embedded store")
+
+
+class EmbeddedClient:
+    """Stand-in for ``AsyncIOMotorClient`` backed by one SQLite file (or ``:memory:``)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Autocommit; every operation is a single statement or runs without awaiting
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self._databases: Dict[str, EmbeddedDatabase] = {}
+
+    def __getitem__(self, name: str) -> EmbeddedDatabase:
+        if name not in self._databases:
+            self._databases[name] = EmbeddedDatabase(self, name)
+        return self._databases[name]
+
+    def __getattr__(self, name: str) -> EmbeddedDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,102 @@
+"""CSV export and streamed ZIP archives of projects.
+
+``write_project_csv`` is the CSV layout of ``/export.csv``. ``ZipStream``
+builds a ZIP archive incrementally: every entry added returns the bytes
+it produced, so an archive of many projects can be sent while a cursor
+iterates without ever holding the whole archive (zipfile writes data
+descriptors when the output is not seekable).
+"""
+from typing import Dict, List, TextIO, Union
+import csv
+import re
+import time
+import zipfile
+
+UNSAFE_PATH_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def write_project_csv(project: Dict, output: TextIO):
+    """Schedule rows per day followed by every calltime block, dates as DD-MM-YYYY"""
+    writer = csv.writer(output)
+
+    # Write schedule days
+    if project.get('days'):
+        writer.writerow(['SCHEDULE'])
+        writer.writerow(['Date', 'Time', 'Scene', 'Location', 'Cast', 'Notes'])
+
+        for day in project.get('days', []):
+            date_formatted = day['date']
+            for row in day.get('rows', []):
+                if row['type'] == 'item':
+                    writer.writerow([
+                        date_formatted,
+                        row.get('time', ''),
+                        row.get('scene', ''),
+                        row.get('location', ''),
+                        row.get('cast', ''),
+                        row.get('notes', '')
+                    ])
+                elif row['type'] == 'text':
+                    writer.writerow([date_formatted, '', row.get('notes', ''), '', '', ''])
+
+        writer.writerow([])  # Empty row separator
+
+    # Write calltimes
+    if project.get('calltimes'):
+        writer.writerow(['CALLTIMES'])
+        writer.writerow(['Time', 'Name'])
+
+        for calltime in project.get('calltimes', []):
+            for row in calltime.get('rows', []):
+                writer.writerow([
+                    row.get('time', ''),
+                    row.get('name', '')
+                ])
+            writer.writerow([])  # Empty row between calltimes
+
+
+def archive_name(name: str) -> str:
+    """A project name made safe for use as a path inside an archive"""
+    return UNSAFE_PATH_CHARS.sub("_", name).strip(" .") or "project"
+
+
+class _Sink:
+    """Write-only, non-seekable target that hands out what was written"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStream:
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, path: str, data: Union[bytes, str], compress: bool = True) -> bytes:
+        """Add one file and return the archive bytes produced for it"""
+        info = zipfile.ZipInfo(path, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self._zip.writestr(info, data)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Write the central directory and return the remaining bytes"""
+        self._zip.close()
+        return self._sink.drain()
@@ -0,0 +1,217 @@
+"""iCalendar export of shoot days and call times.
+
+Events are generated lazily from a project's ``days`` and ``calltimes``:
+one event per shoot day spanning its scenes (all-day when no scene has a
+time) and one per call time row. Times are written as floating local
+times, the way they are entered in the schedule. With a person filter a
+day only appears if they are cast in it, listing just their scenes, and
+only their own call times are included.
+
+Calltime blocks are dated through ``source_day_id`` (generated blocks), a
+DD-MM-YYYY date in their title, or the project's only day; undated blocks
+are left out.
+
+Event UIDs start with the project id: copies of a template keep the
+template's day and row ids, and their events must not replace each other.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+import hashlib
+import re
+
+from conflicts import DEFAULT_SCENE_MINUTES, parse_cast, parse_time_range, person_key
+
+PRODID = "-//Drehplan Creator//Schedule Export//EN"
+UID_DOMAIN = "drehplan-creator"
+DATE_IN_TEXT = re.compile(r"\b(\d{2}-\d{2}-\d{4})\b")
+
+
+def escape_text(value: str) -> str:
+    return (
+        (value or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold_line(line: str) -> str:
+    """Fold a content line at 75 octets without splitting UTF-8 characters"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts, current, size, limit = [], [], 0, 75
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > limit:
+            parts.append("".join(current))
+            current, size, limit = [], 0, 74  # continuation lines start with a space
+        current.append(char)
+        size += width
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _parse_date(date_str: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(date_str, "%d-%m-%Y")
+    except (TypeError, ValueError):
+        return None
+
+
+def _local(day: datetime, minutes: int) -> str:
+    return (day + timedelta(minutes=minutes)).strftime("%Y%m%dT%H%M%S")
+
+
+def _dtstamp(updated_at: str) -> str:
+    try:
+        stamp = datetime.strptime(updated_at, "%d-%m-%Y %H:%M:%S").astimezone(timezone.utc)
+    except (TypeError, ValueError):
+        stamp = datetime.now(timezone.utc)
+    return stamp.strftime("%Y%m%dT%H%M%SZ")
+
+
+def _event(uid: str, dtstamp: str, summary: str, start: str, end: Optional[str] = None,
+           all_day: bool = False, location: str = "", description: str = "") -> str:
+    lines = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{dtstamp}"]
+    if all_day:
+        lines.append(f"DTSTART;VALUE=DATE:{start}")
+        lines.append(f"DTEND;VALUE=DATE:{end}")
+    else:
+        lines.append(f"DTSTART:{start}")
+        if end:
+            lines.append(f"DTEND:{end}")
+    lines.append(f"SUMMARY:{escape_text(summary)}")
+    if location:
+        lines.append(f"LOCATION:{escape_text(location)}")
+    if description:
+        lines.append(f"DESCRIPTION:{escape_text(description)}")
+    lines.append("END:VEVENT")
+    return "".join(fold_line(line) for line in lines)
+
+
+def _uid(*parts: str) -> str:
+    return f"{'-'.join(part for part in parts if part)}@{UID_DOMAIN}"
+
+
+def _person_tag(person: Optional[str]) -> str:
+    return hashlib.sha1(person_key(person).encode("utf-8")).hexdigest()[:10] if person else ""
+
+
+def _row_line(row: Dict) -> str:
+    if row.get('type', 'item') == 'text':
+        return row.get('notes', '')
+    fields = [row.get('time', ''), row.get('scene', ''), row.get('location', ''), row.get('cast', '')]
+    return " | ".join(field for field in fields if field)
+
+
+def day_events(project: Dict, person: Optional[str] = None) -> Iterator[str]:
+    project_id = str(project.get('_id', ''))
+    name = project.get('name', '')
+    dtstamp = _dtstamp(project.get('updated_at', ''))
+    key = person_key(person) if person else None
+    for number, day in enumerate(project.get('days', []), start=1):
+        date = _parse_date(day.get('date', ''))
+        if date is None:
+            continue
+        rows = day.get('rows', [])
+        if key is not None:
+            rows = [
+                row for row in rows
+                if row.get('type', 'item') == 'item'
+                and key in {person_key(cast) for cast in parse_cast(row.get('cast', ''))}
+            ]
+            if not rows:
+                continue
+
+        first, last = None, None
+        for row in rows:
+            if row.get('type', 'item') != 'item':
+                continue
+            start, end = parse_time_range(row.get('time', ''))
+            if start is None:
+                continue
+            end = end if end is not None else start + DEFAULT_SCENE_MINUTES
+            first = start if first is None else min(first, start)
+            last = end if last is None else max(last, end)
+
+        locations = []
+        for row in rows:
+            location = " ".join(row.get('location', '').split())
+            if location and location not in locations:
+                locations.append(location)
+
+        summary = f"{name}: Shoot day {number}"
+        description = "\n".join(line for line in map(_row_line, rows) if line)
+        uid = _uid(project_id, day.get('id', f"{number}"), _person_tag(person))
+        if first is None:
+            yield _event(uid, dtstamp, summary, date.strftime("%Y%m%d"),
+                         (date + timedelta(days=1)).strftime("%Y%m%d"), all_day=True,
+                         location=", ".join(locations), description=description)
+        else:
+            yield _event(uid, dtstamp, summary, _local(date, first), _local(date, last),
+                         location=", ".join(locations), description=description)
+
+
+def _calltime_date(calltime: Dict, day_dates: Dict[str, str], only_date: Optional[str]) -> Optional[datetime]:
+    if calltime.get('source_day_id') in day_dates:
+        return _parse_date(day_dates[calltime['source_day_id']])
+    match = DATE_IN_TEXT.search(calltime.get('title', ''))
+    if match:
+        return _parse_date(match.group(1))
+    return _parse_date(only_date) if only_date else None
+
+
+def calltime_events(project: Dict, person: Optional[str] = None) -> Iterator[str]:
+    project_id = str(project.get('_id', ''))
+    name = project.get('name', '')
+    dtstamp = _dtstamp(project.get('updated_at', ''))
+    days = project.get('days', [])
+    day_dates = {day.get('id'): day.get('date', '') for day in days}
+    only_date = days[0].get('date') if len(days) == 1 else None
+    key = person_key(person) if person else None
+    for calltime in project.get('calltimes', []):
+        date = _calltime_date(calltime, day_dates, only_date)
+        if date is None:
+            continue
+        for row in calltime.get('rows', []):
+            if row.get('type', 'item') != 'item' or not row.get('name'):
+                continue
+            if key is not None and person_key(row['name']) != key:
+                continue
+            start, _ = parse_time_range(row.get('time', ''))
+            if start is None:
+                continue
+            yield _event(
+                _uid(project_id, calltime.get('id', ''), row.get('id', ''), "call"), dtstamp,
+                f"Call {row['name']} ({name})", _local(date, start),
+                description=calltime.get('title', '')
+            )
+
+
+def project_events(project: Dict, person: Optional[str] = None) -> Iterator[str]:
+    yield from day_events(project, person)
+    yield from calltime_events(project, person)
+
+
+def calendar_header(name: str) -> str:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+    ]
+    return "".join(fold_line(line) for line in lines)
+
+
+def calendar_footer() -> str:
+    return fold_line("END:VCALENDAR")
+
+
+def calendar_etag(parts: List[str]) -> str:
+    """Strong ETag over the versions (and filters) a feed was rendered from"""
+    return '"' + hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest() + '"'
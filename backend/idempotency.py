@@ -0,0 +1,133 @@
+"""Idempotency keys for retried writes.
+
+A client that sends an ``Idempotency-Key`` header may retry the request
+safely: the first request claims the key, runs, and stores its response;
+replays of the same key get the stored response back without touching
+the project again. Keys are scoped per workspace and endpoint (and
+project), remember a fingerprint of the request body so a key cannot be
+reused for a different request, and expire through a TTL index on
+``expires_at``.
+
+A key whose request is still running answers 409. If the worker running
+it died, the claim lapses after ``lock_seconds`` and a retry takes over.
+"""
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+from typing import Awaitable, Callable, Dict, Optional
+import hashlib
+
+from workspaces import workspace
+
+MAX_KEY_LENGTH = 255
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+def _utcnow() -> datetime:
+    # Stored as UTC so the TTL index expires keys on time
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def _doc_id(key: str, scope: str) -> str:
+    return f"{workspace()}:{scope}:{key}"
+
+
+class IdempotencyStore:
+    def __init__(self, collection, ttl_seconds: int, lock_seconds: int = 60):
+        self.collection = collection
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.lock = timedelta(seconds=lock_seconds)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        # Backends without TTL indexes (the embedded store) are purged here
+        await self.collection.delete_many({"expires_at": {"$lt": _utcnow()}})
+
+    async def begin(self, key: str, scope: str, request_fingerprint: str) -> Optional[Dict]:
+        """Claim a key; returns the stored record if the request already completed"""
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+        doc_id = _doc_id(key, scope)
+
+        for _ in range(2):
+            now = _utcnow()
+            try:
+                await self.collection.insert_one({
+                    "_id": doc_id,
+                    "state": "pending",
+                    "fingerprint": request_fingerprint,
+                    "locked_until": now + self.lock,
+                    "expires_at": now + self.ttl,
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+
+            existing = await self.collection.find_one({"_id": doc_id})
+            if existing is None or existing["expires_at"] < now:
+                # Expired between the insert and the read, or not yet purged
+                await self.collection.delete_one({"_id": doc_id, "expires_at": {"$lt": now}})
+                continue
+            if existing["fingerprint"] != request_fingerprint:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used for a different request"
+                )
+            if existing["state"] == "done":
+                return existing
+            if existing["locked_until"] > now:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still in progress",
+                    headers={"Retry-After": "1"}
+                )
+            # The worker that claimed the key is gone; take the claim over
+            taken = await self.collection.find_one_and_update(
+                {"_id": doc_id, "state": "pending", "locked_until": existing["locked_until"]},
+                {"$set": {"locked_until": now + self.lock}}
+            )
+            if taken is not None:
+                return None
+            break
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still in progress",
+            headers={"Retry-After": "1"}
+        )
+
+    async def complete(self, key: str, scope: str, response: Dict, status_code: int = 200):
+        await self.collection.update_one(
+            {"_id": _doc_id(key, scope)},
+            {"$set": {"state": "done", "status_code": status_code, "response": response}}
+        )
+
+    async def release(self, key: str, scope: str):
+        await self.collection.delete_one({"_id": _doc_id(key, scope), "state": "pending"})
+
+    async def run(self, key: Optional[str], scope: str, request_fingerprint: str,
+                  operation: Callable[[], Awaitable[Dict]]):
+        """Run ``operation`` once per key, replaying its stored response afterwards"""
+        if not key:
+            return await operation()
+
+        stored = await self.begin(key, scope, request_fingerprint)
+        if stored is not None:
+            return JSONResponse(
+                stored["response"],
+                status_code=stored.get("status_code", 200),
+                headers={REPLAY_HEADER: "true"}
+            )
+
+        try:
+            response = await operation()
+        except BaseException:
+            # Failed requests are not remembered, so the client can retry them
+            await self.release(key, scope)
+            raise
+        await self.complete(key, scope, response)
+        return response
@@ -0,0 +1,239 @@
+"""Background jobs, queued in the ``jobs`` collection.
+
+Work too large for a request is enqueued as a job document and run by
+``JobRunner`` workers on the event loop. Handlers are registered per kind
+with their own concurrency limit; they report progress on the job
+document and leave their result (or error) there for ``/api/jobs/{id}``.
+
+Because the queue lives in the database, jobs enqueued before a restart,
+or by another process, are picked up again. A running job keeps a
+heartbeat; one whose heartbeat stops because its worker died goes back
+to the queue until it has used up its attempts. Stopping the runner
+requeues its running jobs without counting the attempt.
+
+A job runs in the workspace it was enqueued from, so its handler reads and
+writes that tenant's projects only, and only that workspace can see it.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import logging
+import time
+import uuid
+
+from bson import ObjectId
+
+from workspaces import DEFAULT_WORKSPACE, active_workspace, in_workspace, workspace_query
+
+logger = logging.getLogger(__name__)
+
+# Progress is written to the job document at most this often
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+ACTIVE_STATUSES = ["queued", "running"]
+
+
+class JobContext:
+    """Handed to a handler to report the progress of its job"""
+
+    def __init__(self, collection, job: Dict):
+        self.collection = collection
+        self.id = job["_id"]
+        self.params = job.get("params") or {}
+        self._reported_at = 0.0
+
+    async def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None):
+        now = time.monotonic()
+        finished = total is not None and done >= total
+        if now - self._reported_at < PROGRESS_INTERVAL_SECONDS and not finished:
+            return
+        self._reported_at = now
+        await self.collection.update_one(
+            {"_id": self.id},
+            {"$set": {"progress": {"done": done, "total": total, "message": message}}}
+        )
+
+
+Handler = Callable[[JobContext], Awaitable[Any]]
+
+
+@dataclass
+class _Kind:
+    handler: Handler
+    concurrency: int
+    running: int = 0
+
+
+class JobRunner:
+    def __init__(self, collection, workers: int = 2, poll_seconds: float = 5.0,
+                 lease_seconds: float = 60.0, max_attempts: int = 3, retention_days: float = 7):
+        self.collection = collection
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.retention_seconds = int(retention_days * 86400)
+        self.runner_id = uuid.uuid4().hex
+        self._kinds: Dict[str, _Kind] = {}
+        self._active: Set[ObjectId] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def register(self, kind: str, handler: Handler, concurrency: int = 1):
+        """Run jobs of ``kind`` with ``handler``, at most ``concurrency`` at a time"""
+        self._kinds[kind] = _Kind(handler, concurrency)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("status", 1), ("created_at", 1)])
+        await self.collection.create_index("finished_at", expireAfterSeconds=self.retention_seconds)
+        # Backends without TTL indexes (the embedded store) are purged here
+        await self.collection.delete_many({
+            "finished_at": {"$lt": datetime.now() - timedelta(seconds=self.retention_seconds)}
+        })
+
+    async def enqueue(self, kind: str, params: Optional[Dict] = None, unique: bool = False) -> str:
+        """Queue a job and return its id; with ``unique`` an unfinished job of the kind is reused"""
+        name = active_workspace()
+        if unique:
+            existing = await self.collection.find_one(
+                {"workspace": name, "kind": kind, "status": {"$in": ACTIVE_STATUSES}}, {"_id": 1}
+            )
+            if existing:
+                return str(existing["_id"])
+        job = {
+            "workspace": name,
+            "kind": kind,
+            "params": params or {},
+            "status": "queued",
+            "attempts": 0,
+            "created_at": datetime.now(),
+        }
+        await self.collection.insert_one(job)
+        self._notify()
+        return str(job["_id"])
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Status, progress and result of a job (its params can be large and are left out)"""
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await self.collection.find_one(
+            workspace_query({"_id": ObjectId(job_id)}), {"params": 0, "runner": 0}
+        )
+
+    async def start(self):
+        self._claim_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._active:
+            # Interrupted, not failed: another start picks them up again
+            await self.collection.update_many(
+                {"_id": {"$in": list(self._active)}, "status": "running", "runner": self.runner_id},
+                {"$set": {"status": "queued"}, "$unset": {"runner": ""}, "$inc": {"attempts": -1}}
+            )
+            self._active.clear()
+
+    def _notify(self):
+        # Wake idle workers, if the runner has been started
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _claim(self) -> Optional[Dict]:
+        async with self._claim_lock:
+            kinds = [name for name, kind in self._kinds.items() if kind.running < kind.concurrency]
+            if not kinds:
+                return None
+            now = datetime.now()
+            job = await self.collection.find_one_and_update(
+                {"status": "queued", "kind": {"$in": kinds}},
+                {
+                    "$set": {"status": "running", "started_at": now, "heartbeat_at": now,
+                             "runner": self.runner_id},
+                    "$inc": {"attempts": 1}
+                },
+                sort=[("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job is not None:
+                self._kinds[job["kind"]].running += 1
+                self._active.add(job["_id"])
+            return job
+
+    async def _work(self):
+        while True:
+            self._wake.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Claiming a job failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict):
+        kind = self._kinds[job["kind"]]
+        try:
+            with in_workspace(job.get("workspace", DEFAULT_WORKSPACE)):
+                result = await kind.handler(JobContext(self.collection, job))
+        except asyncio.CancelledError:
+            # Stays active so that stop() puts it back in the queue
+            kind.running -= 1
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['_id']} ({job['kind']}) failed: {e}")
+            update = {"status": "failed", "error": str(e)}
+        else:
+            update = {"status": "done", "result": result}
+        kind.running -= 1
+        self._active.discard(job["_id"])
+        await self.collection.update_one(
+            {"_id": job["_id"], "runner": self.runner_id},
+            {"$set": {**update, "finished_at": datetime.now()}, "$unset": {"runner": ""}}
+        )
+        self._notify()
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                if self._active:
+                    await self.collection.update_many(
+                        {"_id": {"$in": list(self._active)}, "runner": self.runner_id},
+                        {"$set": {"heartbeat_at": datetime.now()}}
+                    )
+                await self._recover()
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {e}")
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+
+    async def _recover(self):
+        """Requeue running jobs whose worker stopped sending heartbeats"""
+        stale = {"status": "running", "heartbeat_at": {"$lt": datetime.now() - self.lease}}
+        requeued = await self.collection.update_many(
+            {**stale, "attempts": {"$lt": self.max_attempts}},
+            {"$set": {"status": "queued"}, "$unset": {"runner": ""}}
+        )
+        await self.collection.update_many(
+            {**stale, "attempts": {"$gte": self.max_attempts}},
+            {
+                "$set": {"status": "failed", "error": "The job's worker stopped responding",
+                         "finished_at": datetime.now()},
+                "$unset": {"runner": ""}
+            }
+        )
+        if requeued.modified_count:
+            logger.info(f"Requeued {requeued.modified_count} interrupted jobs")
+            self._notify()
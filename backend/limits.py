@@ -0,0 +1,168 @@
+"""Concurrency limits, body size limits and rate limiting.
+
+``LimitsMiddleware`` sits in front of the API and
+
+* rejects clients, and workspaces, that exceed their request rate with 429,
+* caps concurrent requests per route group (uploads, saves, exports) with
+  an asyncio semaphore; requests that wait longer than the queue timeout
+  get 503,
+* enforces a per-group request body size while the body streams in, so an
+  oversized upload is cut off without being buffered; it answers 413.
+
+Both 429 and 503 carry ``Retry-After``. Quick reads such as
+``/api/health`` and ``get_project`` belong to no group and are never
+queued behind heavy work.
+"""
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.responses import JSONResponse
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import math
+import re
+import time
+
+from workspaces import workspace_from_scope
+
+
+class RouteLimit:
+    def __init__(self, name: str, methods: Iterable[str], pattern: str,
+                 concurrency: int, max_body: int):
+        self.name = name
+        self.methods = set(methods)
+        self.pattern = re.compile(pattern)
+        self.concurrency = concurrency
+        self.max_body = max_body
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and self.pattern.match(path) is not None
+
+
+class InMemoryRateLimitStore:
+    """Token buckets per client (or workspace), kept in process memory"""
+
+    def __init__(self, per_minute: int, burst: int):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def hit(self, client: str) -> Optional[float]:
+        """Take one token; returns seconds to wait if the bucket is empty"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[client] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[client] = (tokens - 1, now)
+        if len(self._buckets) > 10000:
+            self._evict(now)
+        return None
+
+    def _evict(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        full_after = self.burst / self.rate
+        for client, (_, updated) in list(self._buckets.items()):
+            if now - updated > full_after:
+                del self._buckets[client]
+
+
+def _error(status: int, detail: str, retry_after: Optional[float] = None) -> JSONResponse:
+    headers = {}
+    if retry_after is not None:
+        headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return JSONResponse({"detail": detail}, status_code=status, headers=headers)
+
+
+class LimitsMiddleware:
+    def __init__(self, app, route_limits: List[RouteLimit], default_max_body: int,
+                 queue_timeout: float, rate_limit_store=None, exempt_paths: Iterable[str] = (),
+                 trust_forwarded_for: bool = False, workspace_rate_limit_store=None):
+        self.app = app
+        self.route_limits = route_limits
+        self.default_max_body = default_max_body
+        self.queue_timeout = queue_timeout
+        self.rate_limit_store = rate_limit_store
+        self.exempt_paths = set(exempt_paths)
+        self.trust_forwarded_for = trust_forwarded_for
+        self.workspace_rate_limit_store = workspace_rate_limit_store
+
+    def _client(self, scope) -> str:
+        if self.trust_forwarded_for:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limit_store is not None:
+            wait = await self.rate_limit_store.hit(self._client(scope))
+            if wait is not None:
+                await _error(429, "Too many requests", wait)(scope, receive, send)
+                return
+
+        if self.workspace_rate_limit_store is not None:
+            # Invalid workspace names are rejected further in
+            name = workspace_from_scope(scope)
+            wait = await self.workspace_rate_limit_store.hit(name) if name else None
+            if wait is not None:
+                await _error(429, "Workspace request quota exceeded", wait)(scope, receive, send)
+                return
+
+        method, path = scope["method"], scope["path"]
+        limit = next((rule for rule in self.route_limits if rule.matches(method, path)), None)
+        max_body = limit.max_body if limit else self.default_max_body
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > max_body:
+                await _error(413, "Request body too large")(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body:
+                    raise StarletteHTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        if limit is None or limit.semaphore is None:
+            await self._call(scope, limited_receive, send)
+            return
+
+        try:
+            await asyncio.wait_for(limit.semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            await _error(503, f"Server busy ({limit.name}), try again later", self.queue_timeout)(
+                scope, receive, send
+            )
+            return
+        try:
+            await self._call(scope, limited_receive, send)
+        finally:
+            limit.semaphore.release()
+
+    async def _call(self, scope, receive, send):
+        started = False
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, tracking_send)
+        except StarletteHTTPException as e:
+            # Raised by the body limit outside any handler that renders it
+            if e.status_code != 413 or started:
+                raise
+            await _error(413, "Request body too large")(scope, receive, send)
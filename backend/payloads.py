@@ -0,0 +1,203 @@
+"""Fast validation path for project payloads.
+
+Saving through the ``Project`` model builds one Pydantic object per day and
+row, calls ``uuid4`` for every default id and then rebuilds everything as
+dicts with ``model_dump()``. Here the raw request body is validated straight
+into plain dicts with a ``TypeAdapter`` over TypedDicts that mirror the
+models in server.py; defaults are filled in afterwards and ids are only
+generated where the client did not send one.
+
+The wire schema and the validation errors (types, messages and ``loc``) are
+the same as with the models. Keep these definitions in sync with them.
+"""
+from fastapi.exceptions import RequestValidationError
+from pydantic import StringConstraints, TypeAdapter, ValidationError
+from typing import Dict, List, Optional, Union
+from typing_extensions import Annotated, NotRequired, TypedDict
+import json
+import uuid
+
+from ranks import RANK_PATTERN
+
+# Fractional order key, see ranks.py; shared with the models so both refuse the same keys
+Rank = Annotated[str, StringConstraints(pattern=RANK_PATTERN)]
+
+
+class ScheduleRowPayload(TypedDict):
+    id: NotRequired[str]
+    type: str
+    time: NotRequired[str]
+    scene: NotRequired[str]
+    location: NotRequired[str]
+    cast: NotRequired[str]
+    notes: NotRequired[str]
+    rank: NotRequired[Optional[Rank]]
+
+
+class ScheduleDayPayload(TypedDict):
+    id: NotRequired[str]
+    date: str
+    rows: NotRequired[List[ScheduleRowPayload]]
+    position: NotRequired[int]
+    rank: NotRequired[Optional[Rank]]
+
+
+class CalltimeRowPayload(TypedDict):
+    id: NotRequired[str]
+    time: NotRequired[str]
+    name: NotRequired[str]
+    type: NotRequired[str]
+    rank: NotRequired[Optional[Rank]]
+
+
+class CalltimeHeadersPayload(TypedDict):
+    time: NotRequired[str]
+    name: NotRequired[str]
+
+
+class CalltimePayload(TypedDict):
+    id: NotRequired[str]
+    title: NotRequired[str]
+    headers: NotRequired[Optional[CalltimeHeadersPayload]]
+    rows: NotRequired[List[CalltimeRowPayload]]
+    position: NotRequired[int]
+    rank: NotRequired[Optional[Rank]]
+    source_day_id: NotRequired[Optional[str]]
+
+
+class ColumnWidthsPayload(TypedDict):
+    time: NotRequired[int]
+    scene: NotRequired[int]
+    location: NotRequired[int]
+    cast: NotRequired[int]
+    notes: NotRequired[int]
+
+
+class ColumnHeadersPayload(TypedDict):
+    time: NotRequired[str]
+    scene: NotRequired[str]
+    location: NotRequired[str]
+    cast: NotRequired[str]
+    notes: NotRequired[str]
+
+
+class ProjectPayload(TypedDict):
+    name: str
+    notes: NotRequired[str]
+    logo_url: NotRequired[str]
+    column_widths: NotRequired[Optional[ColumnWidthsPayload]]
+    column_headers: NotRequired[Optional[ColumnHeadersPayload]]
+    days: NotRequired[List[ScheduleDayPayload]]
+    calltimes: NotRequired[List[CalltimePayload]]
+    created_at: NotRequired[Optional[str]]
+    updated_at: NotRequired[Optional[str]]
+    archived: NotRequired[bool]
+    is_template: NotRequired[bool]
+    template_id: NotRequired[Optional[str]]
+
+
+project_adapter = TypeAdapter(ProjectPayload)
+
+# Defaults of the corresponding models; lists are copied per object below.
+# ``rank`` is not filled in: a list without ranks keeps its legacy order
+ROW_DEFAULTS = {"time": "", "scene": "", "location": "", "cast": "", "notes": ""}
+DAY_DEFAULTS = {"position": 0}
+CALLTIME_ROW_DEFAULTS = {"time": "", "name": "", "type": "item"}
+CALLTIME_HEADER_DEFAULTS = {"time": "Time", "name": "Name"}
+CALLTIME_DEFAULTS = {"title": "Calltime", "headers": None, "position": 0, "source_day_id": None}
+COLUMN_WIDTH_DEFAULTS = {"time": 15, "scene": 15, "location": 23, "cast": 23, "notes": 24}
+COLUMN_HEADER_DEFAULTS = {"time": "Time", "scene": "Scene", "location": "Location", "cast": "Cast", "notes": "Notes"}
+PROJECT_DEFAULTS = {
+    "notes": "",
+    "logo_url": "",
+    "column_widths": None,
+    "column_headers": None,
+    "created_at": None,
+    "updated_at": None,
+    "archived": False,
+    "is_template": False,
+    "template_id": None,
+}
+
+
+def _fill(target: Dict, defaults: Dict):
+    for key, value in defaults.items():
+        if key not in target:
+            target[key] = value
+
+
+def _fill_item(item: Dict, defaults: Dict):
+    if 'id' not in item:
+        item['id'] = str(uuid.uuid4())
+    _fill(item, defaults)
+
+
+def _fill_nested(value: Optional[Dict], defaults: Dict) -> Optional[Dict]:
+    if value is not None:
+        _fill(value, defaults)
+    return value
+
+
+def apply_defaults(project: Dict) -> Dict:
+    """Fill in model defaults in place, matching ``Project(...).model_dump()``"""
+    _fill(project, PROJECT_DEFAULTS)
+    _fill_nested(project['column_widths'], COLUMN_WIDTH_DEFAULTS)
+    _fill_nested(project['column_headers'], COLUMN_HEADER_DEFAULTS)
+
+    project.setdefault('days', [])
+    for day in project['days']:
+        _fill_item(day, DAY_DEFAULTS)
+        rows = day.setdefault('rows', [])
+        for row in rows:
+            _fill_item(row, ROW_DEFAULTS)
+
+    project.setdefault('calltimes', [])
+    for calltime in project['calltimes']:
+        _fill_item(calltime, CALLTIME_DEFAULTS)
+        _fill_nested(calltime['headers'], CALLTIME_HEADER_DEFAULTS)
+        for row in calltime.setdefault('rows', []):
+            _fill_item(row, CALLTIME_ROW_DEFAULTS)
+
+    return project
+
+
+def _model_error(error: Dict) -> Dict:
+    """Report a TypedDict type error the way FastAPI reports it for a model"""
+    if error["type"] != "dict_type":
+        return error
+    return {
+        **error,
+        "type": "model_attributes_type",
+        "msg": "Input should be a valid dictionary or object to extract fields from",
+    }
+
+
+def parse_project(body: Union[bytes, str]) -> Dict:
+    """Validate a raw JSON request body into a project dict.
+
+    Raises ``RequestValidationError`` so FastAPI answers with the usual 422
+    body, exactly as if the endpoint had declared a ``Project`` parameter.
+    """
+    try:
+        data = json.loads(body)
+    except json.JSONDecodeError as e:
+        raise RequestValidationError(
+            [{
+                "type": "json_invalid",
+                "loc": ("body", e.pos),
+                "msg": "JSON decode error",
+                "input": {},
+                "ctx": {"error": e.msg},
+            }],
+            body=e.doc
+        )
+
+    try:
+        project = project_adapter.validate_python(data)
+    except ValidationError as e:
+        errors = [
+            {**_model_error(error), "loc": ("body", *error["loc"])}
+            for error in e.errors(include_url=False)
+        ]
+        raise RequestValidationError(errors, body=data)
+    return apply_defaults(project)
@@ -0,0 +1,212 @@
+"""Fractional rank keys for the order of days, calltimes and rows.
+
+Days and calltimes share one schedule order and the rows of each day or
+calltime have their own. Where a list carries ``rank`` keys, the order is
+the lexicographic order of those keys: base-62 strings that always leave
+room for another key between two neighbours. Moving an element therefore
+rewrites only that element's key instead of renumbering its siblings.
+
+Lists without ranks keep their legacy order (``position`` for days and
+calltimes, array order for rows) until the first move ranks them; from
+then on full saves keep the ranks in line with the order they send. Views
+are sorted by rank and get their ``position`` renumbered, so clients that
+order by position see moves too.
+
+A valid key is a non-empty run of base-62 digits that does not end in
+"0": there is no key between "A" and "A0", so such keys would pin their
+neighbours. Saves refuse other keys and stored ones that do not match are
+treated as missing, so the next rank assignment replaces them.
+"""
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+import re
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+RANK_PATTERN = r"^[0-9A-Za-z]*[1-9A-Za-z]$"
+_RANK = re.compile(RANK_PATTERN)
+
+SCHEDULE_KINDS = ("days", "calltimes")
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    """A key strictly between ``a`` and ``b`` (an open end when None); "" is the lowest key"""
+    if b is not None:
+        common = 0
+        while common < len(b) and (a[common] if common < len(a) else "0") == b[common]:
+            common += 1
+        if common == len(b):
+            # ``b`` is ``a`` or ``a`` followed by zeros, so nothing sorts in between
+            raise ValueError("No rank fits below a rank that ends in 0")
+        if common:
+            return b[:common] + _midpoint(a[common:], b[common:])
+    low = DIGITS.index(a[0]) if a else 0
+    high = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if high - low > 1:
+        return DIGITS[(low + high) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[low] + _midpoint(a[1:], None)
+
+
+def rank_between(lower: Optional[str], upper: Optional[str]) -> str:
+    """A rank after ``lower`` and before ``upper``; None means no neighbour on that side"""
+    for bound in (lower, upper):
+        if bound is not None and bound.strip(DIGITS):
+            raise ValueError(f"Invalid rank {bound!r}")
+    if lower is not None and upper is not None and lower >= upper:
+        raise ValueError(f"Rank {lower!r} is not below {upper!r}")
+    # Appending and prepending step a digit, so keys grow slowly at the ends
+    if upper is None and lower:
+        digit = DIGITS.index(lower[0])
+        if digit < len(DIGITS) - 1:
+            return DIGITS[digit + 1]
+        return lower[0] + rank_between(lower[1:] or None, None)
+    if lower is None and upper:
+        digit = DIGITS.index(upper[0])
+        if digit > 1:
+            return DIGITS[digit - 1]
+    return _midpoint(lower or "", upper)
+
+
+def ranks_between(lower: Optional[str], upper: Optional[str], count: int) -> List[str]:
+    """``count`` increasing ranks between two neighbours, split evenly to keep them short"""
+    if count <= 0:
+        return []
+    middle = rank_between(lower, upper)
+    before = count // 2
+    return ranks_between(lower, middle, before) + [middle] + ranks_between(middle, upper, count - before - 1)
+
+
+def has_rank(item: Dict) -> bool:
+    return isinstance(item.get("rank"), str) and _RANK.match(item["rank"]) is not None
+
+
+def assign_ranks(items: List[Dict]) -> Dict[int, str]:
+    """New ranks, by index, that make ``items`` ascend in their list order
+
+    The longest run of items whose ranks already ascend keeps its ranks;
+    only the others get a new one between their kept neighbours.
+    """
+    # Longest increasing subsequence of the existing ranks (patience sorting)
+    tails: List[str] = []
+    tail_index: List[int] = []
+    previous: Dict[int, Optional[int]] = {}
+    for index, item in enumerate(items):
+        if not has_rank(item):
+            continue
+        slot = bisect_left(tails, item["rank"])
+        previous[index] = tail_index[slot - 1] if slot else None
+        if slot == len(tails):
+            tails.append(item["rank"])
+            tail_index.append(index)
+        else:
+            tails[slot] = item["rank"]
+            tail_index[slot] = index
+    kept = set()
+    index = tail_index[-1] if tail_index else None
+    while index is not None:
+        kept.add(index)
+        index = previous[index]
+
+    assigned = {}
+    run: List[int] = []
+    lower = None
+    for index in range(len(items) + 1):
+        if index < len(items) and index not in kept:
+            run.append(index)
+            continue
+        upper = items[index]["rank"] if index < len(items) else None
+        assigned.update(zip(run, ranks_between(lower, upper, len(run))))
+        run, lower = [], upper
+    return assigned
+
+
+def row_order(rows: List[Dict]) -> List[int]:
+    """Indices of ``rows`` in display order"""
+    if rows and all(has_rank(row) for row in rows):
+        return sorted(range(len(rows)), key=lambda index: rows[index]["rank"])
+    return list(range(len(rows)))
+
+
+def schedule_order(days: List[Dict], calltimes: List[Dict]) -> List[Tuple[str, int]]:
+    """``(kind, index)`` of every day and calltime in display order
+
+    Without ranks this is the editor's order: by position, days before
+    calltimes on a tie.
+    """
+    items = [("days", index, day) for index, day in enumerate(days)]
+    items += [("calltimes", index, calltime) for index, calltime in enumerate(calltimes)]
+    if items and all(has_rank(item) for _, _, item in items):
+        items.sort(key=lambda entry: entry[2]["rank"])
+    else:
+        items.sort(key=lambda entry: entry[2].get("position") or 0)
+    return [(kind, index) for kind, index, _ in items]
+
+
+def in_row_order(item: Dict) -> Dict:
+    if not item.get("rows"):
+        return item
+    return {**item, "rows": [item["rows"][index] for index in row_order(item["rows"])]}
+
+
+def in_schedule_order(doc: Dict) -> Dict:
+    """The document with days, calltimes and rows sorted and positions renumbered"""
+    present = [kind for kind in SCHEDULE_KINDS if kind in doc]
+    if not present:
+        return doc
+    ordered: Dict[str, List[Dict]] = {kind: [] for kind in present}
+    order = schedule_order(doc.get("days") or [], doc.get("calltimes") or [])
+    for position, (kind, index) in enumerate(order):
+        ordered[kind].append({**in_row_order(doc[kind][index]), "position": position})
+    return {**doc, **ordered}
+
+
+def rank_schedule(doc: Dict):
+    """Bring the ranks of a saved document in line with the order it was sent in
+
+    Days and calltimes are ordered by position (then by rank), rows by
+    their place in the list. Only lists that already use ranks are ranked.
+    """
+    days, calltimes = doc.get("days") or [], doc.get("calltimes") or []
+    items = [(day.get("position") or 0, day.get("rank") or "", day) for day in days]
+    items += [(calltime.get("position") or 0, calltime.get("rank") or "", calltime) for calltime in calltimes]
+    items = [item for _, _, item in sorted(items, key=lambda entry: entry[:2])]
+    for container in [items] + [item["rows"] for item in items if item.get("rows")]:
+        if any(has_rank(item) for item in container):
+            for index, rank in assign_ranks(container).items():
+                container[index]["rank"] = rank
+
+
+def place_after(siblings: List[Dict], index: int, after: Optional[int]) -> Dict[int, str]:
+    """New ranks, by index, that put ``siblings[index]`` right after ``siblings[after]``
+
+    ``siblings`` are in display order and ``after`` None means first.
+    Siblings without a rank are ranked in the same go.
+    """
+    assigned = assign_ranks(siblings) if not all(has_rank(item) for item in siblings) else {}
+    ranks = [assigned.get(i, item.get("rank")) for i, item in enumerate(siblings)]
+    others = [i for i in range(len(siblings)) if i != index]
+    slot = 0 if after is None else others.index(after) + 1
+    lower = ranks[others[slot - 1]] if slot > 0 else None
+    upper = ranks[others[slot]] if slot < len(others) else None
+    if (lower is None or lower < ranks[index]) and (upper is None or ranks[index] < upper):
+        return assigned
+    try:
+        assigned[index] = rank_between(lower, upper)
+    except ValueError:
+        # No key fits between the neighbours: rank the whole list afresh
+        order = others[:slot] + [index] + others[slot:]
+        return dict(zip(order, ranks_between(None, None, len(order))))
+    return assigned
+
+
+def set_path(doc: Any, path: str, value: Any):
+    """Set a dotted path such as ``days.3.rows.0.rank`` in a document"""
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc[int(part)] if isinstance(doc, list) else doc[part]
+    if isinstance(doc, list):
+        doc[int(parts[-1])] = value
+    else:
+        doc[parts[-1]] = value
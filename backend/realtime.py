@@ -0,0 +1,226 @@
+"""Live update channels for co-edited projects.
+
+Every open editor subscribes to ``/api/ws/projects/{project_id}``. After a
+successful write the server diffs the stored document against the new one
+and broadcasts the row-level operations, so clients can patch their local
+copy instead of re-fetching the whole project.
+
+Fan-out goes through a broker. ``InMemoryBroker`` delivers within a single
+worker process; a multi-worker deployment can plug in a broker backed by a
+shared bus (Redis pub/sub, Mongo change streams, ...) that implements the
+same three methods.
+"""
+from fastapi import WebSocket
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Top-level project fields that are broadcast as plain "set" operations
+PROJECT_FIELDS = ["name", "notes", "logo_url", "column_widths", "column_headers", "archived"]
+DAY_FIELDS = ["date", "position", "rank"]
+ROW_FIELDS = ["type", "time", "scene", "location", "cast", "notes", "rank"]
+CALLTIME_FIELDS = ["title", "headers", "position", "rank"]
+CALLTIME_ROW_FIELDS = ["type", "time", "name", "rank"]
+
+Deliver = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+def _changed_fields(old: Dict, new: Dict, fields: List[str]) -> Dict[str, Any]:
+    """Return the subset of fields whose value differs between two dicts"""
+    return {field: new.get(field) for field in fields if old.get(field) != new.get(field)}
+
+
+def _diff_list(old_items: List[Dict], new_items: List[Dict], fields: List[str],
+               kind: str, extra: Optional[Dict] = None) -> List[Dict]:
+    """Diff two id-keyed lists into add/remove/update/order operations.
+
+    Nested lists (rows) are not diffed here; the caller handles them so the
+    operations stay at row granularity.
+    """
+    extra = extra or {}
+    ops = []
+    old_by_id = {item.get('id'): item for item in old_items}
+    new_ids = [item.get('id') for item in new_items]
+    new_id_set = set(new_ids)
+
+    for item_id in old_by_id:
+        if item_id not in new_id_set:
+            ops.append({"op": f"{kind}_remove", **extra, "id": item_id})
+
+    for index, item in enumerate(new_items):
+        previous = old_by_id.get(item.get('id'))
+        if previous is None:
+            ops.append({"op": f"{kind}_add", **extra, "index": index, "value": item})
+            continue
+        changed = _changed_fields(previous, item, fields)
+        if changed:
+            ops.append({"op": f"{kind}_update", **extra, "id": item.get('id'), "fields": changed})
+
+    kept_old_order = [item.get('id') for item in old_items if item.get('id') in new_id_set]
+    kept_new_order = [item_id for item_id in new_ids if item_id in old_by_id]
+    if kept_old_order != kept_new_order:
+        ops.append({"op": f"{kind}_order", **extra, "order": new_ids})
+
+    return ops
+
+
+def _diff_nested(old_items: List[Dict], new_items: List[Dict], parent_kind: str,
+                 parent_fields: List[str], child_kind: str, child_fields: List[str]) -> List[Dict]:
+    """Diff a list of containers (days, calltimes) and the rows inside each"""
+    ops = _diff_list(old_items, new_items, parent_fields, parent_kind)
+    old_by_id = {item.get('id'): item for item in old_items}
+    for item in new_items:
+        previous = old_by_id.get(item.get('id'))
+        if previous is None:
+            # New containers carry their rows in the *_add operation
+            continue
+        ops.extend(_diff_list(
+            previous.get('rows', []),
+            item.get('rows', []),
+            child_fields,
+            child_kind,
+            extra={f"{parent_kind}_id": item.get('id')},
+        ))
+    return ops
+
+
+def diff_project(old: Dict, new: Dict) -> List[Dict]:
+    """Compute row-level operations that turn ``old`` into ``new``"""
+    ops = []
+    changed = _changed_fields(old, new, PROJECT_FIELDS)
+    if changed:
+        ops.append({"op": "project_update", "fields": changed})
+    ops.extend(_diff_nested(
+        old.get('days', []), new.get('days', []),
+        "day", DAY_FIELDS, "row", ROW_FIELDS,
+    ))
+    ops.extend(_diff_nested(
+        old.get('calltimes', []), new.get('calltimes', []),
+        "calltime", CALLTIME_FIELDS, "calltime_row", CALLTIME_ROW_FIELDS,
+    ))
+    return ops
+
+
+class InMemoryBroker:
+    """Broker that fans messages out inside the current process"""
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        if self._deliver is not None:
+            await self._deliver(channel, message)
+
+
+class ProjectHub:
+    """Tracks open project channels, presence and broadcasts"""
+
+    def __init__(self, broker=None):
+        self.broker = broker or InMemoryBroker()
+        self._channels: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        await self.broker.start(self._deliver_local)
+
+    async def stop(self):
+        await self.broker.stop()
+        for channel in list(self._channels.values()):
+            for member in list(channel.values()):
+                try:
+                    await member["socket"].close()
+                except Exception:
+                    pass
+        self._channels.clear()
+
+    def has_audience(self, project_id: str) -> bool:
+        """Whether a write to this project needs to be broadcast at all.
+
+        With the in-memory broker only local subscribers matter; a shared
+        broker cannot know about other workers, so it always broadcasts.
+        """
+        if not isinstance(self.broker, InMemoryBroker):
+            return True
+        return bool(self._channels.get(project_id))
+
+    def presence(self, project_id: str) -> List[Dict[str, str]]:
+        return [
+            {"client_id": client_id, "user": member["user"]}
+            for client_id, member in self._channels.get(project_id, {}).items()
+        ]
+
+    async def join(self, project_id: str, websocket: WebSocket, user: str,
+                   client_id: Optional[str] = None) -> str:
+        client_id = client_id or str(uuid.uuid4())
+        async with self._lock:
+            self._channels.setdefault(project_id, {})[client_id] = {
+                "socket": websocket,
+                "user": user,
+            }
+        await self.broker.publish(project_id, {
+            "type": "presence",
+            "event": "join",
+            "client_id": client_id,
+            "user": user,
+        })
+        return client_id
+
+    async def leave(self, project_id: str, client_id: str):
+        async with self._lock:
+            channel = self._channels.get(project_id, {})
+            member = channel.pop(client_id, None)
+            if not channel:
+                self._channels.pop(project_id, None)
+        if member is not None:
+            await self.broker.publish(project_id, {
+                "type": "presence",
+                "event": "leave",
+                "client_id": client_id,
+                "user": member["user"],
+            })
+
+    async def publish_delta(self, project_id: str, old: Dict, new: Dict,
+                            origin: Optional[str] = None):
+        """Broadcast the difference between two versions of a project"""
+        if not self.has_audience(project_id):
+            return
+        ops = diff_project(old, new)
+        if not ops:
+            return
+        await self.broker.publish(project_id, {
+            "type": "delta",
+            "project_id": project_id,
+            "version": new.get('version'),
+            "updated_at": new.get('updated_at'),
+            "origin": origin,
+            "ops": ops,
+        })
+
+    async def publish_event(self, project_id: str, message: Dict[str, Any]):
+        if self.has_audience(project_id):
+            await self.broker.publish(project_id, {"project_id": project_id, **message})
+
+    async def _deliver_local(self, channel: str, message: Dict[str, Any]):
+        members = list(self._channels.get(channel, {}).items())
+        # A client is not told about its own presence; it learns its id from "welcome"
+        about = message.get("client_id") if message.get("type") == "presence" else None
+        dead = []
+        for client_id, member in members:
+            if client_id == about:
+                continue
+            try:
+                await member["socket"].send_json(message)
+            except Exception as e:
+                logger.warning(f"Dropping websocket client {client_id}: {e}")
+                dead.append(client_id)
+        for client_id in dead:
+            await self.leave(channel, client_id)
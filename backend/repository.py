@@ -0,0 +1,322 @@
+"""Persistence of project documents.
+
+Endpoints read and write projects through ``ProjectRepository`` instead of
+querying ``db.projects`` directly, the same way revisions, shared days and
+cold storage already sit behind their stores. The repository only needs
+the Motor collection API, so it runs on MongoDB or on the embedded SQLite
+store from ``embedded.py``; ``client_from_env`` picks one from
+``DATABASE_BACKEND``.
+
+Every write that bumps a project's ``version`` also stamps it with the next
+number of a global ``change_seq`` from ``ChangeLog``, and removed projects
+leave a tombstone with theirs, so clients can sync "changes since" a cursor.
+
+Projects and tombstones belong to a workspace (see ``workspaces.py``): the
+repository narrows every query to the active one, and its indexes lead on
+``workspace`` so a tenant's reads stay inside its own index range.
+"""
+from bson import ObjectId
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from pymongo import ReturnDocument
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Union
+import asyncio
+import os
+import re
+
+from workspaces import DEFAULT_WORKSPACE, WorkspaceUsage, workspace, workspace_query
+
+ProjectId = Union[str, ObjectId]
+
+
+def client_from_env(root: Path, event_listeners: Optional[List] = None):
+    """MongoDB client, or the embedded store when DATABASE_BACKEND=sqlite
+
+    Command ``event_listeners`` only apply to MongoDB.
+    """
+    if os.environ.get('DATABASE_BACKEND', 'mongo').lower() == 'sqlite':
+        from embedded import EmbeddedClient
+
+        return EmbeddedClient(os.environ.get('SQLITE_PATH', str(root / 'filmschedule.sqlite3')))
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    return AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=event_listeners or [])
+
+
+def _object_id(project_id: ProjectId) -> ObjectId:
+    return project_id if isinstance(project_id, ObjectId) else ObjectId(project_id)
+
+
+# What deleting a project needs to know to release it from its workspace
+RELEASE_FIELDS = ("_id", "workspace", "size")
+
+
+def _projection(fields: Optional[Iterable[str]]) -> Optional[Dict]:
+    return {field: 1 for field in fields} if fields else None
+
+
+# Derived data served by endpoints of its own, left out of project reads for clients
+DERIVED_FIELDS = {"stats": 0}
+
+
+class ChangeLog:
+    """Monotonic change sequence of projects and tombstones of removed ones
+
+    Sequence numbers are handed out under a lock and tracked until their
+    write has finished, so ``horizon`` never moves past a write that is still
+    in flight in this process.
+    """
+
+    def __init__(self, counters, tombstones, name: str = "projects"):
+        self.counters = counters
+        self.tombstones = tombstones
+        self.name = name
+        self._lock = asyncio.Lock()
+        self._pending: Set[int] = set()
+
+    async def ensure_indexes(self):
+        await self.tombstones.update_many(
+            {"workspace": {"$exists": False}}, {"$set": {"workspace": DEFAULT_WORKSPACE}}
+        )
+        await self.tombstones.create_index([("workspace", 1), ("change_seq", 1)])
+
+    @asynccontextmanager
+    async def stamp(self):
+        """Reserve the next sequence number for the write done inside the block"""
+        async with self._lock:
+            counter = await self.counters.find_one_and_update(
+                {"_id": self.name},
+                {"$inc": {"seq": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            seq = counter["seq"]
+            self._pending.add(seq)
+        try:
+            yield seq
+        finally:
+            self._pending.discard(seq)
+
+    async def horizon(self) -> int:
+        """Highest sequence number below which every write has finished"""
+        async with self._lock:
+            if self._pending:
+                return min(self._pending) - 1
+            counter = await self.counters.find_one({"_id": self.name})
+            return counter["seq"] if counter else 0
+
+    async def record_removal(self, project_id: ObjectId, reason: str, workspace: str):
+        """Leave a tombstone for a project that was deleted ("deleted") or frozen ("cold")"""
+        await self.record_removals([project_id], reason, workspace)
+
+    async def record_removals(self, project_ids: List[ObjectId], reason: str, workspace: str):
+        """Tombstones for several projects of one workspace, sharing one sequence number"""
+        if not project_ids:
+            return
+        async with self.stamp() as seq:
+            await self.tombstones.delete_many({"_id": {"$in": project_ids}})
+            await self.tombstones.insert_many([
+                {"_id": project_id, "workspace": workspace, "change_seq": seq, "reason": reason,
+                 "removed_at": datetime.now()}
+                for project_id in project_ids
+            ])
+
+    async def forget_removal(self, project_id: ObjectId):
+        await self.tombstones.delete_one({"_id": project_id})
+
+    def removed_at(self, seq: int):
+        return self.tombstones.find(workspace_query({"change_seq": seq}))
+
+    def removed_since(self, since: int, until: int, limit: int):
+        """Tombstones with ``since < change_seq <= until``, oldest change first"""
+        return self.tombstones.find(
+            workspace_query({"change_seq": {"$gt": since, "$lte": until}})
+        ).sort("change_seq", 1).limit(limit)
+
+
+class ProjectRepository:
+    """Projects of the active workspace
+
+    With ``usage`` every insert, delete and write of a project's ``size``
+    also moves its workspace's usage counters.
+    """
+
+    def __init__(self, collection, changes: ChangeLog, usage: Optional[WorkspaceUsage] = None):
+        self.collection = collection
+        self.changes = changes
+        self.usage = usage
+
+    async def ensure_indexes(self):
+        # Projects saved before workspaces existed belong to the default one
+        await self.collection.update_many(
+            {"workspace": {"$exists": False}}, {"$set": {"workspace": DEFAULT_WORKSPACE}}
+        )
+        await self.collection.create_index([("workspace", 1), ("name", 1)])
+        await self.collection.create_index([("workspace", 1), ("change_seq", 1)])
+        await self.collection.create_index([("workspace", 1), ("archived", 1)])
+        # Projects saved before the change sequence existed get one each
+        unstamped = await self.collection.find(
+            {"change_seq": {"$exists": False}}, {"_id": 1}
+        ).to_list(length=None)
+        for project in unstamped:
+            async with self.changes.stamp() as seq:
+                await self.collection.update_one(
+                    {"_id": project["_id"], "change_seq": {"$exists": False}},
+                    {"$set": {"change_seq": seq}}
+                )
+
+    async def get(self, project_id: ProjectId, fields: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        return await self.collection.find_one(
+            workspace_query({"_id": _object_id(project_id)}), _projection(fields)
+        )
+
+    async def get_view(self, project_id: ProjectId) -> Optional[Dict]:
+        """The project as clients read it, without derived data"""
+        return await self.collection.find_one(
+            workspace_query({"_id": _object_id(project_id)}), DERIVED_FIELDS
+        )
+
+    async def get_skeleton(self, project_id: ProjectId) -> Optional[Dict]:
+        """The project with its day headers but without their rows or derived data"""
+        return await self.collection.find_one(
+            workspace_query({"_id": _object_id(project_id)}), {"days.rows": 0, **DERIVED_FIELDS}
+        )
+
+    async def get_days(self, project_id: ProjectId, start: int, count: int) -> Optional[Dict]:
+        """``version`` and the ``count`` days from position ``start``, sliced in the database"""
+        return await self.collection.find_one(
+            workspace_query({"_id": _object_id(project_id)}),
+            {"version": 1, "days": {"$slice": [start, count]}}
+        )
+
+    async def each(self, project_ids: Iterable[ProjectId]) -> AsyncIterator[Dict]:
+        """Full projects fetched one at a time, skipping any removed since their ids were read
+
+        For walks over many projects: a cursor over full documents buffers a whole batch of them.
+        """
+        for project_id in project_ids:
+            project = await self.get(project_id)
+            if project is not None:
+                yield project
+
+    async def exists(self, project_id: ProjectId) -> bool:
+        return await self.get(project_id, ["_id"]) is not None
+
+    async def get_by_name(self, name: str) -> Optional[Dict]:
+        return await self.collection.find_one(workspace_query({"name": name}))
+
+    def find(self, archived: Optional[bool] = None, fields: Optional[Iterable[str]] = None,
+             ids: Optional[Iterable[ProjectId]] = None, name_contains: Optional[str] = None):
+        """Cursor over all projects, or only archived (True) or active (False) ones,
+        optionally narrowed to some ids or a case-insensitive name substring"""
+        query = {}
+        if archived is True:
+            query["archived"] = True
+        elif archived is False:
+            query["archived"] = {"$ne": True}
+        if ids is not None:
+            query["_id"] = {"$in": [_object_id(project_id) for project_id in ids]}
+        if name_contains:
+            query["name"] = {"$regex": re.escape(name_contains), "$options": "i"}
+        return self.collection.find(workspace_query(query), _projection(fields))
+
+    def changed_since(self, since: int, until: int, fields: Optional[Iterable[str]] = None,
+                      limit: int = 0):
+        """Cursor over projects with ``since < change_seq <= until``, oldest change first"""
+        return self.collection.find(
+            workspace_query({"change_seq": {"$gt": since, "$lte": until}}),
+            _projection(fields)
+        ).sort("change_seq", 1).limit(limit)
+
+    def changed_at(self, seq: int, fields: Optional[Iterable[str]] = None):
+        """Cursor over the projects written by the change ``seq`` (bulk writes share one)"""
+        return self.collection.find(workspace_query({"change_seq": seq}), _projection(fields))
+
+    async def insert(self, project: Dict) -> str:
+        """Insert a new project into the active workspace; like Motor, fills in ``project['_id']``"""
+        project["workspace"] = workspace()
+        async with self.changes.stamp() as seq:
+            project["change_seq"] = seq
+            result = await self.collection.insert_one(project)
+        if self.usage:
+            await self.usage.add(project["workspace"], 1, project.get("size", 0))
+        return str(result.inserted_id)
+
+    async def update(self, project_id: ProjectId, fields: Dict, bump_version: bool = True,
+                     expected_version: Optional[int] = None) -> bool:
+        """Set fields; unless ``bump_version`` is off this is a change clients sync
+
+        With ``expected_version`` nothing is written unless the project is still at that version.
+        """
+        query = workspace_query({"_id": _object_id(project_id)})
+        if expected_version is not None:
+            query["version"] = expected_version
+        if not bump_version:
+            result = await self.collection.update_one(query, {"$set": fields})
+            return result.matched_count > 0
+        async with self.changes.stamp() as seq:
+            result = await self.collection.update_one(
+                query,
+                {"$set": {**fields, "change_seq": seq}, "$inc": {"version": 1}}
+            )
+        return result.matched_count > 0
+
+    async def update_returning_previous(self, project_id: ProjectId, fields: Dict,
+                                        expected_version: Optional[int] = None) -> Optional[Dict]:
+        """Set fields and bump the version; returns the document as it was before
+
+        With ``expected_version`` nothing is written (and None returned) unless
+        the project is still at that version.
+        """
+        query = workspace_query({"_id": _object_id(project_id)})
+        if expected_version is not None:
+            query["version"] = expected_version
+        async with self.changes.stamp() as seq:
+            previous = await self.collection.find_one_and_update(
+                query,
+                {"$set": {**fields, "change_seq": seq}, "$inc": {"version": 1}},
+                return_document=ReturnDocument.BEFORE
+            )
+        if previous and self.usage and "size" in fields:
+            await self.usage.add(previous["workspace"], 0, fields["size"] - previous.get("size", 0))
+        return previous
+
+    async def update_many(self, project_ids: Iterable[ProjectId], fields: Dict) -> int:
+        """Set fields on several projects in one write; they share one change"""
+        async with self.changes.stamp() as seq:
+            result = await self.collection.update_many(
+                workspace_query({"_id": {"$in": [_object_id(project_id) for project_id in project_ids]}}),
+                {"$set": {**fields, "change_seq": seq}, "$inc": {"version": 1}}
+            )
+        return result.modified_count
+
+    async def _release(self, projects: List[Dict]):
+        """Tombstones and usage for deleted projects, per workspace"""
+        by_workspace: Dict[str, List[Dict]] = {}
+        for project in projects:
+            by_workspace.setdefault(project["workspace"], []).append(project)
+        for name, removed in by_workspace.items():
+            await self.changes.record_removals([project["_id"] for project in removed], "deleted", name)
+            if self.usage:
+                await self.usage.add(name, -len(removed), -sum(project.get("size", 0) for project in removed))
+
+    async def delete_many(self, project_ids: Iterable[ProjectId]) -> int:
+        query = workspace_query({"_id": {"$in": [_object_id(project_id) for project_id in project_ids]}})
+        projects = await self.collection.find(query, _projection(RELEASE_FIELDS)).to_list(length=None)
+        result = await self.collection.delete_many(
+            {"_id": {"$in": [project["_id"] for project in projects]}}
+        )
+        await self._release(projects)
+        return result.deleted_count
+
+    async def delete(self, project_id: ProjectId) -> bool:
+        project = await self.get(project_id, RELEASE_FIELDS)
+        if project is None:
+            return False
+        result = await self.collection.delete_one({"_id": project["_id"]})
+        if result.deleted_count == 0:
+            return False
+        await self._release([project])
+        return True
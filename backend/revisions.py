@@ -0,0 +1,230 @@
+"""Delta-compressed revision history for projects.
+
+Each persisted write stores a revision numbered after the project version.
+Most revisions hold only a patch against the previous revision; every
+``snapshot_interval`` revisions (or whenever the chain would be broken) a
+full snapshot is stored instead, so reconstructing any revision replays at
+most ``snapshot_interval`` patches.
+
+Patch format (kept short because it is stored for every save):
+
+* ``{"=": value}`` replaces a value outright
+* ``{"d": {key: patch}, "r": [keys]}`` changes and removes dict keys
+* ``{"x": [ids], "a": [[index, item]], "p": [[id, patch]], "l": [ids]}``
+  patches a list of dicts keyed by ``id``: removed ids, added items with
+  their final index, patched items and, only when surviving items were
+  reordered, the full new order
+* ``{"n": length, "i": [[index, patch]]}`` patches any other list of dicts
+  (such as rows with duplicate ids) position by position: the new length
+  and the patches of the positions that changed
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import copy
+import json
+
+# Fields that describe the stored document rather than the project content
+EXCLUDED_FIELDS = ("_id", "version")
+
+
+def _is_keyed_list(value: Any) -> bool:
+    """A list of dicts with unique ids, which can be patched by id"""
+    if not isinstance(value, list) or not all(isinstance(item, dict) and 'id' in item for item in value):
+        return False
+    ids = [item['id'] for item in value]
+    return len(set(map(json.dumps, ids))) == len(ids)
+
+
+def _is_dict_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+
+def make_patch(old: Any, new: Any) -> Optional[Dict]:
+    """Return a patch turning ``old`` into ``new``, or None if they are equal"""
+    if old == new:
+        return None
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = {}
+        for key, value in new.items():
+            if key not in old:
+                changes[key] = {"=": value}
+            else:
+                sub = make_patch(old[key], value)
+                if sub is not None:
+                    changes[key] = sub
+        removed = [key for key in old if key not in new]
+        patch = {}
+        if changes:
+            patch["d"] = changes
+        if removed:
+            patch["r"] = removed
+        return patch
+
+    if old and new and _is_keyed_list(old) and _is_keyed_list(new):
+        old_by_id = {item['id']: item for item in old}
+        new_ids = [item['id'] for item in new]
+        new_id_set = set(new_ids)
+        patch = {}
+
+        removed = [item['id'] for item in old if item['id'] not in new_id_set]
+        added = []
+        patched = []
+        for index, item in enumerate(new):
+            previous = old_by_id.get(item['id'])
+            if previous is None:
+                added.append([index, item])
+            else:
+                sub = make_patch(previous, item)
+                if sub is not None:
+                    patched.append([item['id'], sub])
+
+        kept_old_order = [item['id'] for item in old if item['id'] in new_id_set]
+        kept_new_order = [item_id for item_id in new_ids if item_id in old_by_id]
+
+        if removed:
+            patch["x"] = removed
+        if added:
+            patch["a"] = added
+        if patched:
+            patch["p"] = patched
+        if kept_old_order != kept_new_order:
+            patch["l"] = new_ids
+        return patch
+
+    if old and new and _is_dict_list(old) and _is_dict_list(new):
+        # Ids are missing or repeated, so items can only be matched by position
+        changed = []
+        for index, item in enumerate(new):
+            sub = make_patch(old[index], item) if index < len(old) else {"=": item}
+            if sub is not None:
+                changed.append([index, sub])
+        patch = {"n": len(new)}
+        if changed:
+            patch["i"] = changed
+        return patch
+
+    return {"=": new}
+
+
+def apply_patch(value: Any, patch: Optional[Dict]) -> Any:
+    """Apply a patch produced by ``make_patch``; ``value`` is not modified"""
+    if not patch:
+        return copy.deepcopy(value)
+    if "=" in patch:
+        return copy.deepcopy(patch["="])
+
+    if "d" in patch or "r" in patch:
+        result = {key: item for key, item in value.items() if key not in patch.get("r", [])}
+        for key, sub in patch.get("d", {}).items():
+            result[key] = apply_patch(result.get(key), sub)
+        return result
+
+    if "n" in patch:
+        items = list(value[:patch["n"]]) + [None] * (patch["n"] - len(value))
+        for index, sub in patch.get("i", []):
+            items[index] = apply_patch(items[index], sub)
+        return items
+
+    removed = set(patch.get("x", []))
+    patched = dict((item_id, sub) for item_id, sub in patch.get("p", []))
+    items = [
+        apply_patch(item, patched.get(item['id'])) if item['id'] in patched else item
+        for item in value if item['id'] not in removed
+    ]
+    if "l" in patch:
+        by_id = {item['id']: item for item in items}
+        for _, item in patch.get("a", []):
+            by_id[item['id']] = item
+        return [by_id[item_id] for item_id in patch["l"]]
+    for index, item in sorted(patch.get("a", []), key=lambda pair: pair[0]):
+        items.insert(index, item)
+    return items
+
+
+def strip_document(doc: Dict) -> Dict:
+    """Project content as stored in revisions"""
+    return {key: value for key, value in doc.items() if key not in EXCLUDED_FIELDS}
+
+
+def _size(data: Any) -> int:
+    return len(json.dumps(data, default=str))
+
+
+class RevisionStore:
+    def __init__(self, collection, snapshot_interval: int = 10):
+        self.collection = collection
+        self.snapshot_interval = max(1, snapshot_interval)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("project_id", 1), ("rev", -1)], unique=True)
+
+    async def record(self, project_id: str, previous: Optional[Dict], current: Dict):
+        """Store the revision for ``current``, diffing against ``previous`` when possible"""
+        rev = current.get('version', 1)
+        content = strip_document(current)
+        latest = None
+        if previous is not None:
+            latest = await self.collection.find_one(
+                {"project_id": project_id},
+                {"rev": 1, "snapshot_rev": 1},
+                sort=[("rev", -1)]
+            )
+
+        chain_intact = (
+            latest is not None
+            and latest["rev"] == previous.get('version', 0)
+            and rev - latest["snapshot_rev"] < self.snapshot_interval
+        )
+        if chain_intact:
+            patch = make_patch(strip_document(previous), content) or {}
+            revision = {"kind": "diff", "data": patch, "snapshot_rev": latest["snapshot_rev"]}
+        else:
+            revision = {"kind": "snapshot", "data": content, "snapshot_rev": rev}
+
+        revision.update({
+            "project_id": project_id,
+            "rev": rev,
+            "created_at": datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
+            "size": _size(revision["data"]),
+        })
+        await self.collection.replace_one(
+            {"project_id": project_id, "rev": rev},
+            revision,
+            upsert=True
+        )
+
+    async def list(self, project_id: str, limit: int = 100) -> List[Dict]:
+        cursor = self.collection.find(
+            {"project_id": project_id},
+            {"_id": 0, "data": 0}
+        ).sort("rev", -1).limit(limit)
+        return await cursor.to_list(length=None)
+
+    async def load(self, project_id: str, rev: int) -> Optional[Dict]:
+        """Reconstruct the project content at ``rev``"""
+        target = await self.collection.find_one(
+            {"project_id": project_id, "rev": rev},
+            {"snapshot_rev": 1}
+        )
+        if target is None:
+            return None
+
+        cursor = self.collection.find({
+            "project_id": project_id,
+            "rev": {"$gte": target["snapshot_rev"], "$lte": rev}
+        }).sort("rev", 1)
+        chain = await cursor.to_list(length=None)
+        content = None
+        for revision in chain:
+            if revision["kind"] == "snapshot":
+                content = revision["data"]
+            else:
+                content = apply_patch(content, revision["data"])
+        return content
+
+    async def delete_project(self, project_id: str):
+        await self.collection.delete_many({"project_id": project_id})
+
+    async def delete_projects(self, project_ids: List[str]):
+        await self.collection.delete_many({"project_id": {"$in": project_ids}})
@@ -1,19 +1,48 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, HTMLResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Awaitable, Callable, Optional, Tuple
 import uuid
-from datetime import datetime
-import csv
+import urllib.parse
+from datetime import datetime, timedelta
+import asyncio
+import copy
 import io
+import json
+import itertools
+import tempfile
+
+from realtime import ProjectHub, diff_project
+from write_buffer import WriteBehindBuffer
+from revisions import RevisionStore
+from templates import SharedDayStore, is_day_ref, make_day_ref
+from payloads import Rank, parse_project
+from conflicts import WorkspaceConflictIndex, person_key
+from calltimes import generate_calltimes, merge_calltimes
+from stats import compute_project_stats
+from cold_storage import ColdStorage
+from limits import InMemoryRateLimitStore, LimitsMiddleware, RouteLimit
+from upload_gc import collect_orphaned_uploads, delete_unreferenced, filename_from_url
+from storage import LocalMediaStorage, storage_from_env
+from repository import ChangeLog, ProjectRepository, client_from_env
+from tracing import RequestTracingMiddleware, SlowOperationListener, configure_logging
+from ics import calendar_etag, calendar_footer, calendar_header, project_events
+from xlsx_export import write_project_xlsx
+from exports import ZipStream, archive_name, write_project_csv
+from idempotency import IdempotencyStore, fingerprint
+from jobs import JobContext, JobRunner
+from ranks import (has_rank, in_row_order, in_schedule_order, place_after, rank_schedule, ranks_between,
+                   row_order, schedule_order, set_path)
+from workspaces import (ALL_WORKSPACES, WorkspaceMiddleware, WorkspaceUsage, document_size, in_workspace,
+                        workspace, workspace_query)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -22,11 +51,26 @@ load_dotenv(ROOT_DIR / '.env')
 UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# MongoDB commands slower than this are logged with their route and project (0 disables)
+SLOW_OPERATION_MS = float(os.environ.get('SLOW_OPERATION_MS', '100'))
+
+# MongoDB connection (or the embedded SQLite store with DATABASE_BACKEND=sqlite)
+client = client_from_env(
+    ROOT_DIR,
+    event_listeners=[SlowOperationListener(SLOW_OPERATION_MS)] if SLOW_OPERATION_MS > 0 else []
+)
 db = client[os.environ.get('DB_NAME', 'filmschedule')]
 
+# Quotas per workspace (0 = unlimited); uploaded media does not count against storage
+WORKSPACE_MAX_PROJECTS = int(os.environ.get('WORKSPACE_MAX_PROJECTS', '0'))
+WORKSPACE_MAX_STORAGE_MB = float(os.environ.get('WORKSPACE_MAX_STORAGE_MB', '0'))
+workspace_usage = WorkspaceUsage(
+    db.workspaces, WORKSPACE_MAX_PROJECTS, int(WORKSPACE_MAX_STORAGE_MB * 1024 * 1024)
+)
+
+change_log = ChangeLog(db.counters, db.project_tombstones)
+project_store = ProjectRepository(db.projects, change_log, workspace_usage)
+
 # Create the main app
 app = FastAPI()
 
@@ -36,13 +80,58 @@ api_router = APIRouter(prefix="/api")
 # Mount static files for uploads - must be after API routes are registered
 # Will mount this after including the router
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging; LOG_FORMAT=json makes application logs JSON lines too
+configure_logging(os.environ.get('LOG_FORMAT', 'text'))
 logger = logging.getLogger(__name__)
 
+# Live update channels for co-edited projects
+hub = ProjectHub()
+
+# Saves of the same project within this window collapse into one write
+SAVE_COALESCE_WINDOW_MS = int(os.environ.get('SAVE_COALESCE_WINDOW_MS', '250'))
+
+# Revision history: a full snapshot is stored at least every N revisions
+REVISION_SNAPSHOT_INTERVAL = int(os.environ.get('REVISION_SNAPSHOT_INTERVAL', '10'))
+revision_store = RevisionStore(db.project_revisions, REVISION_SNAPSHOT_INTERVAL)
+
+# Responses of saves and duplicates sent with an Idempotency-Key are replayed for this long
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+idempotency_keys = IdempotencyStore(db.idempotency_keys, int(IDEMPOTENCY_KEY_TTL_HOURS * 3600))
+
+# Content-addressed days shared between templates and their duplicates
+shared_days = SharedDayStore(db.shared_days)
+
+# Cast bookings of all active projects, for double-booking detection
+conflict_index = WorkspaceConflictIndex()
+
+# Projects archived for longer than this move to the compressed cold tier
+COLD_STORAGE_AFTER_DAYS = int(os.environ.get('COLD_STORAGE_AFTER_DAYS', '180'))
+COLD_STORAGE_SWEEP_HOURS = float(os.environ.get('COLD_STORAGE_SWEEP_HOURS', '0'))
+cold_storage = ColdStorage(db.projects, db.projects_cold, change_log, workspace_usage)
+
+# Background jobs: worker tasks in this process, and how long finished jobs are kept
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_RETENTION_DAYS = float(os.environ.get('JOB_RETENTION_DAYS', '7'))
+jobs = JobRunner(db.jobs, workers=JOB_WORKERS, retention_days=JOB_RETENTION_DAYS)
+
+# Bulk operations on more projects than this run as a background job
+BULK_INLINE_LIMIT = int(os.environ.get('BULK_INLINE_LIMIT', '100'))
+BULK_BATCH_SIZE = 500
+
+# Active projects whose last day has passed are archived by a periodic job
+AUTO_ARCHIVE_INTERVAL_HOURS = float(os.environ.get('AUTO_ARCHIVE_INTERVAL_HOURS', '1'))
+
+# Unreferenced uploads older than the grace period are deleted by the GC
+UPLOAD_GC_INTERVAL_HOURS = float(os.environ.get('UPLOAD_GC_INTERVAL_HOURS', '0'))
+UPLOAD_GC_GRACE_HOURS = float(os.environ.get('UPLOAD_GC_GRACE_HOURS', '24'))
+
+# Where uploaded media lives: the local uploads directory or an S3-compatible bucket
+media_storage = storage_from_env(UPLOAD_DIR)
+LOGO_CONTENT_TYPES = {"image/jpeg": "jpg", "image/jpg": "jpg", "image/png": "png"}
+LOGO_MAX_BYTES = 5 * 1024 * 1024
+# Lifetime of presigned direct-upload targets
+UPLOAD_URL_EXPIRES_SECONDS = int(os.environ.get('UPLOAD_URL_EXPIRES_SECONDS', '900'))
+
 
 # Models
 class ScheduleRow(BaseModel):
@@ -53,6 +142,7 @@ class ScheduleRow(BaseModel):
     location: str = ""
     cast: str = ""
     notes: str = ""
+    rank: Optional[Rank] = None  # fractional order key, see ranks.py
 
 
 class ScheduleDay(BaseModel):
@@ -60,6 +150,7 @@ class ScheduleDay(BaseModel):
     date: str  # DD-MM-YYYY format
     rows: List[ScheduleRow] = []
     position: int = 0
+    rank: Optional[Rank] = None
 
 
 class CalltimeRow(BaseModel):
@@ -67,6 +158,7 @@ class CalltimeRow(BaseModel):
     time: str = ""
     name: str = ""
     type: str = "item"  # 'item' or 'text'
+    rank: Optional[Rank] = None
 
 
 class CalltimeHeaders(BaseModel):
@@ -80,6 +172,23 @@ class Calltime(BaseModel):
     headers: Optional[CalltimeHeaders] = None
     rows: List[CalltimeRow] = []
     position: int = 0
+    rank: Optional[Rank] = None
+    source_day_id: Optional[str] = None  # set on blocks generated from a schedule day
+
+
+class CalltimeGeneration(BaseModel):
+    lead_minutes: int = Field(default=60, ge=0)
+    write: bool = False
+
+
+class LogoUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+    size: int = Field(ge=1)
+
+
+class LogoUploadComplete(BaseModel):
+    key: str
 
 
 class ColumnWidths(BaseModel):
@@ -109,6 +218,8 @@ class Project(BaseModel):
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
     archived: bool = False
+    is_template: bool = False
+    template_id: Optional[str] = None
 
 
 class ProjectResponse(BaseModel):
@@ -134,6 +245,24 @@ class ProjectListItem(BaseModel):
     day_count: int
 
 
+class MoveRequest(BaseModel):
+    id: str
+    after: Optional[str] = None  # sibling to place it after; None moves it to the front
+    parent_id: Optional[str] = None  # day or calltime of a row; None for days and calltimes
+
+
+class BulkProjectFilter(BaseModel):
+    archived: Optional[bool] = None
+    name_contains: Optional[str] = None
+    all: bool = False  # required to delete by a filter without criteria, i.e. every project
+
+
+class BulkProjectRequest(BaseModel):
+    action: str  # 'archive', 'unarchive' or 'delete'
+    ids: Optional[List[str]] = None
+    filter: Optional[BulkProjectFilter] = None
+
+
 # Helper functions
 def serialize_doc(doc: Dict) -> Dict:
     """Convert MongoDB document to JSON-serializable format"""
@@ -154,9 +283,41 @@ def serialize_doc(doc: Dict) -> Dict:
     return result
 
 
-def format_date_dd_mm_yyyy(date_str: str) -> str:
-    """Ensure date is in DD-MM-YYYY format"""
-    return date_str
+# Derived and bookkeeping fields of stored projects: stats are served by
+# /projects/{id}/stats, the rest never leaves the server
+PRIVATE_PROJECT_FIELDS = ("stats", "size", "change_seq", "workspace", "archived_at")
+
+
+def project_response(project: Dict) -> Dict:
+    """A project as endpoints return it, without derived and internal fields"""
+    return serialize_doc({key: value for key, value in project.items() if key not in PRIVATE_PROJECT_FIELDS})
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def content_disposition(filename: str) -> str:
+    """Attachment header that survives non-ASCII project names (RFC 6266)"""
+    fallback = filename.encode("ascii", "replace").decode("ascii").replace('"', "'")
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{urllib.parse.quote(filename, safe="")}'
+
+
+def iter_file(file, chunk_size: int = 64 * 1024):
+    """Stream a temporary file in chunks and close it afterwards"""
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
 
 
 def parse_date(date_str: str) -> datetime:
@@ -181,6 +342,71 @@ def is_project_archived(project: Dict) -> bool:
     return True
 
 
+async def flush_project_write(project_id: str, payload: Dict) -> Dict:
+    """Persist the latest buffered save of a project and bump its version.
+
+    Returns the written document with shared days resolved.
+    """
+    project_dict = payload["doc"]
+    previous = await project_store.update_returning_previous(project_id, project_dict)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    updated = {**previous, **project_dict, "version": previous.get('version', 0) + 1}
+    await revision_store.record(project_id, previous, updated)
+    
+    view = await shared_days.resolve(updated)
+    conflict_index.update(project_id, view)
+    if hub.has_audience(project_id):
+        await hub.publish_delta(
+            project_id,
+            await shared_days.resolve(previous),
+            view,
+            origin=payload.get("origin")
+        )
+    return view
+
+
+async def store_days(project_dict: Dict, existing: Optional[Dict]) -> List[Dict]:
+    """Days in their stored form: shared for templates, stubs where a copy is unedited"""
+    if project_dict.get('is_template'):
+        return await shared_days.share(project_dict['days'])
+    return shared_days.compact(project_dict['days'], (existing or {}).get('days', []))
+
+
+def combine_project_writes(pending: Dict, latest: Dict) -> Dict:
+    """Merge two buffered writes; later $set fields win, as if applied in order"""
+    return {"doc": {**pending["doc"], **latest["doc"]}, "origin": latest.get("origin")}
+
+
+write_buffer = WriteBehindBuffer(
+    flush_project_write,
+    SAVE_COALESCE_WINDOW_MS / 1000,
+    combine=combine_project_writes
+)
+
+
+def track_archived_at(project_dict: Dict, existing: Optional[Dict]):
+    """Record when a project became archived, for the cold storage sweep"""
+    if not project_dict['archived']:
+        project_dict['archived_at'] = None
+    elif not (existing or {}).get('archived'):
+        project_dict['archived_at'] = datetime.now()
+
+
+def apply_display_defaults(project_dict: Dict):
+    """Fill in column and calltime header defaults when not provided"""
+    if project_dict['column_widths'] is None:
+        project_dict['column_widths'] = ColumnWidths().model_dump()
+    
+    if project_dict['column_headers'] is None:
+        project_dict['column_headers'] = ColumnHeaders().model_dump()
+    
+    for calltime in project_dict['calltimes']:
+        if calltime['headers'] is None:
+            calltime['headers'] = CalltimeHeaders().model_dump()
+
+
 # Endpoints
 @api_router.get("/health")
 async def health_check():
@@ -212,11 +438,17 @@ async def upload_logo(file: UploadFile = File(...)):
         # Generate safe filename
         file_ext = file.filename.split('.')[-1]
         safe_filename = f"{uuid.uuid4()}.{file_ext}"
-        file_path = UPLOAD_DIR / safe_filename
         
         # Save file
-        with open(file_path, 'wb') as f:
-            f.write(content)
+        await media_storage.save(safe_filename, content, file.content_type)
+        await db.media.insert_one({
+            "_id": safe_filename,
+            "workspace": workspace(),
+            "content_type": file.content_type,
+            "size": len(content),
+            "status": "ready",
+            "created_at": datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+        })
         
         logo_url = f"/api/media/{safe_filename}"
         logger.info(f"Logo uploaded: {logo_url}")
@@ -233,147 +465,427 @@ async def upload_logo(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.post("/uploads/logo/presign")
+async def presign_logo_upload(upload: LogoUploadRequest):
+    """Hand out a short-lived target the client uploads the logo to directly"""
+    try:
+        if upload.content_type not in LOGO_CONTENT_TYPES:
+            raise HTTPException(status_code=400, detail="Only JPG and PNG files are allowed")
+        if upload.size > LOGO_MAX_BYTES:
+            raise HTTPException(status_code=400, detail="File size must be less than 5MB")
+        
+        key = f"{uuid.uuid4()}.{LOGO_CONTENT_TYPES[upload.content_type]}"
+        target = await media_storage.presign_upload(
+            key, upload.content_type, LOGO_MAX_BYTES, UPLOAD_URL_EXPIRES_SECONDS
+        )
+        await db.media.insert_one({
+            "_id": key,
+            "workspace": workspace(),
+            "filename": upload.filename,
+            "content_type": upload.content_type,
+            "size": upload.size,
+            "status": "pending",
+            "created_at": datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+        })
+        
+        return {
+            "key": key,
+            "url": f"/api/media/{key}",
+            "upload": target,
+            "expires_in": UPLOAD_URL_EXPIRES_SECONDS
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Presigning logo upload failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.post("/uploads/logo/complete")
+async def complete_logo_upload(upload: LogoUploadComplete):
+    """Record a direct upload once the client has sent the bytes to storage"""
+    try:
+        media = await db.media.find_one(workspace_query({"_id": upload.key}))
+        if not media:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        
+        size = await media_storage.stat(upload.key)
+        if size is None:
+            raise HTTPException(status_code=400, detail="File has not been uploaded yet")
+        if size > LOGO_MAX_BYTES:
+            await media_storage.delete_many([upload.key])
+            await db.media.delete_one({"_id": upload.key})
+            raise HTTPException(status_code=400, detail="File size must be less than 5MB")
+        
+        await db.media.update_one(
+            {"_id": upload.key},
+            {"$set": {"status": "ready", "size": size}}
+        )
+        
+        logo_url = f"/api/media/{upload.key}"
+        logger.info(f"Logo uploaded directly: {logo_url}")
+        
+        return {
+            "success": True,
+            "url": logo_url,
+            "filename": upload.key
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Completing logo upload failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.put("/uploads/direct/{key}")
+async def direct_upload(key: str, request: Request, expires: int, max_bytes: int, signature: str):
+    """Upload target for presigned uploads when media is stored on local disk"""
+    if not isinstance(media_storage, LocalMediaStorage):
+        raise HTTPException(status_code=404, detail="Direct uploads go to the storage bucket")
+    content_type = request.headers.get("content-type", "")
+    try:
+        if not media_storage.verify(key, content_type, max_bytes, expires, signature):
+            raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+        size = await media_storage.write_stream(key, request.stream(), max_bytes)
+        return {"success": True, "size": size}
+    except StarletteHTTPException:
+        # Also the 413 the body limit raises from inside the stream
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error(f"Direct upload failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Fields of a project needed for its entry in the project browser
+LIST_FIELDS = ["_id", "name", "created_at", "updated_at", "archived", "days.date"]
+
+
+def project_list_item(project: Dict) -> Dict:
+    return ProjectListItem(
+        id=str(project["_id"]),
+        name=project["name"],
+        created_at=project.get("created_at", ""),
+        updated_at=project.get("updated_at", ""),
+        archived=project.get("archived", False),
+        day_count=len(project.get("days", []))
+    ).model_dump()
+
+
+async def archive_if_finished(project: Dict):
+    """Auto-archive a project whose shooting days are all in the past"""
+    if is_project_archived(project) and not project.get('archived', False):
+        await project_store.update(project["_id"], {"archived": True, "archived_at": datetime.now()})
+        project['archived'] = True
+        conflict_index.remove(str(project["_id"]))
+
+
+async def archive_finished_projects(progress: Optional[Callable[[int], Awaitable]] = None) -> Dict:
+    """Auto-archive every active project whose shooting days are all in the past
+
+    ``progress`` is awaited with the number of projects archived so far.
+    """
+    archived = []
+    async for proj in project_store.find(archived=False, fields=["_id", "archived", "days.date"]):
+        await archive_if_finished(proj)
+        if proj['archived']:
+            archived.append(str(proj["_id"]))
+            if progress is not None:
+                await progress(len(archived))
+    return {"archived": len(archived), "project_ids": archived}
+
+
 @api_router.get("/projects")
-async def list_projects(include_archived: bool = False):
-    """List all projects, grouped by active/archived"""
+async def list_projects(include_archived: bool = False, cold_cursor: Optional[str] = None,
+                        cold_limit: int = Query(50, ge=1, le=200)):
+    """List all projects, grouped by active/archived; cold projects are paged separately"""
     try:
-        cursor = db.projects.find({}, {"_id": 1, "name": 1, "created_at": 1, "updated_at": 1, "archived": 1, "days": 1})
+        cursor = project_store.find(fields=LIST_FIELDS)
         projects = await cursor.to_list(length=None)
         
         active = []
         archived = []
         
         for proj in projects:
-            # Auto-archive check
-            should_be_archived = is_project_archived(proj)
-            if should_be_archived and not proj.get('archived', False):
-                await db.projects.update_one(
-                    {"_id": proj["_id"]},
-                    {"$set": {"archived": True}}
-                )
-                proj['archived'] = True
-            
-            item = ProjectListItem(
-                id=str(proj["_id"]),
-                name=proj["name"],
-                created_at=proj.get("created_at", ""),
-                updated_at=proj.get("updated_at", ""),
-                archived=proj.get("archived", False),
-                day_count=len(proj.get("days", []))
-            )
+            await archive_if_finished(proj)
+            item = project_list_item(proj)
             
-            if item.archived:
-                archived.append(item.model_dump())
+            if item["archived"]:
+                archived.append(item)
             else:
-                active.append(item.model_dump())
+                active.append(item)
         
-        return {
+        response = {
             "active": active,
             "archived": archived if include_archived else []
         }
+        if include_archived:
+            response["cold"] = await cold_storage.page(cold_cursor, cold_limit)
+        return response
     except Exception as e:
         logger.error(f"List projects failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@api_router.post("/projects/save")
-async def save_project(project: Project):
-    """Save project - upsert by exact name match"""
+@api_router.get("/projects/changes")
+async def project_changes(since: int = 0, limit: int = 500):
+    """Projects created, updated, archived or removed after the ``since`` cursor
+
+    Start with ``since=0`` and pass the returned ``cursor`` next time; when
+    ``has_more`` is set, ask again right away. Removed projects come with a
+    reason: "deleted", or "cold" when they moved to cold storage. Projects
+    whose last day has passed show up once the project list or the
+    auto_archive job has archived them.
+    """
+    if since < 0 or not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="since must be >= 0 and limit between 1 and 1000")
     try:
-        now = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+        horizon = await change_log.horizon()
+        changed = await project_store.changed_since(
+            since, horizon, [*LIST_FIELDS, "change_seq"], limit + 1
+        ).to_list(length=None)
+        removed = await change_log.removed_since(since, horizon, limit + 1).to_list(length=None)
         
-        # Check if project exists by name
-        existing = await db.projects.find_one({"name": project.name})
+        entries = sorted(
+            [(proj["change_seq"], "changed", proj) for proj in changed]
+            + [(tombstone["change_seq"], "removed", tombstone) for tombstone in removed],
+            key=lambda entry: entry[0]
+        )
+        has_more = len(entries) > limit
+        if has_more:
+            # Pages end between changes; bulk writes share one sequence number
+            cut = entries[limit][0]
+            if entries[0][0] == cut:
+                # A bulk change larger than a page is sent whole
+                entries = [
+                    (cut, "changed", proj)
+                    for proj in await project_store.changed_at(cut, LIST_FIELDS).to_list(length=None)
+                ] + [
+                    (cut, "removed", tombstone)
+                    for tombstone in await change_log.removed_at(cut).to_list(length=None)
+                ]
+                horizon = cut
+            else:
+                entries = [entry for entry in entries[:limit] if entry[0] < cut]
+                horizon = entries[-1][0]
         
-        # Set default column widths if not provided
-        if project.column_widths is None:
-            project.column_widths = ColumnWidths()
+        return {
+            "changed": [
+                {**project_list_item(doc), "change_seq": seq}
+                for seq, kind, doc in entries if kind == "changed"
+            ],
+            "removed": [
+                {"id": str(doc["_id"]), "reason": doc["reason"], "change_seq": seq}
+                for seq, kind, doc in entries if kind == "removed"
+            ],
+            "cursor": horizon,
+            "has_more": has_more
+        }
+    except Exception as e:
+        logger.error(f"Project changes failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.post("/projects/save")
+async def save_project(request: Request, x_client_id: Optional[str] = Header(None),
+                       idempotency_key: Optional[str] = Header(None)):
+    """Save project - upsert by exact name match; retries with the same Idempotency-Key replay the first response"""
+    body = await request.body()
+    project_dict = parse_project(body)
+    return await idempotency_keys.run(
+        idempotency_key, "save", fingerprint(body),
+        lambda: save_project_by_name(project_dict, x_client_id)
+    )
+
+
+async def save_project_by_name(project_dict: Dict, x_client_id: Optional[str]) -> Dict:
+    """Update the project with this name, or create it"""
+    try:
+        now = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
         
-        # Set default column headers if not provided
-        if project.column_headers is None:
-            project.column_headers = ColumnHeaders()
+        # Check if project exists by name, bringing it back from cold storage if needed
+        existing = await project_store.get_by_name(project_dict['name'])
+        if existing is None:
+            existing = await cold_storage.thaw_by_name(project_dict['name'])
         
-        # Set default headers for each calltime if not provided
-        for calltime in project.calltimes:
-            if calltime.headers is None:
-                calltime.headers = CalltimeHeaders()
+        apply_display_defaults(project_dict)
+        rank_schedule(project_dict)
         
         # Auto-archive check
-        project_dict = project.model_dump()
         project_dict['archived'] = is_project_archived(project_dict)
+        track_archived_at(project_dict, existing)
+        project_dict['stats'] = compute_project_stats(project_dict['days'])
+        project_dict['days'] = await store_days(project_dict, existing)
+        project_dict['size'] = document_size(project_dict)
         
         if existing:
             # Update existing project
+            await workspace_usage.check(size=project_dict['size'] - existing.get('size', 0))
             project_dict['created_at'] = existing.get('created_at', now)
             project_dict['updated_at'] = now
             
-            await db.projects.update_one(
-                {"_id": existing["_id"]},
-                {"$set": project_dict}
+            updated = await write_buffer.submit(
+                str(existing["_id"]),
+                {"doc": project_dict, "origin": x_client_id}
             )
-            
-            updated = await db.projects.find_one({"_id": existing["_id"]})
-            return serialize_doc(updated)
+            return project_response(updated)
         else:
             # Create new project
+            await workspace_usage.check(projects=1, size=project_dict['size'])
             project_dict['created_at'] = now
             project_dict['updated_at'] = now
+            project_dict['version'] = 1
             
-            result = await db.projects.insert_one(project_dict)
-            created = await db.projects.find_one({"_id": result.inserted_id})
-            return serialize_doc(created)
+            project_id = await project_store.insert(project_dict)
+            created = await project_store.get(project_id)
+            await revision_store.record(project_id, None, created)
+            created = await shared_days.resolve(created)
+            conflict_index.update(project_id, created)
+            return project_response(created)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Save project failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Enough of a project to work out the order of its days and calltimes
+ORDER_FIELDS = ["version", "days.position", "days.rank", "calltimes.position", "calltimes.rank"]
+
+
+def day_header(day: Dict) -> Dict:
+    """A day without its rows, as sent in project skeletons"""
+    return {key: value for key, value in day.items() if key not in ("rows", "shared_day")}
+
+
 @api_router.get("/projects/{project_id}")
-async def get_project(project_id: str):
-    """Get project by ID"""
+async def get_project(project_id: str, skeleton: bool = False):
+    """Get project by ID; with skeleton=true days come as headers without rows"""
     try:
-        project = await db.projects.find_one({"_id": ObjectId(project_id)})
+        if skeleton:
+            project = await project_store.get_skeleton(project_id)
+        else:
+            project = await project_store.get_view(project_id)
+        if not project:
+            project = await cold_storage.thaw(ObjectId(project_id))
         if not project:
             raise HTTPException(status_code=404, detail="Project not found")
         
-        return serialize_doc(project)
+        if skeleton:
+            project = in_schedule_order(project)
+            return project_response({**project, "days": [day_header(day) for day in project.get("days", [])]})
+        return project_response(await shared_days.resolve(project))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Get project failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.get("/projects/{project_id}/days")
+async def get_project_days(project_id: str, start: Optional[int] = None, count: Optional[int] = None,
+                           date_from: Optional[str] = Query(None, alias="from"),
+                           date_to: Optional[str] = Query(None, alias="to")):
+    """Full days of a project for a range of positions (start/count) or dates (from/to)
+
+    Without either, the first week of days is returned. A date range returns every day from the first to the last one inside it,
+    in schedule order; ``start`` is the position of the first returned day.
+    """
+    by_date = date_from is not None or date_to is not None
+    if by_date and (start is not None or count is not None):
+        raise HTTPException(status_code=400, detail="Give either start/count or from/to")
+    if by_date:
+        try:
+            first = datetime.strptime(date_from, "%d-%m-%Y") if date_from else datetime.min
+            last = datetime.strptime(date_to, "%d-%m-%Y") if date_to else datetime.max
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Dates must be DD-MM-YYYY")
+    else:
+        start = start or 0
+        count = count if count is not None else 7
+        if start < 0 or count < 1:
+            raise HTTPException(status_code=400, detail="start must be >= 0 and count >= 1")
+    try:
+        if not await project_store.exists(project_id):
+            if not await cold_storage.thaw(ObjectId(project_id)):
+                raise HTTPException(status_code=404, detail="Project not found")
+        
+        # The schedule order (and, for a date range, the dates) comes from the day
+        # headers; the stored days covering the range are then sliced in the
+        # database. A save in between shows up as a new version and is retried.
+        for _ in range(3):
+            headers = await project_store.get(project_id, ORDER_FIELDS + ["days.date"])
+            if headers is None:
+                raise HTTPException(status_code=404, detail="Project not found")
+            days = headers.get("days", [])
+            order = schedule_order(days, headers.get("calltimes", []))
+            day_order = [index for kind, index in order if kind == "days"]
+            if by_date:
+                matching = [
+                    position for position, index in enumerate(day_order)
+                    if first <= parse_date(days[index]["date"]) <= last
+                ]
+                if not matching:
+                    return {"id": project_id, "version": headers.get("version"), "start": None, "days": []}
+                start, count = matching[0], matching[-1] - matching[0] + 1
+            window = day_order[start:start + count]
+            if not window:
+                return {"id": project_id, "version": headers.get("version"), "start": start, "days": []}
+            
+            lowest = min(window)
+            sliced = await project_store.get_days(project_id, lowest, max(window) - lowest + 1)
+            if sliced is None:
+                raise HTTPException(status_code=404, detail="Project not found")
+            if sliced.get("version") == headers.get("version"):
+                break
+        
+        resolved = await shared_days.resolve({"days": sliced.get("days", [])}, ordered=False)
+        positions = {index: position for position, (kind, index) in enumerate(order) if kind == "days"}
+        return {
+            "id": project_id,
+            "version": sliced.get("version"),
+            "start": start,
+            "days": [
+                {**in_row_order(resolved["days"][index - lowest]), "position": positions[index]}
+                for index in window
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get project days failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @api_router.put("/projects/{project_id}")
-async def update_project(project_id: str, project: Project):
+async def update_project(project_id: str, request: Request, x_client_id: Optional[str] = Header(None)):
     """Update project by ID"""
+    project_dict = parse_project(await request.body())
     try:
         now = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
         
-        existing = await db.projects.find_one({"_id": ObjectId(project_id)})
+        existing = await project_store.get(project_id)
         if not existing:
             raise HTTPException(status_code=404, detail="Project not found")
         
-        if project.column_widths is None:
-            project.column_widths = ColumnWidths()
-        
-        if project.column_headers is None:
-            project.column_headers = ColumnHeaders()
+        apply_display_defaults(project_dict)
+        rank_schedule(project_dict)
         
-        # Set default headers for each calltime if not provided
-        for calltime in project.calltimes:
-            if calltime.headers is None:
-                calltime.headers = CalltimeHeaders()
-        
-        project_dict = project.model_dump()
         project_dict['created_at'] = existing.get('created_at', now)
         project_dict['updated_at'] = now
         project_dict['archived'] = is_project_archived(project_dict)
+        track_archived_at(project_dict, existing)
+        project_dict['stats'] = compute_project_stats(project_dict['days'])
+        project_dict['days'] = await store_days(project_dict, existing)
+        project_dict['size'] = document_size(project_dict)
+        await workspace_usage.check(size=project_dict['size'] - existing.get('size', 0))
         
-        await db.projects.update_one(
-            {"_id": ObjectId(project_id)},
-            {"$set": project_dict}
+        updated = await write_buffer.submit(
+            project_id,
+            {"doc": project_dict, "origin": x_client_id}
         )
-        
-        updated = await db.projects.find_one({"_id": ObjectId(project_id)})
-        return serialize_doc(updated)
+        return project_response(updated)
     except HTTPException:
         raise
     except Exception as e:
@@ -381,14 +893,138 @@ async def update_project(project_id: str, project: Project):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Enough of a project to move a day, calltime or row
+MOVE_FIELDS = ORDER_FIELDS + [
+    "days.id", "days.date", "days.shared_day", "days.rows.id", "days.rows.rank",
+    "calltimes.id", "calltimes.rows.id", "calltimes.rows.rank"
+]
+
+# Attempts at a move before giving up on a project that keeps changing
+MOVE_ATTEMPTS = 3
+
+
+async def plan_move(project_id: str, project: Dict, move: MoveRequest) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """The fields to set for a move, by dotted path, and the new ranks by item id
+
+    Usually that is just the moved item's rank.
+    """
+    order = schedule_order(project.get("days", []), project.get("calltimes", []))
+    day_path = None
+    if move.parent_id is None:
+        entries = [(f"{kind}.{index}", project[kind][index]) for kind, index in order]
+    else:
+        parent = next(
+            ((kind, index) for kind, index in order if project[kind][index].get("id") == move.parent_id),
+            None
+        )
+        if parent is None:
+            raise HTTPException(status_code=404, detail="Day or calltime not found")
+        kind, index = parent
+        container = project[kind][index]
+        if kind == "days" and "shared_day" in container:
+            # Shared content is immutable, so the whole day is rewritten: a copy's
+            # stub is materialised, a template day is shared again with its new order
+            stub = is_day_ref(container)
+            if stub:
+                container = (await shared_days.resolve({"days": [container]}, ordered=False))["days"][0]
+            else:
+                container = (await project_store.get_days(project_id, index, 1))["days"][0]
+            day_path = f"days.{index}"
+        rows = container.get("rows", [])
+        entries = [(f"{kind}.{index}.rows.{row}", rows[row]) for row in row_order(rows)]
+    
+    ids = [item.get("id") for _, item in entries]
+    if move.id not in ids:
+        raise HTTPException(status_code=404, detail="Item not found")
+    if move.after is not None and move.after not in ids:
+        raise HTTPException(status_code=404, detail="Item to move after not found")
+    if move.after == move.id:
+        raise HTTPException(status_code=400, detail="An item cannot be moved after itself")
+    
+    ranks = place_after(
+        [item for _, item in entries],
+        ids.index(move.id),
+        None if move.after is None else ids.index(move.after)
+    )
+    new_ranks = {ids[index]: rank for index, rank in ranks.items()}
+    if day_path is None:
+        return {f"{entries[index][0]}.rank": rank for index, rank in ranks.items()}, new_ranks
+    if not ranks:
+        return {}, new_ranks
+    for index, rank in ranks.items():
+        entries[index][1]["rank"] = rank
+    if not stub:
+        container = (await shared_days.share([container]))[0]
+    return {day_path: container}, new_ranks
+
+
+@api_router.post("/projects/{project_id}/move")
+async def move_item(project_id: str, move: MoveRequest, x_client_id: Optional[str] = Header(None)):
+    """Move a day or calltime within the schedule, or a row within its day or calltime,
+    to just after another one (or to the front). Only the moved item's rank is written."""
+    try:
+        if not await project_store.exists(project_id):
+            if not await cold_storage.thaw(ObjectId(project_id)):
+                raise HTTPException(status_code=404, detail="Project not found")
+        
+        for _ in range(MOVE_ATTEMPTS):
+            project = await project_store.get(project_id, MOVE_FIELDS)
+            if project is None:
+                raise HTTPException(status_code=404, detail="Project not found")
+            updates, ranks = await plan_move(project_id, project, move)
+            if not updates:
+                return {"id": move.id, "version": project.get("version"), "ranks": {}}
+            
+            updates["updated_at"] = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+            previous = await project_store.update_returning_previous(
+                project_id, updates, expected_version=project.get("version")
+            )
+            if previous is not None:
+                break
+        else:
+            raise HTTPException(status_code=409, detail="The project kept changing; try the move again")
+        
+        updated = copy.deepcopy(previous)
+        for path, value in updates.items():
+            set_path(updated, path, value)
+        updated["version"] = previous.get("version", 0) + 1
+        await revision_store.record(project_id, previous, updated)
+        
+        # What a save keeps in step with the schedule: scene end times and per-day
+        # stats follow the new order (the write itself was stamped for the change feed)
+        view = await shared_days.resolve(updated)
+        conflict_index.update(project_id, view)
+        await project_store.update(
+            project_id, {"stats": compute_project_stats(view.get('days', []))},
+            bump_version=False, expected_version=updated["version"]
+        )
+        
+        if hub.has_audience(project_id):
+            await hub.publish_delta(
+                project_id,
+                await shared_days.resolve(previous),
+                view,
+                origin=x_client_id
+            )
+        return {"id": move.id, "version": updated["version"], "ranks": ranks}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Move failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @api_router.delete("/projects/{project_id}")
 async def delete_project(project_id: str):
     """Delete project by ID"""
     try:
-        result = await db.projects.delete_one({"_id": ObjectId(project_id)})
-        if result.deleted_count == 0:
+        deleted = await project_store.delete(project_id)
+        if not deleted and not await cold_storage.delete(ObjectId(project_id)):
             raise HTTPException(status_code=404, detail="Project not found")
         
+        await revision_store.delete_project(project_id)
+        conflict_index.remove(project_id)
+        await hub.publish_event(project_id, {"type": "deleted"})
         return {"success": True, "message": "Project deleted"}
     except HTTPException:
         raise
@@ -401,16 +1037,20 @@ async def delete_project(project_id: str):
 async def toggle_archive_project(project_id: str):
     """Toggle archive status of a project"""
     try:
-        project = await db.projects.find_one({"_id": ObjectId(project_id)})
+        project = await project_store.get(project_id)
         if not project:
             raise HTTPException(status_code=404, detail="Project not found")
         
         new_archived_status = not project.get('archived', False)
         
-        await db.projects.update_one(
-            {"_id": ObjectId(project_id)},
-            {"$set": {"archived": new_archived_status}}
-        )
+        await project_store.update(project_id, {
+            "archived": new_archived_status,
+            "archived_at": datetime.now() if new_archived_status else None
+        })
+        project = await shared_days.resolve(project)
+        updated = {**project, "archived": new_archived_status, "version": project.get('version', 0) + 1}
+        conflict_index.update(project_id, updated)
+        await hub.publish_delta(project_id, project, updated)
         
         return {
             "success": True,
@@ -424,11 +1064,264 @@ async def toggle_archive_project(project_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+BULK_OUTCOMES = {"archive": "archived", "unarchive": "unarchived", "delete": "deleted"}
+
+
+async def bulk_set_archived(project_ids: Dict[str, ObjectId], archived: bool) -> Dict[str, str]:
+    """Archive or unarchive projects with one update; returns each id's outcome"""
+    hot = {
+        str(project["_id"]): project
+        async for project in project_store.find(ids=project_ids.values(), fields=["_id", "archived"])
+    }
+    cold = [
+        str(doc["_id"])
+        for doc in await cold_storage.find([oid for pid, oid in project_ids.items() if pid not in hot])
+    ]
+    outcomes = {pid: "not_found" for pid in project_ids}
+    if archived:
+        # Cold projects are archived already
+        outcomes.update({pid: "unchanged" for pid in cold})
+    else:
+        for pid in cold:
+            hot[pid] = await cold_storage.thaw(project_ids[pid])
+    
+    changing = []
+    for pid, project in hot.items():
+        if bool(project.get('archived', False)) == archived:
+            outcomes[pid] = "unchanged"
+        else:
+            changing.append(pid)
+    if not changing:
+        return outcomes
+    
+    watched = {pid: await project_store.get(pid) for pid in changing if hub.has_audience(pid)}
+    await project_store.update_many(changing, {
+        "archived": archived,
+        "archived_at": datetime.now() if archived else None
+    })
+    outcome = "archived" if archived else "unarchived"
+    outcomes.update({pid: outcome for pid in changing})
+    
+    if archived:
+        for pid in changing:
+            conflict_index.remove(pid)
+    else:
+        async for project in project_store.find(ids=changing, fields=["workspace", "name", "archived", "days"]):
+            conflict_index.update(str(project["_id"]), await shared_days.resolve(project))
+    for pid, project in watched.items():
+        if project is None:
+            continue
+        project = await shared_days.resolve(project)
+        await hub.publish_delta(pid, project, {**project, "archived": archived, "version": project.get('version', 0) + 1})
+    return outcomes
+
+
+async def bulk_delete(project_ids: Dict[str, ObjectId]) -> Dict:
+    """Delete hot and cold projects with one delete each, then their unreferenced logos"""
+    hot = {
+        str(project["_id"]): project
+        async for project in project_store.find(ids=project_ids.values(), fields=["_id", "logo_url"])
+    }
+    cold = {
+        str(doc["_id"]): doc
+        for doc in await cold_storage.find(
+            [oid for pid, oid in project_ids.items() if pid not in hot], ("logo_url",)
+        )
+    }
+    if hot:
+        await project_store.delete_many(hot.keys())
+    if cold:
+        await cold_storage.delete_many([project_ids[pid] for pid in cold])
+    
+    deleted = [*hot, *cold]
+    if deleted:
+        await revision_store.delete_projects(deleted)
+    for pid in deleted:
+        conflict_index.remove(pid)
+        await hub.publish_event(pid, {"type": "deleted"})
+    
+    removed_uploads = await delete_unreferenced(
+        media_storage,
+        [db.projects, db.projects_cold],
+        [filename_from_url(doc.get('logo_url', '')) for doc in [*hot.values(), *cold.values()]]
+    )
+    if removed_uploads:
+        await db.media.delete_many({"_id": {"$in": removed_uploads}})
+    
+    outcomes = {pid: "deleted" if pid in hot or pid in cold else "not_found" for pid in project_ids}
+    return {"outcomes": outcomes, "removed_uploads": len(removed_uploads)}
+
+
+async def run_bulk_operation(action: str, project_ids: List[str], job: Optional[JobContext] = None) -> Dict:
+    """Apply a bulk action in batches of BULK_BATCH_SIZE, reporting progress to ``job``"""
+    outcomes: Dict[str, str] = {}
+    removed_uploads = 0
+    for offset in range(0, len(project_ids), BULK_BATCH_SIZE):
+        batch = project_ids[offset:offset + BULK_BATCH_SIZE]
+        valid = {pid: ObjectId(pid) for pid in batch if ObjectId.is_valid(pid)}
+        if action == "delete":
+            report = await bulk_delete(valid)
+            outcomes.update(report["outcomes"])
+            removed_uploads += report["removed_uploads"]
+        else:
+            outcomes.update(await bulk_set_archived(valid, action == "archive"))
+        if job is not None:
+            await job.progress(offset + len(batch), len(project_ids))
+    extra = {"removed_uploads": removed_uploads} if action == "delete" else {}
+    
+    results = [{"id": pid, "outcome": outcomes.get(pid, "invalid_id")} for pid in project_ids]
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result["outcome"]] = counts.get(result["outcome"], 0) + 1
+    logger.info(f"Bulk {action} of {len(project_ids)} projects: {counts}")
+    return {"action": action, "counts": counts, "results": results, **extra}
+
+
+@api_router.post("/projects/bulk")
+async def bulk_projects(request: BulkProjectRequest, response: Response):
+    """Archive, unarchive or delete many projects, chosen by ids or by a filter
+
+    Sets larger than BULK_INLINE_LIMIT run as a background job: the response
+    is 202 with a job id to poll at /api/jobs/{id}.
+    """
+    if request.action not in BULK_OUTCOMES:
+        raise HTTPException(status_code=400, detail="action must be archive, unarchive or delete")
+    if (request.ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Give either ids or filter")
+    selected = request.filter
+    if (request.action == "delete" and selected is not None and not selected.all
+            and selected.archived is None and not selected.name_contains):
+        raise HTTPException(status_code=400, detail="Deleting by filter needs a criterion, or all: true")
+    try:
+        if request.ids is not None:
+            project_ids = list(dict.fromkeys(request.ids))
+        else:
+            project_ids = [
+                str(project["_id"])
+                async for project in project_store.find(
+                    archived=selected.archived, fields=["_id"], name_contains=selected.name_contains
+                )
+            ]
+            if selected.archived is not False:
+                # Cold projects are archived too
+                project_ids += [str(oid) for oid in await cold_storage.ids(selected.name_contains)]
+        
+        if len(project_ids) > BULK_INLINE_LIMIT:
+            job_id = await jobs.enqueue("bulk_projects", {"action": request.action, "ids": project_ids})
+            response.status_code = 202
+            return {"job_id": job_id, "status": "queued", "count": len(project_ids)}
+        return await run_bulk_operation(request.action, project_ids)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk {request.action} failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a background job, with its result once done"""
+    try:
+        job = await jobs.get(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return serialize_doc(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get job failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/workspace")
+async def get_workspace():
+    """Usage and quotas of the workspace the request is in (0 means unlimited)"""
+    try:
+        name = workspace()
+        return {
+            "workspace": name,
+            "usage": await workspace_usage.get(name),
+            "quota": {"projects": workspace_usage.max_projects, "bytes": workspace_usage.max_bytes}
+        }
+    except Exception as e:
+        logger.error(f"Get workspace failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.post("/projects/{project_id}/restore")
+async def restore_cold_project(project_id: str):
+    """Bring a project back from cold storage"""
+    try:
+        if await project_store.exists(project_id):
+            return {"success": True, "message": "Project is not in cold storage"}
+        
+        project = await cold_storage.thaw(ObjectId(project_id))
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        return {"success": True, "message": "Project restored from cold storage"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Cold storage restore failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.post("/archive/sweep", status_code=202)
+async def sweep_cold_storage(older_than_days: Optional[int] = None):
+    """Queue a job moving projects archived for longer than the threshold into cold storage"""
+    try:
+        days = older_than_days if older_than_days is not None else COLD_STORAGE_AFTER_DAYS
+        job_id = await jobs.enqueue("cold_storage_sweep", {"older_than_days": days})
+        return {"success": True, "older_than_days": days, "job_id": job_id, "status": "queued"}
+    except Exception as e:
+        logger.error(f"Cold storage sweep failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.post("/projects/{project_id}/template")
+async def toggle_template_project(project_id: str):
+    """Toggle whether a project is a template whose days copies share"""
+    try:
+        project = await project_store.get(project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        is_template = not project.get('is_template', False)
+        resolved = await shared_days.resolve(project)
+        if is_template:
+            days = await shared_days.share(resolved.get('days', []))
+        else:
+            days = resolved.get('days', [])
+        
+        await project_store.update(project_id, {"is_template": is_template, "days": days})
+        conflict_index.update(project_id, {**resolved, "is_template": is_template})
+        
+        return {
+            "success": True,
+            "is_template": is_template,
+            "message": "Project marked as template" if is_template else "Project is no longer a template"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Template toggle failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @api_router.post("/projects/{project_id}/duplicate")
-async def duplicate_project(project_id: str):
-    """Duplicate a project with a new name"""
+async def duplicate_project(project_id: str, idempotency_key: Optional[str] = Header(None)):
+    """Duplicate a project with a new name; retries with the same Idempotency-Key replay the first copy"""
+    return await idempotency_keys.run(
+        idempotency_key, f"duplicate:{project_id}", "",
+        lambda: copy_project(project_id)
+    )
+
+
+async def copy_project(project_id: str) -> Dict:
+    """Copy a project with a new name (templates share their days copy-on-write)"""
     try:
-        project = await db.projects.find_one({"_id": ObjectId(project_id)})
+        project = await project_store.get(project_id)
         if not project:
             raise HTTPException(status_code=404, detail="Project not found")
         
@@ -442,23 +1335,46 @@ async def duplicate_project(project_id: str):
         project['created_at'] = now
         project['updated_at'] = now
         project['archived'] = False
+        project['version'] = 1
         
-        # Generate new IDs for all nested items
-        for day in project.get('days', []):
-            day['id'] = str(uuid.uuid4())
-            for row in day.get('rows', []):
-                row['id'] = str(uuid.uuid4())
+        if project.get('is_template'):
+            # Template days stay shared until the copy edits them
+            view_days = [
+                {key: value for key, value in day.items() if key != 'shared_day'}
+                for day in project.get('days', [])
+            ]
+            project['days'] = [
+                make_day_ref(day) if 'shared_day' in day else day
+                for day in project.get('days', [])
+            ]
+            project['is_template'] = False
+            project['template_id'] = project_id
+        else:
+            view_days = None
+            # Generate new IDs for all nested items
+            for day in project.get('days', []):
+                day['id'] = str(uuid.uuid4())
+                for row in day.get('rows', []):
+                    row['id'] = str(uuid.uuid4())
         
         for calltime in project.get('calltimes', []):
             calltime['id'] = str(uuid.uuid4())
             for row in calltime.get('rows', []):
                 row['id'] = str(uuid.uuid4())
         
-        # Insert duplicate
-        result = await db.projects.insert_one(project)
-        duplicated = await db.projects.find_one({"_id": result.inserted_id})
+        project['size'] = document_size(project)
+        await workspace_usage.check(projects=1, size=project['size'])
         
-        return serialize_doc(duplicated)
+        # Insert duplicate; insert fills in project['_id']
+        await project_store.insert(project)
+        await revision_store.record(str(project['_id']), None, project)
+        
+        if view_days is not None:
+            duplicated = in_schedule_order({**project, 'days': view_days})
+        else:
+            duplicated = await shared_days.resolve(project)
+        conflict_index.update(str(project['_id']), duplicated)
+        return project_response(duplicated)
     except HTTPException:
         raise
     except Exception as e:
@@ -470,53 +1386,19 @@ async def duplicate_project(project_id: str):
 async def export_project_csv(project_id: str):
     """Export project to CSV with DD-MM-YYYY dates"""
     try:
-        project = await db.projects.find_one({"_id": ObjectId(project_id)})
+        project = await project_store.get(project_id)
         if not project:
             raise HTTPException(status_code=404, detail="Project not found")
+        project = await shared_days.resolve(project)
         
         output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write schedule days
-        if project.get('days'):
-            writer.writerow(['SCHEDULE'])
-            writer.writerow(['Date', 'Time', 'Scene', 'Location', 'Cast', 'Notes'])
-            
-            for day in project.get('days', []):
-                date_formatted = format_date_dd_mm_yyyy(day['date'])
-                for row in day.get('rows', []):
-                    if row['type'] == 'item':
-                        writer.writerow([
-                            date_formatted,
-                            row.get('time', ''),
-                            row.get('scene', ''),
-                            row.get('location', ''),
-                            row.get('cast', ''),
-                            row.get('notes', '')
-                        ])
-                    elif row['type'] == 'text':
-                        writer.writerow([date_formatted, '', row.get('notes', ''), '', '', ''])
-            
-            writer.writerow([])  # Empty row separator
-        
-        # Write calltimes
-        if project.get('calltimes'):
-            writer.writerow(['CALLTIMES'])
-            writer.writerow(['Time', 'Name'])
-            
-            for calltime in project.get('calltimes', []):
-                for row in calltime.get('rows', []):
-                    writer.writerow([
-                        row.get('time', ''),
-                        row.get('name', '')
-                    ])
-                writer.writerow([])  # Empty row between calltimes
+        write_project_csv(project, output)
         
         output.seek(0)
         return StreamingResponse(
             iter([output.getvalue()]),
             media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={project['name']}.csv"}
+            headers={"Content-Disposition": content_disposition(f"{project['name']}.csv")}
         )
     except HTTPException:
         raise
@@ -525,11 +1407,461 @@ async def export_project_csv(project_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.get("/projects/{project_id}/export.xlsx")
+async def export_project_xlsx(project_id: str):
+    """Export project to Excel: one sheet per day plus a calltimes sheet"""
+    try:
+        project = await project_store.get(project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        project = await shared_days.resolve(project)
+        
+        # Rendered to a temporary file off the event loop, then streamed from disk
+        output = tempfile.TemporaryFile()
+        try:
+            await asyncio.to_thread(write_project_xlsx, project, output)
+        except Exception:
+            output.close()
+            raise
+        output.seek(0)
+        
+        return StreamingResponse(
+            iter_file(output),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": content_disposition(f"{project['name']}.xlsx")}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"XLSX export failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+EXPORT_FORMATS = {"csv", "json", "logo"}
+
+
+@api_router.get("/exports/projects.zip")
+async def export_projects_zip(ids: Optional[List[str]] = Query(None), name: Optional[str] = None,
+                              archived: Optional[bool] = None, include: str = "csv,json,logo"):
+    """Stream a ZIP of many projects (CSV, JSON and logo each), one project at a time"""
+    formats = {part.strip() for part in include.split(",") if part.strip()}
+    if not formats or formats - EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"include must list some of: {', '.join(sorted(EXPORT_FORMATS))}")
+    if ids is not None:
+        ids = [part for value in ids for part in value.split(",") if part]
+        if not all(ObjectId.is_valid(project_id) for project_id in ids):
+            raise HTTPException(status_code=400, detail="Invalid project id")
+    
+    try:
+        # Only ids are listed up front; each project is then read on its own
+        matching = await project_store.find(archived=archived, fields=["_id"], ids=ids,
+                                            name_contains=name).to_list(length=None)
+        
+        async def render():
+            archive = ZipStream()
+            count = 0
+            async for project in project_store.each(doc["_id"] for doc in matching):
+                project = await shared_days.resolve(project)
+                folder = f"{archive_name(project.get('name', ''))} - {project['_id']}"
+                if "csv" in formats:
+                    output = io.StringIO()
+                    write_project_csv(project, output)
+                    yield await asyncio.to_thread(archive.add, f"{folder}/schedule.csv", output.getvalue())
+                if "json" in formats:
+                    content = json.dumps(project_response(project), ensure_ascii=False, indent=2, default=str)
+                    yield await asyncio.to_thread(archive.add, f"{folder}/project.json", content)
+                logo = filename_from_url(project.get('logo_url', ''))
+                if "logo" in formats and logo:
+                    data = await media_storage.load(logo)
+                    if data is not None:
+                        # Images are already compressed
+                        yield archive.add(f"{folder}/logo{Path(logo).suffix}", data, compress=False)
+                count += 1
+            yield archive.close()
+            logger.info(f"ZIP export streamed {count} projects")
+        
+        return StreamingResponse(
+            render(),
+            media_type="application/zip",
+            headers={"Content-Disposition": content_disposition(f"projects-{datetime.now().strftime('%d-%m-%Y')}.zip")}
+        )
+    except Exception as e:
+        logger.error(f"ZIP export failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Bump when the calendar output changes so cached feeds are refreshed
+ICS_FORMAT_VERSION = "2"
+CALENDAR_HEADERS = {"Cache-Control": "private, no-cache"}
+
+
+@api_router.get("/projects/{project_id}/export.ics")
+async def export_project_ics(project_id: str, request: Request, person: Optional[str] = None):
+    """iCalendar feed of shoot days and call times, optionally only one person's"""
+    try:
+        project = await project_store.get(project_id, ["version"])
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        person_tag = person_key(person) if person else ""
+        etag = calendar_etag([ICS_FORMAT_VERSION, project_id, str(project.get('version')), person_tag])
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={**CALENDAR_HEADERS, "ETag": etag})
+        
+        project = await project_store.get(project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        project = await shared_days.resolve(project)
+        # Tag what is actually rendered, in case a save landed in between
+        etag = calendar_etag([ICS_FORMAT_VERSION, project_id, str(project.get('version')), person_tag])
+        
+        title = f"{project['name']} - {person}" if person else project['name']
+        return StreamingResponse(
+            itertools.chain([calendar_header(title)], project_events(project, person), [calendar_footer()]),
+            media_type="text/calendar; charset=utf-8",
+            headers={
+                **CALENDAR_HEADERS,
+                "ETag": etag,
+                "Content-Disposition": content_disposition(f"{project['name']}.ics")
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"ICS export failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/calendar/people/{name}.ics")
+async def person_calendar(name: str, request: Request):
+    """iCalendar feed of one person's shoot days and call times across all projects"""
+    try:
+        # Templates are not productions, so nobody is booked by them
+        productions = [
+            project async for project in project_store.find(fields=["version", "is_template"])
+            if not project.get('is_template')
+        ]
+        versions = sorted(f"{project['_id']}:{project.get('version')}" for project in productions)
+        etag = calendar_etag([ICS_FORMAT_VERSION, workspace(), person_key(name), *versions])
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={**CALENDAR_HEADERS, "ETag": etag})
+        
+        async def render():
+            yield calendar_header(name)
+            # One project in memory at a time
+            async for project in project_store.each(project["_id"] for project in productions):
+                for event in project_events(await shared_days.resolve(project), name):
+                    yield event
+            yield calendar_footer()
+        
+        return StreamingResponse(
+            render(),
+            media_type="text/calendar; charset=utf-8",
+            headers={
+                **CALENDAR_HEADERS,
+                "ETag": etag,
+                "Content-Disposition": content_disposition(f"{name}.ics")
+            }
+        )
+    except Exception as e:
+        logger.error(f"Person calendar failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def require_project(project_id: str):
+    """404 unless the project is in the active workspace, hot or cold"""
+    if ObjectId.is_valid(project_id):
+        if await project_store.exists(project_id) or await cold_storage.find([ObjectId(project_id)]):
+            return
+    raise HTTPException(status_code=404, detail="Project not found")
+
+
+@api_router.get("/projects/{project_id}/revisions")
+async def list_revisions(project_id: str, limit: int = 100):
+    """List stored revisions of a project, newest first"""
+    try:
+        await require_project(project_id)
+        revisions = await revision_store.list(project_id, limit)
+        return {"project_id": project_id, "revisions": revisions}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"List revisions failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def load_revision(project_id: str, rev: int) -> Dict:
+    await require_project(project_id)
+    content = await revision_store.load(project_id, rev)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return content
+
+
+@api_router.get("/projects/{project_id}/revisions/{rev}")
+async def get_revision(project_id: str, rev: int):
+    """Reconstruct a project as it was at a given revision"""
+    try:
+        content = await shared_days.resolve(await load_revision(project_id, rev))
+        return project_response({**content, "id": project_id, "version": rev})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get revision failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/projects/{project_id}/revisions/{rev}/diff")
+async def diff_revision(project_id: str, rev: int, against: Optional[int] = None):
+    """Row-level changes between two revisions (default: the previous one)"""
+    try:
+        base_rev = against if against is not None else rev - 1
+        new = await shared_days.resolve(await load_revision(project_id, rev))
+        old = await shared_days.resolve(await load_revision(project_id, base_rev)) if base_rev > 0 else {}
+        return {
+            "project_id": project_id,
+            "from": base_rev,
+            "to": rev,
+            "ops": diff_project(old, new)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Diff revision failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.post("/projects/{project_id}/revisions/{rev}/restore")
+async def restore_revision(project_id: str, rev: int):
+    """Write an old revision back as the newest version of the project"""
+    try:
+        content = await load_revision(project_id, rev)
+        content['updated_at'] = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+        content['archived'] = is_project_archived(content)
+        content['size'] = document_size(content)
+        current = await project_store.get(project_id, ["size"])
+        await workspace_usage.check(size=content['size'] - (current or {}).get('size', 0))
+        
+        updated = await write_buffer.submit(project_id, {"doc": content, "origin": None})
+        return project_response(updated)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Restore revision failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Fields the store keeps next to a saved project, not counted in its size
+STORAGE_FIELDS = ("_id", "workspace", "version", "change_seq", "size")
+
+
+@api_router.post("/projects/{project_id}/calltimes/generate")
+async def generate_project_calltimes(project_id: str, options: CalltimeGeneration):
+    """Derive call times per person per day from the schedule, optionally saving them"""
+    try:
+        project = await project_store.get(project_id, ["days", "calltimes"])
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        project = await shared_days.resolve(project)
+        generated = generate_calltimes(project.get('days', []), options.lead_minutes)
+        calltimes = merge_calltimes(project.get('calltimes', []), generated)
+        ranked = [item['rank'] for item in project.get('days', []) + calltimes if has_rank(item)]
+        if ranked:
+            # Generated blocks go to the end of a ranked schedule
+            unranked = [calltime for calltime in calltimes if not has_rank(calltime)]
+            for calltime, rank in zip(unranked, ranks_between(max(ranked), None, len(unranked))):
+                calltime['rank'] = rank
+        
+        version = None
+        if options.write:
+            changes = {"calltimes": calltimes, "updated_at": datetime.now().strftime("%d-%m-%Y %H:%M:%S")}
+            # Sized and checked against the workspace quota like a save of the whole project
+            stored = await project_store.get(project_id)
+            if not stored:
+                raise HTTPException(status_code=404, detail="Project not found")
+            changes['size'] = document_size({
+                key: value for key, value in {**stored, **changes}.items() if key not in STORAGE_FIELDS
+            })
+            await workspace_usage.check(size=changes['size'] - stored.get('size', 0))
+            
+            updated = await write_buffer.submit(project_id, {"doc": changes, "origin": None})
+            version = updated.get('version')
+        
+        return {
+            "project_id": project_id,
+            "lead_minutes": options.lead_minutes,
+            "written": options.write,
+            "version": version,
+            "calltimes": calltimes
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Calltime generation failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def backfill_stats(project_id: ObjectId) -> Dict:
+    """Compute and store stats for a project saved before they existed"""
+    project = await project_store.get(project_id, ["days"])
+    project = await shared_days.resolve(project or {})
+    stats = compute_project_stats(project.get('days', []))
+    await project_store.update(project_id, {"stats": stats}, bump_version=False)
+    return stats
+
+
+@api_router.get("/projects/{project_id}/stats")
+async def get_project_stats(project_id: str):
+    """Per-day scene, location and cast counts with first/last times"""
+    try:
+        project = await project_store.get(project_id, ["name", "version", "updated_at", "stats"])
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        
+        stats = project.get('stats') or await backfill_stats(project["_id"])
+        return {
+            "id": project_id,
+            "name": project.get("name", ""),
+            "version": project.get("version"),
+            "updated_at": project.get("updated_at", ""),
+            **stats
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Project stats failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/stats/projects")
+async def list_project_stats(include_archived: bool = False):
+    """Production totals of every project for dashboards"""
+    try:
+        cursor = project_store.find(
+            archived=None if include_archived else False,
+            fields=["name", "version", "archived", "updated_at", "stats.totals"]
+        )
+        items = []
+        async for project in cursor:
+            totals = (project.get('stats') or {}).get('totals')
+            if totals is None:
+                totals = (await backfill_stats(project["_id"]))["totals"]
+            items.append({
+                "id": str(project["_id"]),
+                "name": project.get("name", ""),
+                "version": project.get("version"),
+                "archived": project.get("archived", False),
+                "updated_at": project.get("updated_at", ""),
+                "totals": totals
+            })
+        return {"projects": items}
+    except Exception as e:
+        logger.error(f"List project stats failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/conflicts/projects/{project_id}")
+async def project_conflicts(project_id: str):
+    """Cast double-bookings and overlapping scenes involving one project"""
+    conflicts = conflict_index.for_project(project_id)
+    return {"project_id": project_id, "count": len(conflicts), "conflicts": conflicts}
+
+
+@api_router.get("/conflicts/people/{name}")
+async def person_conflicts(name: str):
+    """Cast double-bookings and overlapping scenes of one person across active projects"""
+    conflicts = conflict_index.for_person(name)
+    return {"person": name, "count": len(conflicts), "conflicts": conflicts}
+
+
+@api_router.websocket("/ws/projects/{project_id}")
+async def project_updates(websocket: WebSocket, project_id: str, user: str = "Anonymous",
+                          client_id: Optional[str] = None):
+    """Live row-level deltas and presence for one project"""
+    await websocket.accept()
+    try:
+        exists = await project_store.exists(project_id)
+    except Exception:
+        exists = False
+    if not exists:
+        await websocket.close(code=4404, reason="Project not found")
+        return
+    
+    client_id = await hub.join(project_id, websocket, user, client_id)
+    try:
+        await websocket.send_json({
+            "type": "welcome",
+            "client_id": client_id,
+            "presence": hub.presence(project_id)
+        })
+        while True:
+            message = await websocket.receive_json()
+            if message.get("type") == "ping":
+                await websocket.send_json({"type": "pong"})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Websocket for project {project_id} closed: {e}")
+    finally:
+        await hub.leave(project_id, client_id)
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
+async def redirect_media(key: str):
+    """Send media requests to the storage bucket"""
+    url = await media_storage.download_url(key)
+    if not url:
+        raise HTTPException(status_code=404, detail="Not found")
+    return RedirectResponse(url)
+
+
 # Mount static files AFTER router - serve uploaded files
-app.mount("/api/media", StaticFiles(directory=str(UPLOAD_DIR)), name="media")
+if isinstance(media_storage, LocalMediaStorage):
+    app.mount("/api/media", StaticFiles(directory=str(UPLOAD_DIR)), name="media")
+else:
+    app.add_api_route("/api/media/{key}", redirect_media, methods=["GET"])
+
+# Innermost: the request's workspace scopes every store below
+app.add_middleware(WorkspaceMiddleware)
+
+# Concurrency, body size and rate limits for heavy endpoints
+MB = 1024 * 1024
+app.add_middleware(
+    LimitsMiddleware,
+    route_limits=[
+        RouteLimit(
+            "upload", ["POST", "PUT"], r"^/api/uploads/",
+            concurrency=int(os.environ.get('LIMIT_UPLOAD_CONCURRENCY', '4')),
+            max_body=int(os.environ.get('LIMIT_UPLOAD_MAX_BYTES', str(6 * MB)))
+        ),
+        RouteLimit(
+            "save", ["POST", "PUT"],
+            r"^/api/projects/(save|[^/]+|[^/]+/revisions/\d+/restore|[^/]+/calltimes/generate)$",
+            concurrency=int(os.environ.get('LIMIT_SAVE_CONCURRENCY', '8')),
+            max_body=int(os.environ.get('LIMIT_SAVE_MAX_BYTES', str(50 * MB)))
+        ),
+        RouteLimit(
+            "export", ["GET"], r"^/api/(projects/[^/]+/export\.|calendar/|exports/)",
+            concurrency=int(os.environ.get('LIMIT_EXPORT_CONCURRENCY', '4')),
+            max_body=MB
+        ),
+    ],
+    default_max_body=int(os.environ.get('LIMIT_DEFAULT_MAX_BYTES', str(MB))),
+    queue_timeout=float(os.environ.get('LIMIT_QUEUE_TIMEOUT_SECONDS', '10')),
+    rate_limit_store=InMemoryRateLimitStore(
+        per_minute=int(os.environ.get('RATE_LIMIT_PER_MINUTE', '600')),
+        burst=int(os.environ.get('RATE_LIMIT_BURST', '100'))
+    ) if int(os.environ.get('RATE_LIMIT_PER_MINUTE', '600')) > 0 else None,
+    exempt_paths=["/api/health"],
+    trust_forwarded_for=os.environ.get('TRUST_FORWARDED_FOR', '').lower() in ('1', 'true', 'yes'),
+    workspace_rate_limit_store=InMemoryRateLimitStore(
+        per_minute=int(os.environ.get('WORKSPACE_REQUESTS_PER_MINUTE', '0')),
+        burst=int(os.environ.get('WORKSPACE_REQUESTS_BURST', '500'))
+    ) if int(os.environ.get('WORKSPACE_REQUESTS_PER_MINUTE', '0')) > 0 else None
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -537,9 +1869,109 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Idempotent-Replayed"],
 )
 
+# Outermost: request ids and access logs cover rejected and failed requests too
+app.add_middleware(
+    RequestTracingMiddleware,
+    access_log=os.environ.get('ACCESS_LOG', 'true').lower() in ('1', 'true', 'yes')
+)
+
+
+async def load_conflict_index():
+    """Index the cast bookings of every active project"""
+    try:
+        cursor = project_store.find(archived=False, fields=["workspace", "name", "archived", "is_template", "days"])
+        count = 0
+        async for project in cursor:
+            if project.get("is_template"):
+                continue
+            conflict_index.update(str(project["_id"]), await shared_days.resolve(project))
+            count += 1
+        logger.info(f"Conflict index loaded with {count} active projects")
+    except Exception as e:
+        logger.error(f"Loading conflict index failed: {e}")
+
+
+async def run_cold_storage_sweep(job: JobContext) -> Dict:
+    days = job.params.get("older_than_days", COLD_STORAGE_AFTER_DAYS)
+    result = await cold_storage.sweep(timedelta(days=days), progress=job.progress)
+    logger.info(f"Cold storage sweep moved {result['frozen']} projects")
+    return {"older_than_days": days, **result}
+
+
+async def run_auto_archive(job: JobContext) -> Dict:
+    result = await archive_finished_projects(progress=job.progress)
+    logger.info(f"Auto-archive archived {result['archived']} projects")
+    return result
+
+
+async def run_upload_gc(job: JobContext) -> Dict:
+    return await collect_orphaned_uploads(
+        media_storage,
+        [db.projects, db.projects_cold],
+        job.params.get("grace_hours", UPLOAD_GC_GRACE_HOURS) * 3600,
+        media=db.media
+    )
+
+
+async def run_bulk_job(job: JobContext) -> Dict:
+    return await run_bulk_operation(job.params["action"], job.params["ids"], job)
+
+
+async def run_workspace_usage_recount(job: JobContext) -> Dict:
+    totals = await workspace_usage.recount(db.projects, db.projects_cold)
+    logger.info(f"Workspace usage recounted for {len(totals)} workspaces")
+    return {"workspaces": totals}
+
+
+jobs.register("cold_storage_sweep", run_cold_storage_sweep)
+jobs.register("auto_archive", run_auto_archive)
+jobs.register("upload_gc", run_upload_gc)
+jobs.register("bulk_projects", run_bulk_job)
+jobs.register("workspace_usage", run_workspace_usage_recount)
+
+
+async def schedule_job(kind: str, interval_hours: float):
+    """Periodically queue a job, unless one of the kind is still pending"""
+    while True:
+        await asyncio.sleep(interval_hours * 3600)
+        try:
+            await jobs.enqueue(kind, unique=True)
+        except Exception as e:
+            logger.error(f"Scheduling {kind} failed: {e}")
+
+
+@app.on_event("startup")
+async def start_background_services():
+    # Startup work and the tasks it starts maintain every workspace
+    with in_workspace(ALL_WORKSPACES):
+        await hub.start()
+        asyncio.create_task(load_conflict_index())
+        if COLD_STORAGE_SWEEP_HOURS > 0:
+            asyncio.create_task(schedule_job("cold_storage_sweep", COLD_STORAGE_SWEEP_HOURS))
+        if AUTO_ARCHIVE_INTERVAL_HOURS > 0:
+            asyncio.create_task(schedule_job("auto_archive", AUTO_ARCHIVE_INTERVAL_HOURS))
+        if UPLOAD_GC_INTERVAL_HOURS > 0:
+            asyncio.create_task(schedule_job("upload_gc", UPLOAD_GC_INTERVAL_HOURS))
+        try:
+            await change_log.ensure_indexes()
+            await project_store.ensure_indexes()
+            await revision_store.ensure_indexes()
+            await cold_storage.ensure_indexes()
+            await idempotency_keys.ensure_indexes()
+            await jobs.ensure_indexes()
+            # Usage counters are rebuilt once per start, after legacy projects got a workspace
+            await jobs.enqueue("workspace_usage", unique=True)
+        except Exception as e:
+            logger.error(f"Creating indexes failed: {e}")
+        await jobs.start()
+
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await jobs.stop()
+    await write_buffer.flush_all()
+    await hub.stop()
     client.close()
@@ -0,0 +1,71 @@
+"""Per-day production statistics.
+
+Computed from the resolved schedule whenever a project is saved and stored
+in the document's ``stats`` subdocument, so dashboards read a small
+projection instead of downloading whole projects.
+"""
+from datetime import datetime
+from typing import Dict, List
+
+from conflicts import format_minutes, parse_cast, parse_time_range, person_key
+
+
+def _unique(values: List[str]) -> List[str]:
+    seen = {}
+    for value in values:
+        value = " ".join(value.split())
+        if value and value.casefold() not in seen:
+            seen[value.casefold()] = value
+    return sorted(seen.values(), key=str.casefold)
+
+
+def day_stats(day: Dict) -> Dict:
+    scenes = [row for row in day.get('rows', []) if row.get('type', 'item') == 'item']
+    locations = _unique([row.get('location', '') for row in scenes])
+    cast = {}
+    first, last = None, None
+    for row in scenes:
+        for name in parse_cast(row.get('cast', '')):
+            cast.setdefault(person_key(name), name)
+        start, end = parse_time_range(row.get('time', ''))
+        if start is None:
+            continue
+        first = start if first is None else min(first, start)
+        last = max(last if last is not None else start, end if end is not None else start)
+    return {
+        "day_id": day.get('id'),
+        "date": day.get('date', ''),
+        "scene_count": len(scenes),
+        "text_rows": len(day.get('rows', [])) - len(scenes),
+        "locations": locations,
+        "location_count": len(locations),
+        "cast": sorted(cast.values(), key=str.casefold),
+        "cast_count": len(cast),
+        "first_time": format_minutes(first),
+        "last_time": format_minutes(last),
+    }
+
+
+def _sortable_date(date_str: str):
+    try:
+        return datetime.strptime(date_str, "%d-%m-%Y")
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_project_stats(days: List[Dict]) -> Dict:
+    per_day = [day_stats(day) for day in days]
+    dates = [d for d in (_sortable_date(day["date"]) for day in per_day) if d is not None]
+    locations = _unique([location for day in per_day for location in day["locations"]])
+    cast = _unique([name for day in per_day for name in day["cast"]])
+    return {
+        "days": per_day,
+        "totals": {
+            "day_count": len(per_day),
+            "scene_count": sum(day["scene_count"] for day in per_day),
+            "location_count": len(locations),
+            "cast_count": len(cast),
+            "first_date": min(dates).strftime("%d-%m-%Y") if dates else None,
+            "last_date": max(dates).strftime("%d-%m-%Y") if dates else None,
+        },
+    }
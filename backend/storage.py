@@ -0,0 +1,246 @@
+"""Pluggable storage for uploaded media.
+
+Uploads are addressed by key (``<uuid>.<ext>``) and always exposed to the
+frontend as ``/api/media/<key>``; how that URL is served depends on the
+backend. ``LocalMediaStorage`` keeps files in the uploads directory and is
+served by the static files mount. ``S3MediaStorage`` keeps them in an
+S3-compatible bucket (AWS, MinIO, ...) and ``/api/media`` redirects there,
+so API servers share no disk and can scale horizontally.
+
+Both backends support direct uploads: the API hands out a short-lived
+signed upload target, the client sends the bytes there, and the API only
+records metadata once the client reports completion.
+"""
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+
+
+class MediaStorage:
+    """Interface implemented by every media backend"""
+
+    async def save(self, key: str, data: bytes, content_type: str):
+        raise NotImplementedError
+
+    async def stat(self, key: str) -> Optional[int]:
+        """Size of a stored object, or None if it does not exist"""
+        raise NotImplementedError
+
+    async def load(self, key: str) -> Optional[bytes]:
+        """Content of a stored object, or None if it does not exist"""
+        raise NotImplementedError
+
+    async def delete_many(self, keys: List[str]):
+        raise NotImplementedError
+
+    def iter_objects(self) -> AsyncIterator[Tuple[str, int, float]]:
+        """Yield (key, size, modified timestamp) for every stored object"""
+        raise NotImplementedError
+
+    async def download_url(self, key: str) -> Optional[str]:
+        """External URL to redirect /api/media requests to, if any"""
+        return None
+
+    async def presign_upload(self, key: str, content_type: str, max_bytes: int,
+                             expires_in: int) -> Dict:
+        raise NotImplementedError
+
+
+class LocalMediaStorage(MediaStorage):
+    def __init__(self, root: Path, signing_secret: bytes):
+        self.root = root
+        self.signing_secret = signing_secret
+        self.root.mkdir(exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if path.parent != self.root.resolve():
+            raise ValueError("Invalid media key")
+        return path
+
+    async def save(self, key: str, data: bytes, content_type: str):
+        await asyncio.to_thread(self._path(key).write_bytes, data)
+
+    async def stat(self, key: str) -> Optional[int]:
+        try:
+            return self._path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    async def load(self, key: str) -> Optional[bytes]:
+        try:
+            return await asyncio.to_thread(self._path(key).read_bytes)
+        except FileNotFoundError:
+            return None
+
+    async def delete_many(self, keys: List[str]):
+        def delete():
+            for key in keys:
+                try:
+                    self._path(key).unlink()
+                except FileNotFoundError:
+                    continue
+        await asyncio.to_thread(delete)
+
+    async def iter_objects(self, batch_size: int = 1000):
+        def listing():
+            with os.scandir(self.root) as entries:
+                batch = []
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        batch.append((entry.name, stat.st_size, stat.st_mtime))
+                        if len(batch) >= batch_size:
+                            yield batch
+                            batch = []
+                if batch:
+                    yield batch
+
+        # Directory reads block, so each batch is listed in a worker thread
+        batches = listing()
+        try:
+            while True:
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    break
+                for item in batch:
+                    yield item
+        finally:
+            batches.close()
+
+    def sign(self, key: str, content_type: str, max_bytes: int, expires: int) -> str:
+        message = f"{key}|{content_type}|{max_bytes}|{expires}".encode("utf-8")
+        return hmac.new(self.signing_secret, message, hashlib.sha256).hexdigest()
+
+    def verify(self, key: str, content_type: str, max_bytes: int, expires: int,
+               signature: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self.sign(key, content_type, max_bytes, expires), signature)
+
+    async def presign_upload(self, key: str, content_type: str, max_bytes: int,
+                             expires_in: int) -> Dict:
+        expires = int(time.time()) + expires_in
+        signature = self.sign(key, content_type, max_bytes, expires)
+        return {
+            "method": "PUT",
+            "url": f"/api/uploads/direct/{key}?expires={expires}&max_bytes={max_bytes}&signature={signature}",
+            "headers": {"Content-Type": content_type},
+        }
+
+    async def write_stream(self, key: str, chunks: AsyncIterator[bytes], max_bytes: int) -> int:
+        """Store a streamed direct upload, refusing anything over ``max_bytes``"""
+        path = self._path(key)
+        partial = path.with_suffix(path.suffix + ".part")
+        written = 0
+        try:
+            with open(partial, "wb") as f:
+                async for chunk in chunks:
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise ValueError("File too large")
+                    f.write(chunk)
+            partial.replace(path)
+        finally:
+            if partial.exists():
+                partial.unlink()
+        return written
+
+
+class S3MediaStorage(MediaStorage):
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, public_base_url: Optional[str] = None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_base_url = public_base_url.rstrip("/") if public_base_url else None
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    async def save(self, key: str, data: bytes, content_type: str):
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket, Key=self._key(key), Body=data, ContentType=content_type,
+        )
+
+    async def stat(self, key: str) -> Optional[int]:
+        from botocore.exceptions import ClientError
+
+        try:
+            head = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return head["ContentLength"]
+
+    async def load(self, key: str) -> Optional[bytes]:
+        def read():
+            try:
+                return self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"].read()
+            except self.client.exceptions.NoSuchKey:
+                return None
+        return await asyncio.to_thread(read)
+
+    async def delete_many(self, keys: List[str]):
+        # delete_objects accepts at most 1000 keys per call
+        for start in range(0, len(keys), 1000):
+            await asyncio.to_thread(
+                self.client.delete_objects,
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": self._key(key)} for key in keys[start:start + 1000]], "Quiet": True},
+            )
+
+    async def iter_objects(self):
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = iter(paginator.paginate(Bucket=self.bucket, Prefix=self.prefix))
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                break
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):], obj["Size"], obj["LastModified"].timestamp()
+
+    async def download_url(self, key: str) -> Optional[str]:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{self._key(key)}"
+        return await asyncio.to_thread(
+            self.client.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=3600,
+        )
+
+    async def presign_upload(self, key: str, content_type: str, max_bytes: int,
+                             expires_in: int) -> Dict:
+        post = await asyncio.to_thread(
+            self.client.generate_presigned_post,
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_bytes]],
+            ExpiresIn=expires_in,
+        )
+        return {"method": "POST", "url": post["url"], "fields": post["fields"]}
+
+
+def storage_from_env(upload_dir: Path) -> MediaStorage:
+    backend = os.environ.get("MEDIA_STORAGE", "local").lower()
+    if backend == "s3":
+        return S3MediaStorage(
+            bucket=os.environ["S3_BUCKET"],
+            prefix=os.environ.get("S3_PREFIX", ""),
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+            region=os.environ.get("S3_REGION") or None,
+            public_base_url=os.environ.get("S3_PUBLIC_BASE_URL") or None,
+        )
+    secret = os.environ.get("MEDIA_SIGNING_SECRET")
+    # A random secret only works for a single worker; set one for multi-worker setups
+    return LocalMediaStorage(upload_dir, secret.encode("utf-8") if secret else os.urandom(32))
@@ -0,0 +1,121 @@
+"""Copy-on-write sharing of schedule days between templates and their copies.
+
+Days of a template project are stored once more, content-addressed, in the
+``shared_days`` collection. A duplicate of a template does not copy them;
+it stores stubs ``{id, date, position, rank, shared_day}`` pointing at the shared
+content. When a duplicate is saved, every day whose content still matches
+its shared copy stays a stub and only edited days are materialised inline.
+Shared content is immutable, so later edits to the template never leak
+into existing duplicates.
+"""
+from pymongo.errors import BulkWriteError
+from typing import Dict, List
+import hashlib
+import json
+
+from ranks import in_schedule_order
+
+# Day fields that identify or place a day rather than describe its content
+DAY_REF_FIELDS = ("id", "position", "rank", "shared_day")
+
+
+def day_content(day: Dict) -> Dict:
+    return {key: value for key, value in day.items() if key not in DAY_REF_FIELDS}
+
+
+def day_hash(day: Dict) -> str:
+    payload = json.dumps(day_content(day), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_day_ref(day: Dict) -> bool:
+    return "shared_day" in day and "rows" not in day
+
+
+def make_day_ref(day: Dict) -> Dict:
+    """Stub kept in a duplicate for a day that is still shared"""
+    ref = {
+        "id": day.get("id"),
+        "date": day.get("date"),
+        "position": day.get("position", 0),
+        "shared_day": day["shared_day"],
+    }
+    if "rank" in day:
+        ref["rank"] = day["rank"]
+    return ref
+
+
+class SharedDayStore:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def share(self, days: List[Dict]) -> List[Dict]:
+        """Store template days in the shared collection and tag them with their hash"""
+        tagged = []
+        for day in days:
+            if is_day_ref(day):
+                tagged.append(day)
+            else:
+                tagged.append({**day, "shared_day": day_hash(day)})
+
+        hashes = list({day["shared_day"] for day in tagged if not is_day_ref(day)})
+        if not hashes:
+            return tagged
+
+        cursor = self.collection.find({"_id": {"$in": hashes}}, {"_id": 1})
+        known = {doc["_id"] for doc in await cursor.to_list(length=None)}
+        missing = {}
+        for day in tagged:
+            if day["shared_day"] not in known and not is_day_ref(day):
+                missing[day["shared_day"]] = {"_id": day["shared_day"], "day": day_content(day)}
+        if missing:
+            try:
+                await self.collection.insert_many(list(missing.values()), ordered=False)
+            except BulkWriteError:
+                # Another writer stored the same content concurrently
+                pass
+        return tagged
+
+    @staticmethod
+    def compact(days: List[Dict], existing_days: List[Dict]) -> List[Dict]:
+        """Turn incoming days back into stubs where they still match shared content"""
+        refs = {day.get("id"): day["shared_day"] for day in existing_days if is_day_ref(day)}
+        if not refs:
+            return days
+
+        compacted = []
+        for day in days:
+            shared = refs.get(day.get("id"))
+            if shared is not None and day_hash(day) == shared:
+                compacted.append(make_day_ref({**day, "shared_day": shared}))
+            else:
+                compacted.append({key: value for key, value in day.items() if key != "shared_day"})
+        return compacted
+
+    async def resolve(self, doc: Dict, ordered: bool = True) -> Dict:
+        """Return the document with every day stub replaced by its content
+
+        With ``ordered`` days, calltimes and rows also come in display order.
+        """
+        if not doc or not doc.get("days"):
+            return in_schedule_order(doc) if doc and ordered else doc
+
+        hashes = list({day["shared_day"] for day in doc["days"] if is_day_ref(day)})
+        contents = {}
+        if hashes:
+            cursor = self.collection.find({"_id": {"$in": hashes}})
+            contents = {item["_id"]: item["day"] for item in await cursor.to_list(length=None)}
+
+        days = []
+        for day in doc["days"]:
+            if is_day_ref(day):
+                content = contents.get(day["shared_day"], {"date": day.get("date"), "rows": []})
+                placement = {"id": day.get("id"), "position": day.get("position", 0)}
+                if "rank" in day:
+                    placement["rank"] = day["rank"]
+                day = {**content, **placement}
+            else:
+                day = {key: value for key, value in day.items() if key != "shared_day"}
+            days.append(day)
+        doc = {**doc, "days": days}
+        return in_schedule_order(doc) if ordered else doc
@@ -0,0 +1,185 @@
+"""Request tracing, JSON access logs and a slow-operation log.
+
+``RequestTracingMiddleware`` gives every request an id (an incoming
+``X-Request-ID`` or a new one), keeps it together with the ASGI scope in a
+context variable and echoes it in the response. When the request is done
+it writes one JSON line to the ``access`` logger with the route template,
+project id, status and duration. ``RequestContextFilter`` adds the same
+fields to every other log record.
+
+``SlowOperationListener`` is a pymongo command listener. Motor runs each
+operation in a worker thread with a copy of the caller's context, so a
+command slower than the threshold is logged to ``slow_operations`` with
+the request, route and project that issued it.
+"""
+from contextvars import ContextVar
+from datetime import datetime
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from typing import Dict, Optional
+import json
+import logging
+import re
+import time
+import uuid
+
+current_request: ContextVar[Optional[Dict]] = ContextVar("current_request", default=None)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+
+def request_fields() -> Dict:
+    """Request id, method, route template and project id of the current request"""
+    context = current_request.get()
+    if context is None:
+        return {}
+    scope = context["scope"]
+    route = scope.get("route")
+    return {
+        "request_id": context["id"],
+        "method": scope.get("method", "WS" if scope["type"] == "websocket" else None),
+        "route": getattr(route, "path", None) or scope.get("path"),
+        "project_id": (scope.get("path_params") or {}).get("project_id"),
+    }
+
+
+def json_line(**fields) -> str:
+    return json.dumps({key: value for key, value in fields.items() if value is not None}, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        fields = request_fields()
+        record.request_id = fields.get("request_id", "-")
+        record.route = fields.get("route")
+        record.project_id = fields.get("project_id")
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json_line(
+            ts=datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            level=record.levelname,
+            logger=record.name,
+            message=record.getMessage(),
+            request_id=None if getattr(record, "request_id", "-") == "-" else record.request_id,
+            route=getattr(record, "route", None),
+            project_id=getattr(record, "project_id", None),
+            exc=self.formatException(record.exc_info) if record.exc_info else None,
+        )
+
+
+def configure_logging(log_format: str = "text"):
+    """Root logging with request ids (text or JSON); access and slow logs as JSON lines"""
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestContextFilter())
+    handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    logging.basicConfig(level=logging.INFO, handlers=[handler], force=True)
+
+    for name in ("access", "slow_operations"):
+        structured = logging.StreamHandler()
+        structured.setFormatter(logging.Formatter("%(message)s"))
+        structured_logger = logging.getLogger(name)
+        structured_logger.handlers = [structured]
+        structured_logger.propagate = False
+
+
+class RequestTracingMiddleware:
+    def __init__(self, app, access_log: bool = True):
+        self.app = app
+        self.access_log = access_log
+        self.logger = logging.getLogger("access")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.lower().encode("latin-1"):
+                request_id = value.decode("latin-1")
+        if not request_id or not VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        token = current_request.set({"id": request_id, "scope": scope})
+        started = time.perf_counter()
+        status = None
+
+        async def traced_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(REQUEST_ID_HEADER, request_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        except Exception:
+            status = status or 500
+            raise
+        finally:
+            if self.access_log:
+                client = scope.get("client")
+                self.logger.info(json_line(
+                    ts=datetime.now().isoformat(timespec="milliseconds"),
+                    type="access",
+                    **request_fields(),
+                    path=scope.get("path"),
+                    status=status,
+                    duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                    client=client[0] if client else None,
+                ))
+            current_request.reset(token)
+
+
+def _command_summary(event: monitoring.CommandStartedEvent) -> Dict:
+    command = event.command
+    target = command.get(event.command_name)
+    query = command.get("filter") or command.get("query")
+    if query is None and isinstance(command.get("updates"), list) and command["updates"]:
+        query = command["updates"][0].get("q")
+    if query is None and isinstance(command.get("deletes"), list) and command["deletes"]:
+        query = command["deletes"][0].get("q")
+    return {
+        "command": event.command_name,
+        "collection": target if isinstance(target, str) else None,
+        # Field names only; values may hold schedule content
+        "filter_keys": sorted(query) if isinstance(query, dict) else None,
+    }
+
+
+class SlowOperationListener(monitoring.CommandListener):
+    """Logs MongoDB commands slower than ``threshold_ms``"""
+
+    def __init__(self, threshold_ms: float):
+        self.threshold_ms = threshold_ms
+        self.logger = logging.getLogger("slow_operations")
+        self._pending: Dict = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        self._pending[(event.connection_id, event.request_id)] = (_command_summary(event), request_fields())
+
+    def _finished(self, event, failure: Optional[str] = None):
+        summary, fields = self._pending.pop((event.connection_id, event.request_id), ({}, {}))
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+        self.logger.warning(json_line(
+            ts=datetime.now().isoformat(timespec="milliseconds"),
+            type="slow_operation",
+            duration_ms=round(duration_ms, 1),
+            database=event.database_name,
+            **summary,
+            **fields,
+            failure=failure,
+        ))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event, failure=str(event.failure.get("errmsg", event.failure)))
@@ -0,0 +1,140 @@
+"""Garbage collector for orphaned uploads.
+
+Every logo change or deleted project leaves its old file behind in media
+storage. The collector builds the set of keys still referenced by a
+project's ``logo_url`` (live and cold projects, read through a projected
+cursor), streams the stored objects and deletes unreferenced ones older
+than a grace period in batches, together with their ``media`` records, so
+uploads for projects that have not been saved yet survive.
+
+Run it from the command line with::
+
+    python upload_gc.py --grace-hours 24 [--dry-run]
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List, Set
+import asyncio
+import logging
+import os
+import time
+
+from storage import MediaStorage, storage_from_env
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PREFIX = "/api/media/"
+
+
+def filename_from_url(url: str) -> str:
+    if not url or not url.startswith(MEDIA_PREFIX):
+        return ""
+    return url[len(MEDIA_PREFIX):]
+
+
+async def referenced_filenames(collections: Iterable) -> Set[str]:
+    """File names referenced by ``logo_url`` in any of the given collections"""
+    names = set()
+    for collection in collections:
+        cursor = collection.find({"logo_url": {"$nin": ["", None]}}, {"_id": 0, "logo_url": 1})
+        async for doc in cursor:
+            name = filename_from_url(doc.get("logo_url", ""))
+            if name:
+                names.add(name)
+    return names
+
+
+async def delete_unreferenced(storage: MediaStorage, collections: Iterable, names: Iterable[str]) -> List[str]:
+    """Delete the given uploads right away unless a project still references them"""
+    names = {name for name in names if name}
+    if not names:
+        return []
+    urls = [MEDIA_PREFIX + name for name in names]
+    for collection in collections:
+        cursor = collection.find({"logo_url": {"$in": urls}}, {"_id": 0, "logo_url": 1})
+        async for doc in cursor:
+            names.discard(filename_from_url(doc.get("logo_url", "")))
+    orphaned = sorted(names)
+    if orphaned:
+        await storage.delete_many(orphaned)
+    return orphaned
+
+
+async def _delete_batch(storage: MediaStorage, media, keys: List[str]):
+    await storage.delete_many(keys)
+    if media is not None:
+        await media.delete_many({"_id": {"$in": keys}})
+
+
+async def collect_orphaned_uploads(storage: MediaStorage, collections: Iterable, grace_seconds: float,
+                                   batch_size: int = 500, dry_run: bool = False, media=None) -> Dict:
+    """Delete unreferenced uploads older than the grace period and report what was reclaimed
+
+    ``media`` is the collection of upload records; the records of deleted uploads go with them.
+    """
+    referenced = await referenced_filenames(collections)
+    cutoff = time.time() - grace_seconds
+    report = {"scanned": 0, "referenced": 0, "recent": 0, "deleted": 0,
+              "reclaimed_bytes": 0, "dry_run": dry_run}
+
+    batch: List[str] = []
+    async for key, size, modified in storage.iter_objects():
+        report["scanned"] += 1
+        if key in referenced:
+            report["referenced"] += 1
+            continue
+        if modified > cutoff:
+            report["recent"] += 1
+            continue
+        report["deleted"] += 1
+        report["reclaimed_bytes"] += size
+        if dry_run:
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            await _delete_batch(storage, media, batch)
+            batch = []
+    if batch:
+        await _delete_batch(storage, media, batch)
+
+    logger.info(
+        f"Upload GC {'(dry run) ' if dry_run else ''}scanned {report['scanned']} files, "
+        f"removed {report['deleted']}, reclaimed {report['reclaimed_bytes']} bytes"
+    )
+    return report
+
+
+async def _main():
+    import argparse
+    from dotenv import load_dotenv
+    from repository import client_from_env
+
+    root = Path(__file__).parent
+    parser = argparse.ArgumentParser(description="Delete uploads no project references any more")
+    parser.add_argument("--grace-hours", type=float,
+                        default=float(os.environ.get("UPLOAD_GC_GRACE_HOURS", "24")))
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--upload-dir", type=Path, default=root / "uploads")
+    args = parser.parse_args()
+
+    load_dotenv(root / '.env')
+    client = client_from_env(root)
+    db = client[os.environ.get('DB_NAME', 'filmschedule')]
+    try:
+        report = await collect_orphaned_uploads(
+            storage_from_env(args.upload_dir),
+            [db.projects, db.projects_cold],
+            args.grace_hours * 3600,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+            media=db.media,
+        )
+        for key, value in report.items():
+            print(f"{key}: {value}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_main())
@@ -0,0 +1,176 @@
+"""Workspaces: the tenant every project belongs to.
+
+Projects, cold projects, tombstones, uploads, jobs and idempotency keys
+all carry a ``workspace``. A request names its workspace in the
+``X-Workspace`` header, or in a ``workspace`` query parameter for calendar
+subscriptions and websockets, which cannot send headers. Without either it
+works in the ``default`` workspace, which also holds the data saved before
+workspaces existed.
+
+``WorkspaceMiddleware`` keeps the request's workspace in a context
+variable. The stores add it to every query and new document themselves, so
+an endpoint cannot forget it, and queries lead with it to stay inside the
+workspace's index range. Jobs run in the workspace that queued them;
+maintenance over all tenants runs in ``ALL_WORKSPACES``.
+
+``WorkspaceUsage`` counts the projects and stored bytes of each workspace
+and refuses writes that would go over the configured quotas.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+import json
+import re
+
+WORKSPACE_HEADER = "X-Workspace"
+DEFAULT_WORKSPACE = "default"
+# Active while maintenance runs across every workspace; no document belongs to it
+ALL_WORKSPACES = "*"
+VALID_WORKSPACE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+current_workspace: ContextVar[Optional[str]] = ContextVar("current_workspace", default=None)
+
+
+def active_workspace() -> str:
+    name = current_workspace.get()
+    if name is None:
+        raise RuntimeError("No workspace is active")
+    return name
+
+
+def workspace() -> str:
+    """The workspace new documents are created in"""
+    name = active_workspace()
+    if name == ALL_WORKSPACES:
+        raise RuntimeError("Documents cannot be created in all workspaces at once")
+    return name
+
+
+def workspace_query(query: Optional[Dict] = None) -> Dict:
+    """``query`` narrowed to the active workspace"""
+    name = active_workspace()
+    if name == ALL_WORKSPACES:
+        return dict(query or {})
+    return {"workspace": name, **(query or {})}
+
+
+@contextmanager
+def in_workspace(name: str):
+    token = current_workspace.set(name)
+    try:
+        yield
+    finally:
+        current_workspace.reset(token)
+
+
+def workspace_from_scope(scope) -> Optional[str]:
+    """The workspace an HTTP or websocket request names; None if the name is invalid"""
+    name = None
+    for header, value in scope.get("headers", []):
+        if header == WORKSPACE_HEADER.lower().encode("latin-1"):
+            name = value.decode("latin-1")
+    if name is None:
+        values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("workspace")
+        name = values[0] if values else DEFAULT_WORKSPACE
+    name = name.strip().lower()
+    return name if VALID_WORKSPACE.match(name) else None
+
+
+def document_size(doc: Dict) -> int:
+    """Bytes a project counts against its workspace's storage quota"""
+    return len(json.dumps(doc, default=str, separators=(",", ":")).encode("utf-8"))
+
+
+class WorkspaceMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        name = workspace_from_scope(scope)
+        if name is None:
+            if scope["type"] == "http":
+                response = JSONResponse({"detail": "Invalid workspace name"}, status_code=400)
+                await response(scope, receive, send)
+            else:
+                await send({"type": "websocket.close", "code": 1008})
+            return
+
+        with in_workspace(name):
+            await self.app(scope, receive, send)
+
+
+class WorkspaceUsage:
+    """Project count and stored bytes per workspace, with quotas (0 means unlimited)
+
+    The counters are kept up to date by the project stores as they write;
+    ``recount`` rebuilds them from the stored projects.
+    """
+
+    def __init__(self, collection, max_projects: int = 0, max_bytes: int = 0):
+        self.collection = collection
+        self.max_projects = max_projects
+        self.max_bytes = max_bytes
+
+    async def get(self, name: str) -> Dict[str, int]:
+        doc = await self.collection.find_one({"_id": name}) or {}
+        return {"projects": doc.get("projects", 0), "bytes": doc.get("bytes", 0)}
+
+    async def add(self, name: str, projects: int = 0, size: int = 0):
+        if projects or size:
+            await self.collection.update_one(
+                {"_id": name},
+                {"$inc": {"projects": projects, "bytes": size}},
+                upsert=True
+            )
+
+    async def check(self, projects: int = 0, size: int = 0):
+        """Refuse (403) a write that would take the active workspace over a quota"""
+        over_projects = self.max_projects and projects > 0
+        over_bytes = self.max_bytes and size > 0
+        if not over_projects and not over_bytes:
+            return
+        usage = await self.get(workspace())
+        if over_projects and usage["projects"] + projects > self.max_projects:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Workspace project quota reached ({self.max_projects} projects)"
+            )
+        if over_bytes and usage["bytes"] + size > self.max_bytes:
+            raise HTTPException(status_code=403, detail="Workspace storage quota exceeded")
+
+    async def recount(self, hot, cold) -> Dict[str, Dict[str, int]]:
+        """Rebuild the counters from the hot and cold project collections
+
+        Projects stored before sizes were tracked get their size now.
+        """
+        totals: Dict[str, Dict[str, int]] = {}
+
+        def count(name: str, size: int):
+            usage = totals.setdefault(name, {"projects": 0, "bytes": 0})
+            usage["projects"] += 1
+            usage["bytes"] += size
+
+        async for doc in hot.find({}, {"workspace": 1, "size": 1}):
+            size = doc.get("size")
+            if size is None:
+                project = await hot.find_one({"_id": doc["_id"]})
+                if project is None:
+                    continue
+                size = document_size(project)
+                await hot.update_one({"_id": doc["_id"]}, {"$set": {"size": size}})
+            count(doc.get("workspace", DEFAULT_WORKSPACE), size)
+        async for doc in cold.find({}, {"workspace": 1, "project_size": 1, "size": 1}):
+            # Frozen before sizes were tracked: the compressed size has to do
+            count(doc.get("workspace", DEFAULT_WORKSPACE), doc.get("project_size", doc.get("size", 0)))
+
+        for name, usage in totals.items():
+            await self.collection.replace_one({"_id": name}, usage, upsert=True)
+        await self.collection.delete_many({"_id": {"$nin": list(totals)}})
+        return totals
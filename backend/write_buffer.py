@@ -0,0 +1,95 @@
+"""Write-behind buffer that coalesces rapid saves of the same project.
+
+Saves that arrive for one key within ``window`` seconds collapse into a
+single write of the latest payload (or of the payloads merged by
+``combine``, for partial updates). Every caller waits for that write and
+receives its result, so clients are acknowledged with the version that was
+actually persisted. At most one write per window is issued per key.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+Flush = Callable[[str, Any], Awaitable[Any]]
+Combine = Callable[[Any, Any], Any]
+
+
+class _Slot:
+    def __init__(self):
+        self.payload: Any = None
+        self.has_payload = False
+        self.waiters: List[asyncio.Future] = []
+        self.task: Optional[asyncio.Task] = None
+        self.wake = asyncio.Event()
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush: Flush, window: float, combine: Optional[Combine] = None):
+        self.flush = flush
+        self.window = window
+        self.combine = combine
+        self._slots: Dict[str, _Slot] = {}
+
+    async def submit(self, key: str, payload: Any) -> Any:
+        """Queue a payload for ``key`` and wait until it (or a newer one) is written"""
+        if self.window <= 0:
+            return await self.flush(key, payload)
+
+        slot = self._slots.setdefault(key, _Slot())
+        if slot.has_payload and self.combine is not None:
+            payload = self.combine(slot.payload, payload)
+        slot.payload = payload
+        slot.has_payload = True
+        waiter = asyncio.get_running_loop().create_future()
+        slot.waiters.append(waiter)
+        if slot.task is None:
+            slot.task = asyncio.create_task(self._run(key, slot))
+        return await waiter
+
+    async def _run(self, key: str, slot: _Slot):
+        try:
+            while slot.has_payload:
+                try:
+                    await asyncio.wait_for(slot.wake.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+                await self._write(key, slot)
+        except asyncio.CancelledError:
+            # Callers waiting for a write that will not happen are not left hanging
+            for waiter in slot.waiters:
+                waiter.cancel()
+            slot.payload, slot.has_payload, slot.waiters = None, False, []
+            raise
+        finally:
+            slot.task = None
+            if not slot.has_payload:
+                self._slots.pop(key, None)
+
+    async def _write(self, key: str, slot: _Slot):
+        payload, waiters = slot.payload, slot.waiters
+        slot.payload, slot.has_payload, slot.waiters = None, False, []
+        if len(waiters) > 1:
+            logger.info(f"Coalesced {len(waiters)} saves of {key} into one write")
+        try:
+            result = await self.flush(key, payload)
+        except asyncio.CancelledError:
+            for waiter in waiters:
+                waiter.cancel()
+            raise
+        except Exception as e:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(result)
+
+    async def flush_all(self):
+        """Write every pending payload immediately (used on shutdown)"""
+        for slot in list(self._slots.values()):
+            slot.wake.set()
+            if slot.task is not None:
+                await slot.task
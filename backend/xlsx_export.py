@@ -0,0 +1,107 @@
+"""Excel export of a project.
+
+Uses openpyxl's write-only workbook, which streams rows to temporary
+files instead of keeping every cell object in memory, so memory stays
+flat however large a project is. There is one sheet per shoot day, using
+the project's ``column_headers`` and ``column_widths``, plus one sheet
+with all call times. Rendering is synchronous; the API runs it in a
+worker thread.
+"""
+from typing import BinaryIO, Dict, Set
+import re
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+from payloads import CALLTIME_HEADER_DEFAULTS, COLUMN_HEADER_DEFAULTS, COLUMN_WIDTH_DEFAULTS
+
+COLUMNS = ("time", "scene", "location", "cast", "notes")
+# column_widths are percentages of the page; this is the page width in characters
+PAGE_WIDTH_CHARS = 120
+MIN_COLUMN_CHARS = 6
+
+HEADER_FONT = Font(bold=True)
+HEADER_FILL = PatternFill("solid", fgColor="DDDDDD")
+HEADER_BORDER = Border(bottom=Side(style="thin"))
+TITLE_FONT = Font(bold=True, size=12)
+TEXT_ROW_FONT = Font(italic=True)
+WRAP = Alignment(wrap_text=True, vertical="top")
+
+INVALID_TITLE_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+def sheet_title(title: str, used: Set[str]) -> str:
+    """A unique sheet name within Excel's 31 character limit"""
+    base = INVALID_TITLE_CHARS.sub("-", title).strip()[:31] or "Sheet"
+    candidate, counter = base, 2
+    while candidate.casefold() in used:
+        suffix = f" ({counter})"
+        candidate = base[:31 - len(suffix)] + suffix
+        counter += 1
+    used.add(candidate.casefold())
+    return candidate
+
+
+def _styled(sheet, value, font=None, fill=None, border=None, alignment=None) -> WriteOnlyCell:
+    cell = WriteOnlyCell(sheet, value=value)
+    if font:
+        cell.font = font
+    if fill:
+        cell.fill = fill
+    if border:
+        cell.border = border
+    if alignment:
+        cell.alignment = alignment
+    return cell
+
+
+def _header_row(sheet, values):
+    return [_styled(sheet, value, HEADER_FONT, HEADER_FILL, HEADER_BORDER) for value in values]
+
+
+def _write_day(sheet, day: Dict, headers: Dict, widths: Dict):
+    for index, column in enumerate(COLUMNS):
+        letter = chr(ord("A") + index)
+        width = widths.get(column) or COLUMN_WIDTH_DEFAULTS[column]
+        sheet.column_dimensions[letter].width = max(MIN_COLUMN_CHARS, width * PAGE_WIDTH_CHARS / 100)
+    sheet.freeze_panes = "A2"
+    sheet.append(_header_row(sheet, [headers.get(column, "") for column in COLUMNS]))
+
+    for row in day.get('rows', []):
+        if row.get('type', 'item') == 'text':
+            sheet.append([_styled(sheet, row.get('notes', ''), font=TEXT_ROW_FONT)])
+        else:
+            sheet.append([_styled(sheet, row.get(column, ''), alignment=WRAP) for column in COLUMNS])
+
+
+def _write_calltimes(sheet, calltimes):
+    sheet.column_dimensions["A"].width = 12
+    sheet.column_dimensions["B"].width = 40
+    for calltime in calltimes:
+        headers = {**CALLTIME_HEADER_DEFAULTS, **(calltime.get('headers') or {})}
+        sheet.append([_styled(sheet, calltime.get('title', ''), font=TITLE_FONT)])
+        sheet.append(_header_row(sheet, [headers["time"], headers["name"]]))
+        for row in calltime.get('rows', []):
+            if row.get('type', 'item') == 'text':
+                sheet.append([_styled(sheet, row.get('name', ''), font=TEXT_ROW_FONT)])
+            else:
+                sheet.append([row.get('time', ''), row.get('name', '')])
+        sheet.append([])
+
+
+def write_project_xlsx(project: Dict, target: BinaryIO):
+    """Render a resolved project into ``target`` as an .xlsx workbook"""
+    workbook = Workbook(write_only=True)
+    headers = {**COLUMN_HEADER_DEFAULTS, **(project.get('column_headers') or {})}
+    widths = {**COLUMN_WIDTH_DEFAULTS, **(project.get('column_widths') or {})}
+    used: Set[str] = set()
+
+    for number, day in enumerate(project.get('days', []), start=1):
+        sheet = workbook.create_sheet(sheet_title(f"Day {number} {day.get('date', '')}", used))
+        _write_day(sheet, day, headers, widths)
+
+    if project.get('calltimes') or not project.get('days'):
+        _write_calltimes(workbook.create_sheet(sheet_title("Calltimes", used)), project.get('calltimes', []))
+
+    workbook.save(target)
@@ -0,0 +1,36 @@
+"""
+Shared setup for the in-process API tests: the server runs on the embedded SQLite store,
+so no MongoDB or running server is needed.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ['DATABASE_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = ':memory:'
+os.environ['SAVE_COALESCE_WINDOW_MS'] = '0'
+os.environ['RATE_LIMIT_PER_MINUTE'] = '0'
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+
+@pytest.fixture(scope="session")
+def api():
+    from fastapi.testclient import TestClient
+
+    import server
+
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    """Uploads go to a temporary directory instead of backend/uploads"""
+    import server
+    from storage import LocalMediaStorage
+
+    storage = LocalMediaStorage(tmp_path, b"test-secret")
+    monkeypatch.setattr(server, "media_storage", storage)
+    return storage
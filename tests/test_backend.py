@@ -0,0 +1,78 @@
+"""
+Film Schedule API tests: the project lifecycle from upload to delete.
+Run with: python -m pytest tests/test_backend.py
+"""
+from datetime import datetime, timedelta
+
+from tests.test_core import PNG_BYTES
+
+COLUMN_WIDTHS = {"time_from": 8, "time_to": 8, "scene": 15, "location": 20, "cast": 25, "notes": 24}
+
+
+def project_data(name, date, logo_url=""):
+    return {
+        "name": name,
+        "notes": "Test project notes",
+        "logo_url": logo_url,
+        "column_widths": COLUMN_WIDTHS,
+        "days": [{
+            "id": "day1",
+            "date": date,
+            "rows": [{
+                "id": "row1", "type": "item", "time": "08:00-10:00", "scene": "Scene 1A",
+                "location": "Studio A", "cast": "Actor 1, Actor 2", "notes": "Morning shoot",
+            }],
+        }],
+    }
+
+
+def test_project_lifecycle(api, media):
+    uploaded = api.post("/api/uploads/logo", files={"file": ("test_logo.png", PNG_BYTES, "image/png")})
+    assert uploaded.status_code == 200
+    logo_url = uploaded.json()["url"]
+
+    today = datetime.now().strftime("%d-%m-%Y")
+    created = api.post("/api/projects/save", json=project_data("Lifecycle Project", today, logo_url))
+    assert created.status_code == 200
+    project_id = created.json()["id"]
+    assert created.json()["logo_url"] == logo_url
+
+    listed = api.get("/api/projects", params={"include_archived": True})
+    assert listed.status_code == 200
+    assert project_id in [item["id"] for item in listed.json()["active"]]
+
+    loaded = api.get(f"/api/projects/{project_id}")
+    assert loaded.status_code == 200
+    project = loaded.json()
+    assert project["name"] == "Lifecycle Project"
+    assert len(project["days"]) == 1
+
+    project["notes"] = "Updated notes"
+    project["days"].append({
+        "id": "day2",
+        "date": (datetime.now() + timedelta(days=1)).strftime("%d-%m-%Y"),
+        "rows": [{"id": "row2", "type": "text", "time": "", "scene": "", "location": "", "cast": "",
+                  "notes": "Afternoon Session"}],
+    })
+    updated = api.put(f"/api/projects/{project_id}", json=project)
+    assert updated.status_code == 200
+    assert updated.json()["notes"] == "Updated notes"
+    assert len(updated.json()["days"]) == 2
+
+    exported = api.get(f"/api/projects/{project_id}/export.csv")
+    assert exported.status_code == 200
+    lines = exported.text.splitlines()
+    assert lines[1] == "Date,Time,Scene,Location,Cast,Notes"
+    assert "Afternoon Session" in exported.text
+
+    deleted = api.delete(f"/api/projects/{project_id}")
+    assert deleted.status_code == 200
+    assert api.get(f"/api/projects/{project_id}").status_code == 404
+    assert api.delete(f"/api/projects/{project_id}").status_code == 404
+
+
+def test_project_with_past_dates_is_archived(api):
+    past_date = (datetime.now() - timedelta(days=5)).strftime("%d-%m-%Y")
+    response = api.post("/api/projects/save", json=project_data("Past Project", past_date))
+    assert response.status_code == 200
+    assert response.json()["archived"] is True
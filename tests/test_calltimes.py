@@ -0,0 +1,50 @@
+"""
+Unit tests for call times derived from the schedule.
+Run with: python -m pytest tests/test_calltimes.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from calltimes import earliest_scenes, generate_calltimes, merge_calltimes  # noqa: E402
+
+
+def item(time, cast):
+    return {"type": "item", "time": time, "cast": cast}
+
+
+def test_earliest_scene_per_person():
+    day = {"rows": [
+        item("10:00-11:00", "Anna, Ben"),
+        {"type": "text", "time": "06:00", "cast": "Anna"},
+        item("", "Cleo"),
+        item("8.30", "anna  & Dora"),
+    ]}
+    # Text rows and rows without a time do not call anyone; the first spelling is kept
+    assert earliest_scenes(day) == {"anna": ("Anna", 510), "ben": ("Ben", 600), "dora": ("Dora", 510)}
+
+
+def test_generate_one_block_per_day_with_cast():
+    days = [
+        {"id": "d1", "date": "01-06-2030", "rows": [item("09:00", "Ben"), item("00:30", "Anna")]},
+        {"id": "d2", "date": "02-06-2030", "rows": [{"type": "text", "notes": "Travel"}]},
+        {"id": "d3", "date": "03-06-2030", "rows": [item("14:15", "Cleo")]},
+    ]
+    generated = generate_calltimes(days, 45)
+    assert [block["source_day_id"] for block in generated] == ["d1", "d3"]
+    assert generated[0]["title"] == "Calltime 01-06-2030"
+    # Calls are sorted by time and never before midnight
+    assert [(row["time"], row["name"]) for row in generated[0]["rows"]] == [("00:00", "Anna"), ("08:15", "Ben")]
+    assert [(row["time"], row["name"]) for row in generated[1]["rows"]] == [("13:30", "Cleo")]
+    assert all(row["id"] and row["type"] == "item" for row in generated[0]["rows"])
+
+
+def test_merge_replaces_generated_blocks_only():
+    manual = {"id": "m1", "title": "Crew", "rows": [], "position": 3, "source_day_id": None}
+    stale = {"id": "g1", "title": "Calltime old", "rows": [], "position": 0, "source_day_id": "d1"}
+    fresh = generate_calltimes([{"id": "d1", "date": "01-06-2030", "rows": [item("09:00", "Anna")]}], 60)
+
+    merged = merge_calltimes([stale, manual], fresh)
+    assert [block["id"] for block in merged] == ["m1", fresh[0]["id"]]
+    assert [block["position"] for block in merged] == [0, 1]
@@ -0,0 +1,119 @@
+"""
+Unit tests for moving long-archived projects into cold storage, on the embedded SQLite store.
+Run with: python -m pytest tests/test_cold_storage.py
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from cold_storage import ColdStorage  # noqa: E402
+from embedded import EmbeddedClient  # noqa: E402
+from repository import ChangeLog  # noqa: E402
+from workspaces import DEFAULT_WORKSPACE, in_workspace  # noqa: E402
+
+
+class RacingCollection:
+    """A cold collection that lets a save land on the hot copy while it is being frozen"""
+
+    def __init__(self, collection, save):
+        self.collection = collection
+        self.save = save
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def replace_one(self, *args, **kwargs):
+        result = await self.collection.replace_one(*args, **kwargs)
+        await self.save()
+        return result
+
+
+def archived_project(name):
+    return {
+        "workspace": DEFAULT_WORKSPACE,
+        "name": name,
+        "archived": True,
+        "archived_at": datetime.now() - timedelta(days=400),
+        "version": 3,
+        "change_seq": 1,
+        "days": [{"id": "d1", "date": "01-06-2020", "rows": []}],
+    }
+
+
+def test_sweep_freezes_and_thaws():
+    async def run():
+        db = EmbeddedClient(":memory:")["test"]
+        cold_storage = ColdStorage(db.projects, db.projects_cold, ChangeLog(db.counters, db.project_tombstones))
+        project_id = (await db.projects.insert_one(archived_project("Old Shoot"))).inserted_id
+
+        assert (await cold_storage.sweep(timedelta(days=180)))["frozen"] == 1
+        assert await db.projects.count_documents({}) == 0
+        assert await db.project_tombstones.count_documents({"reason": "cold"}) == 1
+
+        thawed = await cold_storage.thaw(project_id)
+        assert thawed["name"] == "Old Shoot" and thawed["days"][0]["id"] == "d1"
+        assert await db.projects_cold.count_documents({}) == 0
+        assert await db.project_tombstones.count_documents({}) == 0
+
+    with in_workspace(DEFAULT_WORKSPACE):
+        asyncio.run(run())
+
+
+def test_save_during_freeze_keeps_the_project_hot():
+    async def run():
+        db = EmbeddedClient(":memory:")["test"]
+        project_id = (await db.projects.insert_one(archived_project("Busy Shoot"))).inserted_id
+
+        async def save():
+            await db.projects.update_one(
+                {"_id": project_id},
+                {"$set": {"notes": "edited while freezing", "change_seq": 2}, "$inc": {"version": 1}}
+            )
+
+        racing = ColdStorage(
+            db.projects, RacingCollection(db.projects_cold, save), ChangeLog(db.counters, db.project_tombstones)
+        )
+        assert await racing.sweep(timedelta(days=180)) == {"frozen": 0, "project_ids": []}
+        hot = await db.projects.find_one({"_id": project_id})
+        assert hot["notes"] == "edited while freezing" and hot["version"] == 4
+        assert await db.projects_cold.count_documents({}) == 0
+        assert await db.project_tombstones.count_documents({}) == 0
+
+        # Without a racing write the next sweep moves the saved version
+        cold_storage = ColdStorage(db.projects, db.projects_cold, ChangeLog(db.counters, db.project_tombstones))
+        assert (await cold_storage.sweep(timedelta(days=180)))["frozen"] == 1
+        assert (await cold_storage.thaw(project_id))["notes"] == "edited while freezing"
+
+    with in_workspace(DEFAULT_WORKSPACE):
+        asyncio.run(run())
+
+
+def test_cold_pages():
+    async def run():
+        db = EmbeddedClient(":memory:")["test"]
+        cold_storage = ColdStorage(db.projects, db.projects_cold, ChangeLog(db.counters, db.project_tombstones))
+        assert await cold_storage.page(None, 2) == {"items": [], "next_cursor": None}
+
+        for name in ("First", "Second", "Third"):
+            await db.projects.insert_one(archived_project(name))
+        await cold_storage.sweep(timedelta(days=180))
+
+        first = await cold_storage.page(None, 2)
+        assert [item["name"] for item in first["items"]] == ["Third", "Second"]
+        last = await cold_storage.page(first["next_cursor"], 2)
+        assert [item["name"] for item in last["items"]] == ["First"]
+        assert last["next_cursor"] is None
+
+    with in_workspace(DEFAULT_WORKSPACE):
+        asyncio.run(run())
+
+
+def test_cold_limit_is_bounded(api):
+    for limit in (0, -1, 201):
+        response = api.get("/api/projects", params={"include_archived": True, "cold_limit": limit})
+        assert response.status_code == 422
+    response = api.get("/api/projects", params={"include_archived": True, "cold_limit": 200})
+    assert response.status_code == 200 and response.json()["cold"]["next_cursor"] is None
@@ -0,0 +1,120 @@
+"""
+Unit tests for cast and time parsing and the in-memory conflict index.
+Run with: python -m pytest tests/test_conflicts.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from conflicts import (  # noqa: E402
+    DEFAULT_SCENE_MINUTES, ConflictIndex, WorkspaceConflictIndex, parse_cast, parse_time_range, project_bookings,
+)
+from workspaces import in_workspace  # noqa: E402
+
+
+def test_parse_cast():
+    assert parse_cast("Anna, Ben; Cleo / Dora & Emil + Finn") == ["Anna", "Ben", "Cleo", "Dora", "Emil", "Finn"]
+    assert parse_cast("Anna and Ben UND Cleo\nDora") == ["Anna", "Ben", "Cleo", "Dora"]
+    # Blanks are dropped and repeated names kept once, in their first spelling
+    assert parse_cast(" ,  Anna  Maria ,, anna   maria, ") == ["Anna Maria"]
+    assert parse_cast("Alexander") == ["Alexander"]
+    assert parse_cast("") == [] and parse_cast(None) == []
+
+
+def test_parse_time_range():
+    assert parse_time_range("8:00") == (480, None)
+    assert parse_time_range("08.30-10h") == (510, 600)
+    assert parse_time_range("9h - 9:45") == (540, 585)
+    assert parse_time_range("25:00 7:61 7:15") == (435, None)
+    assert parse_time_range("") == (None, None)
+    # An end at or before the start (a range past midnight) is dropped
+    assert parse_time_range("22:00-01:00") == (1320, None)
+    assert parse_time_range("10:00-10:00") == (600, None)
+
+
+def row(row_id, time, cast):
+    return {"id": row_id, "type": "item", "time": time, "cast": cast}
+
+
+def project(name, date, *rows, **fields):
+    return {"name": name, "days": [{"id": f"{name}-day", "date": date, "rows": list(rows)}], **fields}
+
+
+def test_end_times_default_to_the_next_start():
+    bookings = project_bookings("p1", project(
+        "Shoot", "01-06-2030",
+        row("r1", "08:00", "Anna"),
+        {"type": "text", "time": "08:10", "cast": "Nobody"},
+        row("r2", "07:00", "Ben"),
+        row("r3", "09:00", "Anna"),
+        row("r4", "22:00-01:00", "Cleo"),
+        row("r5", "", "Dora"),
+    ))
+    ends = {(booking.row_id, booking.person): (booking.start, booking.end) for booking in bookings}
+    # The next later start ends a scene; without one it runs the default length
+    assert ends[("r1", "Anna")] == (480, 540)
+    assert ends[("r2", "Ben")] == (420, 540)
+    assert ends[("r3", "Anna")] == (540, 1320)
+    assert ends[("r4", "Cleo")] == (1320, 1320 + DEFAULT_SCENE_MINUTES)
+    assert ends[("r5", "Dora")] == (None, None)
+    assert "Nobody" not in [booking.person for booking in bookings]
+
+
+def kinds(conflicts):
+    return sorted((conflict["kind"], conflict["overlapping"]) for conflict in conflicts)
+
+
+def test_overlaps_and_double_bookings():
+    index = ConflictIndex()
+    index.update("p1", project(
+        "First", "01-06-2030",
+        row("r1", "08:00-10:00", "Anna"),
+        row("r2", "09:00-11:00", "anna"),
+        row("r3", "11:00-12:00", "Anna, Ben"),
+        row("r4", "", "Ben"),
+    ))
+    # Within a project only rows whose times overlap conflict; rows without a time never do
+    assert kinds(index.for_project("p1")) == [("overlap", True)]
+
+    index.update("p2", project("Second", "01-06-2030", row("r1", "18:00", "Ben")))
+    index.update("p3", project("Third", "02-06-2030", row("r1", "08:00", "Anna")))
+    # Across projects any booking on the same date is a double booking, overlapping or not
+    assert kinds(index.for_project("p2")) == [("double_booking", False), ("double_booking", False)]
+    assert kinds(index.for_person("ANNA")) == [("overlap", True)]
+    assert index.for_project("p3") == []
+    assert index.stats() == {"projects": 3, "people": 2, "dates": 2}
+
+
+def test_incremental_update_and_remove():
+    index = ConflictIndex()
+    index.update("p1", project("First", "01-06-2030", row("r1", "08:00", "Anna")))
+    index.update("p2", project("Second", "01-06-2030", row("r1", "08:00", "Anna")))
+    assert len(index.for_person("Anna")) == 1
+
+    # A save replaces the project's bookings
+    index.update("p2", project("Second", "02-06-2030", row("r1", "08:00", "Anna")))
+    assert index.for_person("Anna") == []
+    assert index.stats() == {"projects": 2, "people": 1, "dates": 2}
+
+    # Archived projects and templates drop out; removing cleans up every key
+    index.update("p2", project("Second", "01-06-2030", row("r1", "08:00", "Anna"), archived=True))
+    index.update("p3", project("Template", "01-06-2030", row("r1", "08:00", "Anna"), is_template=True))
+    assert index.for_person("Anna") == []
+    index.remove("p1")
+    index.remove("missing")
+    assert index.stats() == {"projects": 0, "people": 0, "dates": 0}
+
+
+def test_workspaces_do_not_meet():
+    index = WorkspaceConflictIndex()
+    index.update("p1", project("First", "01-06-2030", row("r1", "08:00", "Anna"), workspace="a"))
+    index.update("p2", project("Second", "01-06-2030", row("r1", "08:00", "Anna"), workspace="b"))
+    with in_workspace("a"):
+        assert index.for_person("Anna") == []
+    index.update("p2", project("Second", "01-06-2030", row("r1", "08:00", "Anna"), workspace="a"))
+    with in_workspace("a"):
+        assert len(index.for_project("p1")) == 1
+    with in_workspace("b"):
+        assert index.for_project("p2") == []
+    assert index.stats()["projects"] == 2
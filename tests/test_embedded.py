@@ -0,0 +1,455 @@
+"""
+In-process API tests on the embedded SQLite store - no MongoDB or running server needed.
+Run with: python -m pytest tests/test_embedded.py
+"""
+import asyncio
+import io
+import json
+import time
+import zipfile
+from datetime import datetime, timedelta
+
+import server
+from embedded import EmbeddedClient
+from workspaces import DEFAULT_WORKSPACE, in_workspace
+
+
+def future_date(days):
+    return (datetime.now() + timedelta(days=days)).strftime("%d-%m-%Y")
+
+
+def sample_project(name):
+    return {
+        "name": name,
+        "days": [{
+            "date": future_date(7),
+            "rows": [
+                {"type": "item", "time": "08:00-10:00", "scene": "1", "location": "Studio", "cast": "Anna, Ben"},
+                {"type": "text", "notes": "Lunch"},
+            ],
+        }],
+    }
+
+
+def test_health_check(api):
+    response = api.get("/api/health")
+    assert response.status_code == 200
+    assert response.json()["database"] == "connected"
+
+
+def test_save_load_update_delete(api):
+    created = api.post("/api/projects/save", json=sample_project("Embedded Project")).json()
+    assert created["version"] == 1
+    project_id = created["id"]
+
+    loaded = api.get(f"/api/projects/{project_id}").json()
+    assert loaded["days"][0]["rows"][0]["location"] == "Studio"
+
+    loaded["days"][0]["rows"][0]["location"] = "Beach"
+    updated = api.put(f"/api/projects/{project_id}", json=loaded).json()
+    assert updated["version"] == 2
+    assert updated["days"][0]["rows"][0]["location"] == "Beach"
+
+    # Saving by name again updates the same project
+    again = api.post("/api/projects/save", json=sample_project("Embedded Project")).json()
+    assert again["id"] == project_id
+    assert again["version"] == 3
+
+    revisions = api.get(f"/api/projects/{project_id}/revisions").json()
+    assert [rev["rev"] for rev in revisions["revisions"]] == [3, 2, 1]
+
+    listed = api.get("/api/projects").json()
+    assert any(item["id"] == project_id and item["day_count"] == 1 for item in listed["active"])
+
+    assert api.delete(f"/api/projects/{project_id}").status_code == 200
+    assert api.get(f"/api/projects/{project_id}").status_code == 404
+
+
+def test_archive_and_duplicate(api):
+    project_id = api.post("/api/projects/save", json=sample_project("Archive Me")).json()["id"]
+
+    archived = api.post(f"/api/projects/{project_id}/archive").json()
+    assert archived["archived"] is True
+    listed = api.get("/api/projects", params={"include_archived": True}).json()
+    assert any(item["id"] == project_id for item in listed["archived"])
+
+    copy = api.post(f"/api/projects/{project_id}/duplicate").json()
+    assert copy["name"] == "Archive Me (Copy)"
+    assert copy["id"] != project_id
+    assert copy["days"][0]["id"] != api.get(f"/api/projects/{project_id}").json()["days"][0]["id"]
+
+
+def test_template_copies_do_not_share_edits(api):
+    template_id = api.post("/api/projects/save", json=sample_project("Template Source")).json()["id"]
+    assert api.post(f"/api/projects/{template_id}/template").json()["is_template"] is True
+
+    copy_a = api.post(f"/api/projects/{template_id}/duplicate").json()
+    copy_b = api.post(f"/api/projects/{template_id}/duplicate").json()
+    copy_a["name"] = "Copy A"
+    copy_a["days"][0]["rows"][0]["scene"] = "1 (reshoot)"
+    assert api.put(f"/api/projects/{copy_a['id']}", json=copy_a).status_code == 200
+
+    def scene(project_id):
+        return api.get(f"/api/projects/{project_id}").json()["days"][0]["rows"][0]["scene"]
+
+    assert scene(copy_a["id"]) == "1 (reshoot)"
+    assert scene(copy_b["id"]) == "1"
+    assert scene(template_id) == "1"
+
+
+def test_templates_book_nobody(api):
+    project = sample_project("Booking Template")
+    project["days"][0]["rows"][0]["cast"] = "Tilda"
+    template_id = api.post("/api/projects/save", json=project).json()["id"]
+    api.post(f"/api/projects/{template_id}/template")
+
+    copy_id = api.post(f"/api/projects/{template_id}/duplicate").json()["id"]
+    assert api.get(f"/api/conflicts/projects/{copy_id}").json()["count"] == 0
+    assert api.get("/api/conflicts/people/Tilda").json()["count"] == 0
+
+    # Two real productions booking her on the same day do conflict
+    api.post(f"/api/projects/{template_id}/duplicate")
+    assert api.get(f"/api/conflicts/projects/{copy_id}").json()["count"] == 1
+    assert api.get(f"/api/conflicts/projects/{template_id}").json()["count"] == 0
+
+
+def test_zip_export(api):
+    ids = [api.post("/api/projects/save", json=sample_project(f"Zipped {n}")).json()["id"] for n in range(2)]
+
+    response = api.get("/api/exports/projects.zip", params={"name": "zipped", "include": "csv,json"})
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert sorted(archive.namelist()) == sorted(
+        f"Zipped {n} - {project_id}/{part}" for n, project_id in enumerate(ids) for part in ("schedule.csv", "project.json")
+    )
+    exported = json.loads(archive.read(f"Zipped 0 - {ids[0]}/project.json"))
+    assert exported["days"][0]["rows"][0]["location"] == "Studio"
+
+    # Ids that match nothing are skipped
+    missing = api.get("/api/exports/projects.zip", params={"ids": f"{ids[1]},000000000000000000000000", "include": "csv"})
+    assert zipfile.ZipFile(io.BytesIO(missing.content)).namelist() == [f"Zipped 1 - {ids[1]}/schedule.csv"]
+
+
+def test_person_calendar_uids_are_unique(api):
+    project = sample_project("Calendar Template")
+    project["days"][0]["rows"][0]["cast"] = "Ursula"
+    project["calltimes"] = [{"title": "Calls", "rows": [{"id": "call-1", "time": "07:00", "name": "Ursula"}]}]
+    template_id = api.post("/api/projects/save", json=project).json()["id"]
+    api.post(f"/api/projects/{template_id}/template")
+    copy_ids = [api.post(f"/api/projects/{template_id}/duplicate").json()["id"] for _ in range(2)]
+
+    feed = api.get("/api/calendar/people/Ursula.ics").text.replace("\r\n ", "")
+    uids = [line[len("UID:"):] for line in feed.split("\r\n") if line.startswith("UID:")]
+    # A shoot day and a call per copy; the template itself books nobody
+    assert len(uids) == len(set(uids)) == 4
+    assert sorted(uid.split("-")[0] for uid in uids) == sorted(copy_ids * 2)
+
+
+def test_generate_calltimes(api):
+    project_id = api.post("/api/projects/save", json=sample_project("Call Sheet")).json()["id"]
+
+    preview = api.post(f"/api/projects/{project_id}/calltimes/generate", json={"lead_minutes": 30}).json()
+    assert preview["written"] is False and preview["version"] is None
+    assert [(row["time"], row["name"]) for row in preview["calltimes"][0]["rows"]] == [("07:30", "Anna"), ("07:30", "Ben")]
+    assert api.get(f"/api/projects/{project_id}").json()["calltimes"] == []
+
+    written = api.post(f"/api/projects/{project_id}/calltimes/generate", json={"write": True}).json()
+    assert written["version"] == 2
+    stored = api.get(f"/api/projects/{project_id}").json()["calltimes"]
+    assert [row["time"] for row in stored[0]["rows"]] == ["07:00", "07:00"]
+    assert api.post(f"/api/projects/{project_id}/calltimes/generate", json={"lead_minutes": -1}).status_code == 422
+
+
+def test_generated_calltimes_count_against_the_quota(api, monkeypatch):
+    import server
+
+    project_id = api.post("/api/projects/save", json=sample_project("Quota Call Sheet")).json()["id"]
+    used = api.get("/api/workspace").json()["usage"]["bytes"]
+    # A full schedule leaves no room for the generated block
+    monkeypatch.setattr(server.workspace_usage, "max_bytes", used)
+    refused = api.post(f"/api/projects/{project_id}/calltimes/generate", json={"write": True})
+    assert refused.status_code == 403
+    assert api.get(f"/api/projects/{project_id}").json()["calltimes"] == []
+
+    monkeypatch.setattr(server.workspace_usage, "max_bytes", 0)
+    api.post(f"/api/projects/{project_id}/calltimes/generate", json={"write": True})
+    grown = api.get("/api/workspace").json()["usage"]["bytes"]
+    # The stored size is the size of the project a save of it would store
+    project = api.get(f"/api/projects/{project_id}").json()
+    assert grown > used
+    assert api.put(f"/api/projects/{project_id}", json=project).status_code == 200
+    assert api.get("/api/workspace").json()["usage"]["bytes"] == grown
+
+
+def test_stats_follow_saves(api):
+    saved = api.post("/api/projects/save", json=sample_project("Counted")).json()
+    project_id = saved["id"]
+    stats = api.get(f"/api/projects/{project_id}/stats").json()
+    assert stats["version"] == 1
+    assert stats["totals"]["scene_count"] == 1 and stats["days"][0]["cast"] == ["Anna", "Ben"]
+
+    # Stats only come from their own endpoint, not with the project
+    loaded = api.get(f"/api/projects/{project_id}").json()
+    assert "stats" not in loaded
+    assert "stats" not in api.get(f"/api/projects/{project_id}", params={"skeleton": True}).json()
+
+    loaded["days"][0]["rows"].append({"type": "item", "time": "11:00", "location": "Beach", "cast": "Cleo"})
+    api.put(f"/api/projects/{project_id}", json=loaded)
+    stats = api.get(f"/api/projects/{project_id}/stats").json()
+    assert stats["version"] == 2
+    assert stats["days"][0]["locations"] == ["Beach", "Studio"]
+    assert (stats["days"][0]["first_time"], stats["days"][0]["last_time"]) == ("08:00", "11:00")
+
+    listed = api.get("/api/stats/projects").json()["projects"]
+    assert next(item for item in listed if item["id"] == project_id)["totals"]["cast_count"] == 3
+
+
+def test_project_responses_leave_out_derived_fields(api):
+    private = {"stats", "size", "change_seq", "workspace", "archived_at"}
+    saved = api.post("/api/projects/save", json=sample_project("Lean Responses")).json()
+    project_id = saved["id"]
+    resaved = api.post("/api/projects/save", json=sample_project("Lean Responses")).json()
+    updated = api.put(f"/api/projects/{project_id}", json=resaved).json()
+    duplicated = api.post(f"/api/projects/{project_id}/duplicate").json()
+    revision = api.get(f"/api/projects/{project_id}/revisions/1").json()
+    restored = api.post(f"/api/projects/{project_id}/revisions/1/restore").json()
+    for response in (saved, resaved, updated, duplicated, revision, restored):
+        assert private.isdisjoint(response) and response["days"]
+
+
+def test_idempotent_save_and_duplicate(api):
+    headers = {"Idempotency-Key": "save-once"}
+    first = api.post("/api/projects/save", json=sample_project("Idempotent"), headers=headers)
+    replay = api.post("/api/projects/save", json=sample_project("Idempotent"), headers=headers)
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+    assert api.get(f"/api/projects/{first.json()['id']}").json()["version"] == 1
+
+    reused = api.post("/api/projects/save", json=sample_project("Someone Else"), headers=headers)
+    assert reused.status_code == 422
+
+    project_id = first.json()["id"]
+    copy = api.post(f"/api/projects/{project_id}/duplicate", headers={"Idempotency-Key": "copy-once"})
+    again = api.post(f"/api/projects/{project_id}/duplicate", headers={"Idempotency-Key": "copy-once"})
+    assert again.json()["id"] == copy.json()["id"]
+
+
+def test_changes_since_cursor(api):
+    cursor = api.get("/api/projects/changes").json()["cursor"]
+
+    project_id = api.post("/api/projects/save", json=sample_project("Synced")).json()["id"]
+    changes = api.get("/api/projects/changes", params={"since": cursor}).json()
+    assert [item["id"] for item in changes["changed"]] == [project_id]
+    assert changes["removed"] == []
+    cursor = changes["cursor"]
+
+    assert api.get("/api/projects/changes", params={"since": cursor}).json()["changed"] == []
+
+    api.delete(f"/api/projects/{project_id}")
+    changes = api.get("/api/projects/changes", params={"since": cursor}).json()
+    assert changes["removed"] == [{"id": project_id, "reason": "deleted", "change_seq": changes["cursor"]}]
+
+
+def test_finished_projects_are_archived_by_a_job(api, monkeypatch):
+    project_id = api.post("/api/projects/save", json=sample_project("Wrapped")).json()["id"]
+    cursor = api.get("/api/projects/changes").json()["cursor"]
+    # As if its last day had passed since the save
+    monkeypatch.setattr(server, "is_project_archived", lambda project: str(project.get("_id")) == project_id)
+
+    # Polling for changes reads the change log only
+    assert api.get("/api/projects/changes", params={"since": cursor}).json()["changed"] == []
+    assert api.get(f"/api/projects/{project_id}").json()["archived"] is False
+
+    async def enqueue():
+        with in_workspace(DEFAULT_WORKSPACE):
+            return await server.jobs.enqueue("auto_archive")
+
+    job_url = f"/api/jobs/{api.portal.call(enqueue)}"
+    for _ in range(100):
+        job = api.get(job_url).json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.02)
+    assert job["result"] == {"archived": 1, "project_ids": [project_id]}
+    changes = api.get("/api/projects/changes", params={"since": cursor}).json()
+    assert [(item["id"], item["archived"]) for item in changes["changed"]] == [(project_id, True)]
+
+
+def test_skeleton_and_day_ranges(api):
+    project = sample_project("Long Shoot")
+    project["days"] = [
+        {"date": future_date(10 + offset), "rows": [{"type": "item", "scene": str(offset)}]}
+        for offset in range(10)
+    ]
+    project_id = api.post("/api/projects/save", json=project).json()["id"]
+
+    skeleton = api.get(f"/api/projects/{project_id}", params={"skeleton": True}).json()
+    assert len(skeleton["days"]) == 10
+    assert all("rows" not in day for day in skeleton["days"])
+
+    by_position = api.get(f"/api/projects/{project_id}/days", params={"start": 4, "count": 2}).json()
+    assert [day["rows"][0]["scene"] for day in by_position["days"]] == ["4", "5"]
+
+    by_date = api.get(
+        f"/api/projects/{project_id}/days",
+        params={"from": future_date(17), "to": future_date(30)}
+    ).json()
+    assert by_date["start"] == 7
+    assert [day["rows"][0]["scene"] for day in by_date["days"]] == ["7", "8", "9"]
+
+
+def test_bulk_archive_and_delete(api):
+    ids = [api.post("/api/projects/save", json=sample_project(f"Season {n}")).json()["id"] for n in range(3)]
+
+    archived = api.post("/api/projects/bulk", json={"action": "archive", "ids": ids + ["missing"]}).json()
+    assert archived["counts"] == {"archived": 3, "invalid_id": 1}
+    assert all(api.get(f"/api/projects/{pid}").json()["archived"] for pid in ids)
+
+    again = api.post("/api/projects/bulk", json={"action": "archive", "ids": ids[:1]}).json()
+    assert again["results"] == [{"id": ids[0], "outcome": "unchanged"}]
+
+    deleted = api.post(
+        "/api/projects/bulk",
+        json={"action": "delete", "filter": {"archived": True, "name_contains": "season"}}
+    ).json()
+    assert sorted(result["id"] for result in deleted["results"]) == sorted(ids)
+    assert deleted["counts"] == {"deleted": 3}
+
+
+def test_bulk_delete_needs_a_criterion(api):
+    project_id = api.post("/api/projects/save", json=sample_project("Survivor")).json()["id"]
+    for selected in ({}, {"name_contains": ""}, {"archived": None, "all": False}):
+        response = api.post("/api/projects/bulk", json={"action": "delete", "filter": selected})
+        assert response.status_code == 400
+    assert api.get(f"/api/projects/{project_id}").status_code == 200
+
+
+def test_large_bulk_runs_as_job(api, monkeypatch):
+    monkeypatch.setattr(server, "BULK_INLINE_LIMIT", 1)
+    ids = [api.post("/api/projects/save", json=sample_project(f"Queued {n}")).json()["id"] for n in range(2)]
+
+    response = api.post("/api/projects/bulk", json={"action": "delete", "ids": ids})
+    assert response.status_code == 202
+    job_url = f"/api/jobs/{response.json()['job_id']}"
+    for _ in range(100):
+        job = api.get(job_url).json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.02)
+    assert job["status"] == "done"
+    assert job["result"]["counts"] == {"deleted": 2}
+    assert job["progress"] == {"done": 2, "total": 2, "message": None}
+
+
+def test_move_rewrites_one_rank(api):
+    project = sample_project("Reorder")
+    project["days"] = [
+        {"date": future_date(10 + offset), "position": offset, "rows": [{"type": "item", "scene": str(offset)}]}
+        for offset in range(5)
+    ]
+    saved = api.post("/api/projects/save", json=project).json()
+    project_id, day_ids = saved["id"], [day["id"] for day in saved["days"]]
+
+    # The first move ranks the legacy schedule, later ones only the moved day
+    first = api.post(f"/api/projects/{project_id}/move", json={"id": day_ids[0], "after": day_ids[2]}).json()
+    assert len(first["ranks"]) == 5
+    second = api.post(f"/api/projects/{project_id}/move", json={"id": day_ids[4], "after": None}).json()
+    assert list(second["ranks"]) == [day_ids[4]]
+
+    loaded = api.get(f"/api/projects/{project_id}").json()
+    assert [day["rows"][0]["scene"] for day in loaded["days"]] == ["4", "1", "2", "0", "3"]
+    assert [day["position"] for day in loaded["days"]] == [0, 1, 2, 3, 4]
+    window = api.get(f"/api/projects/{project_id}/days", params={"start": 2, "count": 2}).json()
+    assert [day["rows"][0]["scene"] for day in window["days"]] == ["2", "0"]
+
+    assert api.post(f"/api/projects/{project_id}/move", json={"id": day_ids[0], "after": day_ids[0]}).status_code == 400
+    assert api.post(f"/api/projects/{project_id}/move", json={"id": "missing"}).status_code == 404
+
+    loaded["days"][0]["rows"][0]["rank"] = "-"
+    assert api.put(f"/api/projects/{project_id}", json=loaded).status_code == 422
+
+
+def test_move_keeps_conflicts_stats_and_changes_current(api):
+    project = sample_project("Reorder Rows")
+    # Without an end time a scene runs until the next later start, so Vera's
+    # 08:00 scene overlaps her 08:15 one until Ben's 08:30 scene sits between them
+    project["days"] = [{"date": future_date(40), "rows": [
+        {"type": "item", "time": "08:00", "scene": "1", "cast": "Vera"},
+        {"type": "item", "time": "08:30", "scene": "2", "cast": "Ben"},
+        {"type": "item", "time": "08:15", "scene": "3", "cast": "Vera"},
+    ]}, {"date": future_date(41), "rows": [{"type": "item", "scene": "4", "location": "Beach"}]}]
+    saved = api.post("/api/projects/save", json=project).json()
+    project_id, day_ids = saved["id"], [day["id"] for day in saved["days"]]
+    row_ids = [row["id"] for row in saved["days"][0]["rows"]]
+    assert api.get(f"/api/conflicts/projects/{project_id}").json()["count"] == 1
+    cursor = api.get("/api/projects/changes").json()["cursor"]
+
+    moved = api.post(f"/api/projects/{project_id}/move",
+                     json={"id": row_ids[1], "after": row_ids[2], "parent_id": day_ids[0]}).json()
+    assert api.get(f"/api/conflicts/projects/{project_id}").json()["count"] == 0
+    changes = api.get("/api/projects/changes", params={"since": cursor}).json()
+    assert [item["id"] for item in changes["changed"]] == [project_id]
+
+    moved = api.post(f"/api/projects/{project_id}/move", json={"id": day_ids[1], "after": None}).json()
+    stats = api.get(f"/api/projects/{project_id}/stats").json()
+    assert stats["version"] == moved["version"]
+    assert [day["locations"] for day in stats["days"]] == [["Beach"], []]
+
+
+def test_workspaces_are_isolated(api, monkeypatch):
+    studio_a, studio_b = {"X-Workspace": "studio-a"}, {"X-Workspace": "studio-b"}
+    first = api.post("/api/projects/save", json=sample_project("Shared Name"), headers=studio_a).json()
+    second = api.post("/api/projects/save", json=sample_project("Shared Name"), headers=studio_b).json()
+    assert first["id"] != second["id"] and second["version"] == 1
+
+    listed = api.get("/api/projects", headers=studio_a).json()
+    assert [item["id"] for item in listed["active"]] == [first["id"]]
+    assert api.get(f"/api/projects/{first['id']}", headers=studio_b).status_code == 404
+    assert api.get(f"/api/projects/{first['id']}/revisions", headers=studio_b).status_code == 404
+    assert api.delete(f"/api/projects/{first['id']}", headers=studio_b).status_code == 404
+    assert api.get("/api/projects", headers={"X-Workspace": "Not Valid!"}).status_code == 400
+
+    usage = api.get("/api/workspace", headers=studio_a).json()
+    assert usage["usage"]["projects"] == 1 and usage["usage"]["bytes"] > 0
+
+    monkeypatch.setattr(server.workspace_usage, "max_projects", 1)
+    refused = api.post("/api/projects/save", json=sample_project("One Too Many"), headers=studio_a)
+    assert refused.status_code == 403
+    assert api.post(f"/api/projects/{first['id']}/duplicate", headers=studio_a).status_code == 403
+
+    assert api.delete(f"/api/projects/{first['id']}", headers=studio_a).status_code == 200
+    assert api.get("/api/workspace", headers=studio_a).json()["usage"] == {"projects": 0, "bytes": 0}
+
+
+def test_embedded_queries():
+    async def run():
+        collection = EmbeddedClient(":memory:")["test"]["items"]
+        await collection.create_index([("kind", 1), ("rank", -1)])
+        await collection.insert_many([
+            {"kind": "a", "rank": 1, "tags": ["x"]},
+            {"kind": "a", "rank": 3},
+            {"kind": "b", "rank": 2, "nested": {"value": None}},
+        ])
+
+        ranks = [doc["rank"] async for doc in collection.find({"kind": "a"}).sort("rank", -1)]
+        assert ranks == [3, 1]
+        assert await collection.count_documents({"rank": {"$gte": 2}}) == 2
+        assert await collection.count_documents({"tags": "x"}) == 1
+        assert await collection.count_documents({"tags": {"$exists": False}}) == 2
+        assert await collection.count_documents({"kind": {"$ne": "a"}}) == 1
+
+        before = await collection.find_one_and_update(
+            {"kind": "b"}, {"$set": {"nested.value": 5}, "$inc": {"rank": 10}}
+        )
+        assert before["rank"] == 2
+        after = await collection.find_one({"kind": "b"}, {"_id": 0, "nested.value": 1})
+        assert after == {"nested": {"value": 5}}
+        await collection.update_one({"kind": "b"}, {"$set": {"tags": ["p", "q", "r", "s"]}})
+        sliced = await collection.find_one({"kind": "b"}, {"rank": 1, "tags": {"$slice": [1, 2]}})
+        assert sliced["tags"] == ["q", "r"] and "nested" not in sliced
+
+        result = await collection.update_one({"kind": "c"}, {"$set": {"rank": 0}}, upsert=True)
+        assert result.upserted_id is not None
+        assert (await collection.delete_many({"rank": {"$lt": 2}})).deleted_count == 2
+
+    asyncio.run(run())
@@ -0,0 +1,113 @@
+"""
+Unit tests for the body size limits, rate limiting and per-route concurrency limits.
+Run with: python -m pytest tests/test_limits.py
+"""
+import asyncio
+import sys
+import uuid
+from pathlib import Path
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from limits import InMemoryRateLimitStore, LimitsMiddleware, RouteLimit  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def limited_app(release=None, **options):
+    async def upload(request):
+        body = await request.body()
+        return JSONResponse({"size": len(body)})
+
+    async def export(request):
+        if release is not None:
+            await release.wait()
+        return JSONResponse({"ok": True})
+
+    app = Starlette(routes=[Route("/upload", upload, methods=["PUT"]), Route("/export", export)])
+    options.setdefault("route_limits", [
+        RouteLimit("upload", ["PUT"], r"^/upload", concurrency=0, max_body=100),
+        RouteLimit("export", ["GET"], r"^/export", concurrency=1, max_body=0),
+    ])
+    options.setdefault("default_max_body", 10)
+    options.setdefault("queue_timeout", 0.05)
+    return LimitsMiddleware(app, **options)
+
+
+def client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def chunks(count, size):
+    for _ in range(count):
+        yield b"x" * size
+
+
+def test_body_limit():
+    async def run():
+        async with client(limited_app()) as http:
+            assert (await http.put("/upload", content=b"x" * 100)).json() == {"size": 100}
+
+            # Refused up front from Content-Length, or while the body streams in
+            declared = await http.put("/upload", content=b"x" * 101)
+            assert declared.status_code == 413
+            assert (await http.put("/upload", content=chunks(5, 30))).status_code == 413
+
+    asyncio.run(run())
+
+
+def test_rate_limit_buckets():
+    async def run():
+        store = InMemoryRateLimitStore(per_minute=60, burst=2)
+        assert await store.hit("a") is None
+        assert await store.hit("a") is None
+        assert 0.9 < await store.hit("a") <= 1
+        assert await store.hit("b") is None
+
+        async with client(limited_app(rate_limit_store=InMemoryRateLimitStore(per_minute=60, burst=1),
+                                      exempt_paths=["/export"])) as http:
+            assert (await http.put("/upload", content=b"x")).status_code == 200
+            refused = await http.put("/upload", content=b"x")
+            assert refused.status_code == 429
+            assert refused.headers["Retry-After"] == "1"
+            # Exempt paths are never counted
+            assert (await http.get("/export")).status_code == 200
+
+    asyncio.run(run())
+
+
+def test_concurrency_limit():
+    async def run():
+        release = asyncio.Event()
+        async with client(limited_app(release)) as http:
+            first = asyncio.create_task(http.get("/export"))
+            await asyncio.sleep(0.01)
+            busy = await http.get("/export")
+            assert busy.status_code == 503
+            assert busy.headers["Retry-After"] == "1"
+            # Routes of other groups are not queued behind it
+            assert (await http.put("/upload", content=b"x")).status_code == 200
+
+            release.set()
+            assert (await first).status_code == 200
+            assert (await http.get("/export")).status_code == 200
+
+    asyncio.run(run())
+
+
+def test_direct_upload_over_the_route_limit_is_413(api, media):
+    key = f"{uuid.uuid4()}.png"
+    target = asyncio.run(media.presign_upload(key, "image/png", 10 * MB, 60))
+
+    def body():
+        for _ in range(7):
+            yield b"x" * MB
+
+    response = api.put(target["url"], content=body(), headers=target["headers"])
+    assert response.status_code == 413
+    assert not (media.root / key).exists()
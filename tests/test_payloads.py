@@ -0,0 +1,91 @@
+"""
+Unit tests for the fast project payload validation, checked against the Project model.
+Run with: python -m pytest tests/test_payloads.py
+"""
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import server
+from payloads import parse_project
+
+INVALID_BODIES = [
+    '{',
+    '[]',
+    '{"days": []}',
+    '{"name": 1}',
+    '{"name": "x", "days": "nope"}',
+    '{"name": "x", "days": [5]}',
+    '{"name": "x", "days": [{"rows": []}]}',
+    '{"name": "x", "days": [{"date": "01-06-2030", "rows": [{"type": "item", "scene": null}]}]}',
+    '{"name": "x", "column_widths": []}',
+    '{"name": "x", "calltimes": [{"headers": 3, "rows": [{"time": 1}]}]}',
+    '{"name": "x", "days": [{"date": "01-06-2030", "rank": "A0", "rows": [{"type": "item", "rank": "-"}]}]}',
+]
+
+
+@pytest.fixture(scope="module")
+def endpoints():
+    """The same body posted to a model endpoint (the old save path) and to parse_project"""
+    app = FastAPI()
+
+    @app.post("/model")
+    async def with_model(project: server.Project):
+        return project.model_dump()
+
+    @app.post("/fast")
+    async def with_payload(request: Request):
+        return parse_project(await request.body())
+
+    with TestClient(app) as client:
+        yield client
+
+
+def post(client, path, body):
+    return client.post(path, content=body, headers={"Content-Type": "application/json"})
+
+
+@pytest.mark.parametrize("body", INVALID_BODIES)
+def test_errors_match_the_model(endpoints, body):
+    expected = post(endpoints, "/model", body)
+    actual = post(endpoints, "/fast", body)
+    assert expected.status_code == actual.status_code == 422
+    assert actual.json() == expected.json()
+
+
+def comparable(value):
+    """Drop generated ids, and ranks which the fast path leaves unset on purpose"""
+    if isinstance(value, dict):
+        return {key: comparable(item) for key, item in value.items() if key not in ("id", "rank")}
+    if isinstance(value, list):
+        return [comparable(item) for item in value]
+    return value
+
+
+def test_defaults_match_the_model():
+    body = {
+        "name": "Defaults",
+        "column_widths": {"scene": 30},
+        "column_headers": {},
+        "days": [{"date": "01-06-2030", "rows": [{"type": "item", "scene": "1"}, {"type": "text"}]}, {"date": "02-06-2030"}],
+        "calltimes": [{"rows": [{"time": "07:00"}]}, {"headers": {"name": "Crew"}}],
+    }
+    parsed = parse_project(json.dumps(body))
+    assert comparable(parsed) == comparable(server.Project(**body).model_dump())
+
+
+def test_ids_are_only_generated_where_missing():
+    parsed = parse_project(
+        '{"name": "Ids", "days": [{"id": "d1", "date": "01-06-2030", "rows": [{"type": "item"}]}],'
+        ' "calltimes": [{"id": "c1", "rows": [{"id": "cr1"}, {}]}]}'
+    )
+    assert parsed["days"][0]["id"] == "d1"
+    assert parsed["calltimes"][0]["id"] == "c1"
+    rows = parsed["calltimes"][0]["rows"]
+    assert rows[0]["id"] == "cr1"
+    generated = [parsed["days"][0]["rows"][0]["id"], rows[1]["id"]]
+    assert all(len(row_id) == 36 for row_id in generated) and generated[0] != generated[1]
+    # Ranks are not defaulted so unranked lists keep their legacy order
+    assert "rank" not in parsed["days"][0]
@@ -0,0 +1,102 @@
+"""
+Unit tests for the fractional rank keys.
+Run with: python -m pytest tests/test_ranks.py
+"""
+import random
+import re
+
+import pytest
+
+from ranks import RANK_PATTERN, assign_ranks, place_after, rank_between, ranks_between
+
+
+def valid(rank):
+    return re.match(RANK_PATTERN, rank) is not None
+
+
+@pytest.mark.parametrize("lower,upper", [
+    (None, None), ("V", None), ("z", None), ("zz", None), (None, "V"), (None, "1"), (None, "01"),
+    ("A", "B"), ("A", "A1"), ("A", "A01"), ("A0V", "A1"), ("Az", "B"), ("1", "2"), ("", "V"),
+])
+def test_rank_between(lower, upper):
+    rank = rank_between(lower, upper)
+    assert valid(rank)
+    assert lower is None or lower < rank
+    assert upper is None or rank < upper
+
+
+@pytest.mark.parametrize("lower,upper", [
+    (None, "0"), (None, ""), ("A", "A0"), ("A", "A"), ("B", "A"), ("-", None), (None, "A-"),
+])
+def test_no_rank_between(lower, upper):
+    with pytest.raises(ValueError):
+        rank_between(lower, upper)
+
+
+def test_ranks_stay_valid_through_many_inserts():
+    generator = random.Random(7)
+    ranks = []
+    for _ in range(500):
+        slot = generator.randint(0, len(ranks))
+        lower = ranks[slot - 1] if slot else None
+        upper = ranks[slot] if slot < len(ranks) else None
+        ranks.insert(slot, rank_between(lower, upper))
+    assert ranks == sorted(ranks) and len(set(ranks)) == len(ranks)
+    assert all(valid(rank) for rank in ranks)
+    assert max(len(rank) for rank in ranks) < 12
+
+
+def test_ranks_between():
+    ranks = ranks_between("A", "B", 5)
+    assert ranks == sorted(ranks) and len(set(ranks)) == 5
+    assert all("A" < rank < "B" for rank in ranks)
+    assert ranks_between(None, None, 0) == []
+
+
+def ranked(*ranks):
+    return [{"rank": rank} for rank in ranks]
+
+
+def test_assign_ranks_keeps_the_longest_ascending_run():
+    items = ranked("B", "D", "A", "E", None)
+    assigned = assign_ranks(items)
+    # B, D and E already ascend; A moves between B and D and the new last item goes after E
+    assert sorted(assigned) == [2, 4]
+    final = [assigned.get(index, item["rank"]) for index, item in enumerate(items)]
+    assert final == sorted(final)
+
+    assert assign_ranks(ranked("A", "B")) == {}
+    assert list(assign_ranks(ranked(None, None, None)).values()) == ranks_between(None, None, 3)
+
+
+def test_assign_ranks_replaces_invalid_ranks():
+    items = ranked("A", "A0", "-", "", None)
+    assigned = assign_ranks(items)
+    assert sorted(assigned) == [1, 2, 3, 4]
+    final = [assigned.get(index, item["rank"]) for index, item in enumerate(items)]
+    assert final == sorted(final) and all(valid(rank) for rank in final)
+
+
+def order_after(siblings, index, after):
+    assigned = place_after(siblings, index, after)
+    ranks = [assigned.get(i, item["rank"]) for i, item in enumerate(siblings)]
+    assert all(valid(rank) for rank in ranks)
+    return sorted(range(len(siblings)), key=lambda i: ranks[i]), assigned
+
+
+def test_place_after():
+    siblings = ranked("A", "B", "C")
+    order, assigned = order_after(siblings, 0, 2)
+    assert order == [1, 2, 0] and list(assigned) == [0]
+    order, assigned = order_after(siblings, 2, None)
+    assert order == [2, 0, 1] and list(assigned) == [2]
+    # Already in place: nothing to write
+    assert place_after(siblings, 1, 0) == {}
+
+
+def test_place_after_ranks_unranked_siblings():
+    order, assigned = order_after(ranked(None, None, None), 0, 1)
+    assert order == [1, 0, 2] and sorted(assigned) == [0, 1, 2]
+    # Legacy keys that leave no room in between are replaced
+    order, _ = order_after(ranked("A", "A0", None), 2, 0)
+    assert order == [0, 2, 1]
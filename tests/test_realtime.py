@@ -0,0 +1,143 @@
+"""
+Unit tests for row-level project deltas and the websocket hub.
+Run with: python -m pytest tests/test_realtime.py
+"""
+import asyncio
+import copy
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from realtime import ProjectHub, diff_project  # noqa: E402
+
+
+def apply_list_ops(items, ops, kind, extra=None):
+    """Apply the *_remove/_add/_update/_order operations of one list, as a client would"""
+    extra = extra or {}
+    ops = [op for op in ops if op["op"].startswith(f"{kind}_")
+           and op["op"][len(kind) + 1:] in ("remove", "add", "update", "order")
+           and all(op.get(key) == value for key, value in extra.items())]
+    for op in ops:
+        if op["op"] == f"{kind}_remove":
+            items = [item for item in items if item["id"] != op["id"]]
+    for op in ops:
+        if op["op"] == f"{kind}_add":
+            items.insert(op["index"], copy.deepcopy(op["value"]))
+        elif op["op"] == f"{kind}_update":
+            next(item for item in items if item["id"] == op["id"]).update(op["fields"])
+    for op in ops:
+        if op["op"] == f"{kind}_order":
+            by_id = {item["id"]: item for item in items}
+            items = [by_id[item_id] for item_id in op["order"]]
+    return items
+
+
+def apply_ops(doc, ops):
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        if op["op"] == "project_update":
+            doc.update(op["fields"])
+    for kind, child in (("day", "row"), ("calltime", "calltime_row")):
+        key = f"{kind}s"
+        doc[key] = apply_list_ops(doc.get(key, []), ops, kind)
+        for item in doc[key]:
+            item["rows"] = apply_list_ops(item.get("rows", []), ops, child, {f"{kind}_id": item["id"]})
+    return doc
+
+
+def project(days, name="Shoot"):
+    return {"name": name, "notes": "", "days": days, "calltimes": []}
+
+
+def day(day_id, date, rows):
+    return {"id": day_id, "date": date, "position": 0, "rows": rows}
+
+
+def row(row_id, scene, **fields):
+    return {"id": row_id, "type": "item", "scene": scene, **fields}
+
+
+def test_diff_round_trip():
+    old = project([
+        day("d1", "01-06-2030", [row("r1", "1"), row("r2", "2"), row("r3", "3")]),
+        day("d2", "02-06-2030", [row("r4", "4")]),
+    ])
+    new = project([
+        day("d2", "03-06-2030", [row("r4", "4", cast="Anna"), row("r5", "5")]),
+        day("d1", "01-06-2030", [row("r3", "3"), row("r1", "1 new")]),
+        day("d3", "04-06-2030", [row("r6", "6")]),
+    ], name="Shoot (final)")
+
+    ops = diff_project(old, new)
+    assert {"op": "project_update", "fields": {"name": "Shoot (final)"}} in ops
+    assert {"op": "row_remove", "day_id": "d1", "id": "r2"} in ops
+    assert apply_ops(old, ops) == new
+
+
+def test_diff_of_identical_projects_is_empty():
+    doc = project([day("d1", "01-06-2030", [row("r1", "1")])])
+    assert diff_project(doc, copy.deepcopy(doc)) == []
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+def test_hub_fans_out_to_other_sockets():
+    async def run():
+        hub = ProjectHub()
+        await hub.start()
+        first, second, elsewhere = FakeSocket(), FakeSocket(), FakeSocket()
+        first_id = await hub.join("p1", first, "Anna")
+        # The joining socket is not told about itself
+        assert first.sent == []
+
+        await hub.join("p1", second, "Ben", "b")
+        await hub.join("p2", elsewhere, "Cleo")
+        assert first.sent == [{"type": "presence", "event": "join", "client_id": "b", "user": "Ben"}]
+        assert second.sent == []
+        assert {member["user"] for member in hub.presence("p1")} == {"Anna", "Ben"}
+
+        old = project([day("d1", "01-06-2030", [row("r1", "1")])])
+        new = {**project([day("d1", "01-06-2030", [row("r1", "1A")])]), "version": 2}
+        await hub.publish_delta("p1", old, new, origin=first_id)
+        delta = second.sent[-1]
+        assert delta["type"] == "delta" and delta["version"] == 2 and delta["origin"] == first_id
+        assert delta["ops"] == [{"op": "row_update", "day_id": "d1", "id": "r1", "fields": {"scene": "1A"}}]
+        assert first.sent[-1] == delta
+        assert elsewhere.sent == []
+
+        await hub.leave("p1", "b")
+        assert first.sent[-1] == {"type": "presence", "event": "leave", "client_id": "b", "user": "Ben"}
+        assert not hub.has_audience("p3")
+        await hub.stop()
+        assert first.closed and elsewhere.closed
+
+    asyncio.run(run())
+
+
+def test_hub_drops_dead_sockets():
+    class DeadSocket(FakeSocket):
+        async def send_json(self, message):
+            raise RuntimeError("gone")
+
+    async def run():
+        hub = ProjectHub()
+        await hub.start()
+        alive = FakeSocket()
+        await hub.join("p1", alive, "Anna", "a")
+        await hub.join("p1", DeadSocket(), "Ben", "b")
+        await hub.publish_event("p1", {"type": "deleted"})
+        assert [member["client_id"] for member in hub.presence("p1")] == ["a"]
+        assert alive.sent[-1] == {"type": "presence", "event": "leave", "client_id": "b", "user": "Ben"}
+
+    asyncio.run(run())
@@ -0,0 +1,109 @@
+"""
+Unit tests for delta-compressed revision history, on the embedded SQLite store.
+Run with: python -m pytest tests/test_revisions.py
+"""
+import asyncio
+import copy
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from embedded import EmbeddedClient  # noqa: E402
+from revisions import RevisionStore, apply_patch, make_patch  # noqa: E402
+
+
+def row(row_id, scene, **fields):
+    return {"id": row_id, "type": "item", "scene": scene, **fields}
+
+
+def project(rows, **fields):
+    return {"name": "Shoot", "days": [{"id": "d1", "date": "01-06-2030", "rows": rows}], **fields}
+
+
+def assert_round_trip(old, new):
+    patch = make_patch(old, new)
+    before = copy.deepcopy(old)
+    assert apply_patch(old, patch) == new
+    assert old == before
+
+
+def test_keyed_round_trips():
+    old = project([row("r1", "1"), row("r2", "2"), row("r3", "3")], notes="a")
+    assert make_patch(old, copy.deepcopy(old)) is None
+
+    assert_round_trip(old, project([row("r3", "3"), row("r1", "1A"), row("r4", "4")], logo_url="x"))
+    assert_round_trip(old, project([row("r0", "0"), row("r1", "1"), row("r2", "2"), row("r3", "3")]))
+    assert_round_trip(old, project([]))
+    assert_round_trip(project([]), old)
+    assert_round_trip(old, {"name": "Renamed"})
+
+
+def test_duplicate_ids_are_patched_by_position():
+    old = project([row("r1", "1"), row("r2", "2")])
+    # Pasted rows keep the id of the row they were copied from
+    pasted = project([row("r1", "1"), row("r1", "1 pasted"), row("r2", "2"), row("r2", "2 pasted")])
+
+    patch = make_patch(old, pasted)
+    rows_patch = patch["d"]["days"]["p"][0][1]["d"]["rows"]
+    assert rows_patch["n"] == 4
+    assert apply_patch(old, patch) == pasted
+
+    edited = copy.deepcopy(pasted)
+    edited["days"][0]["rows"][1]["cast"] = "Anna"
+    del edited["days"][0]["rows"][3]
+    assert_round_trip(pasted, edited)
+    assert_round_trip(pasted, old)
+
+
+def test_store_replays_patches_and_restores_duplicate_rows():
+    async def run():
+        store = RevisionStore(EmbeddedClient(":memory:")["test"]["revisions"], snapshot_interval=3)
+        await store.ensure_indexes()
+        versions = [
+            project([row("r1", "1")]),
+            project([row("r1", "1"), row("r1", "1 pasted")]),
+            project([row("r1", "1"), row("r1", "1 pasted"), row("r2", "2")]),
+            project([row("r2", "2"), row("r1", "1 pasted")]),
+            project([row("r2", "2B")]),
+        ]
+        previous = None
+        for version, content in enumerate(versions, start=1):
+            current = {**content, "_id": "p1", "version": version}
+            await store.record("p1", previous, current)
+            previous = current
+
+        listed = await store.list("p1")
+        assert [(rev["rev"], rev["kind"]) for rev in listed] == [
+            (5, "diff"), (4, "snapshot"), (3, "diff"), (2, "diff"), (1, "snapshot")
+        ]
+        for version, content in enumerate(versions, start=1):
+            assert await store.load("p1", version) == content
+        assert await store.load("p1", 9) is None
+
+    asyncio.run(run())
+
+
+def test_store_recovers_from_a_gap_with_a_snapshot():
+    async def run():
+        store = RevisionStore(EmbeddedClient(":memory:")["test"]["revisions"], snapshot_interval=10)
+        first = {**project([row("r1", "1")]), "version": 1}
+        await store.record("p1", None, first)
+
+        # Revision 2 was never recorded (say the process died after the write)
+        second = {**project([row("r1", "1"), row("r2", "2")]), "version": 2}
+        third = {**project([row("r1", "1"), row("r2", "2"), row("r3", "3")]), "version": 3}
+        await store.record("p1", second, third)
+        fourth = {**project([row("r3", "3")]), "version": 4}
+        await store.record("p1", third, fourth)
+
+        kinds = {rev["rev"]: rev["kind"] for rev in await store.list("p1")}
+        assert kinds == {1: "snapshot", 3: "snapshot", 4: "diff"}
+        assert await store.load("p1", 3) == project([row("r1", "1"), row("r2", "2"), row("r3", "3")])
+        assert await store.load("p1", 4) == project([row("r3", "3")])
+        assert await store.load("p1", 1) == project([row("r1", "1")])
+
+        await store.delete_project("p1")
+        assert await store.list("p1") == []
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+"""
+Unit tests for per-day production statistics.
+Run with: python -m pytest tests/test_stats.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from stats import compute_project_stats, day_stats  # noqa: E402
+
+
+def test_day_stats():
+    day = {"id": "d1", "date": "01-06-2030", "rows": [
+        {"type": "item", "time": "10:00-12:30", "location": "Studio", "cast": "Ben, Anna"},
+        {"type": "text", "notes": "Lunch"},
+        {"type": "item", "time": "08:00", "location": " studio ", "cast": "anna & Cleo"},
+        {"type": "item", "time": "", "location": "Beach", "cast": ""},
+    ]}
+    assert day_stats(day) == {
+        "day_id": "d1",
+        "date": "01-06-2030",
+        "scene_count": 3,
+        "text_rows": 1,
+        "locations": ["Beach", "Studio"],
+        "location_count": 2,
+        "cast": ["Anna", "Ben", "Cleo"],
+        "cast_count": 3,
+        "first_time": "08:00",
+        "last_time": "12:30",
+    }
+
+
+def test_day_without_times():
+    stats = day_stats({"date": "01-06-2030", "rows": [{"type": "text", "notes": "Travel"}]})
+    assert (stats["scene_count"], stats["first_time"], stats["last_time"]) == (0, None, None)
+
+
+def test_project_totals():
+    days = [
+        {"id": "d2", "date": "03-06-2030", "rows": [{"type": "item", "location": "Beach", "cast": "Anna"}]},
+        {"id": "d1", "date": "01-06-2030", "rows": [
+            {"type": "item", "location": "beach", "cast": "anna, Ben"},
+            {"type": "item", "location": "Studio", "cast": "Ben"},
+        ]},
+        {"id": "d3", "date": "not a date", "rows": []},
+    ]
+    stats = compute_project_stats(days)
+    assert [day["day_id"] for day in stats["days"]] == ["d2", "d1", "d3"]
+    assert stats["totals"] == {
+        "day_count": 3,
+        "scene_count": 3,
+        "location_count": 2,
+        "cast_count": 2,
+        "first_date": "01-06-2030",
+        "last_date": "03-06-2030",
+    }
+    assert compute_project_stats([])["totals"]["first_date"] is None
@@ -0,0 +1,215 @@
+"""
+Tests for the media storage backends, signed direct uploads and the presigned upload flow.
+Run with: python -m pytest tests/test_storage.py
+"""
+import asyncio
+import datetime
+import time
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+
+import storage
+from storage import LocalMediaStorage, S3MediaStorage
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"x" * 100
+
+
+def test_local_storage(tmp_path):
+    async def run():
+        media = LocalMediaStorage(tmp_path, b"secret")
+        await media.save("a.png", PNG, "image/png")
+        assert await media.stat("a.png") == len(PNG)
+        assert await media.load("a.png") == PNG
+        assert await media.stat("missing.png") is None
+        assert await media.load("missing.png") is None
+
+        await media.delete_many(["a.png", "missing.png"])
+        assert await media.stat("a.png") is None
+        with pytest.raises(ValueError):
+            await media.save("../escape.png", PNG, "image/png")
+
+    asyncio.run(run())
+
+
+def test_signed_upload_urls(tmp_path):
+    media = LocalMediaStorage(tmp_path, b"secret")
+    expires = int(time.time()) + 60
+    signature = media.sign("a.png", "image/png", 100, expires)
+
+    assert media.verify("a.png", "image/png", 100, expires, signature)
+    assert not media.verify("a.png", "image/png", 100, expires, "0" * len(signature))
+    # Every signed field is covered
+    assert not media.verify("b.png", "image/png", 100, expires, signature)
+    assert not media.verify("a.png", "image/jpeg", 100, expires, signature)
+    assert not media.verify("a.png", "image/png", 1000, expires, signature)
+    assert not LocalMediaStorage(tmp_path, b"other").verify("a.png", "image/png", 100, expires, signature)
+
+    past = int(time.time()) - 1
+    assert not media.verify("a.png", "image/png", 100, past, media.sign("a.png", "image/png", 100, past))
+
+
+def test_streamed_upload_is_capped(tmp_path):
+    async def chunks(count):
+        for _ in range(count):
+            yield b"x" * 10
+
+    async def run():
+        media = LocalMediaStorage(tmp_path, b"secret")
+        assert await media.write_stream("a.png", chunks(3), 30) == 30
+        with pytest.raises(ValueError):
+            await media.write_stream("b.png", chunks(4), 30)
+        # Neither the refused file nor its partial upload is left behind
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["a.png"]
+
+    asyncio.run(run())
+
+
+class FakeS3:
+    """Just enough of a boto3 S3 client for S3MediaStorage"""
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.objects[Key] = Body
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey()
+        body = self.objects[Key]
+        return {"Body": type("Body", (), {"read": lambda self: body})()}
+
+    def delete_objects(self, Bucket, Delete):
+        self.calls.append(len(Delete["Objects"]))
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+
+    def get_paginator(self, name):
+        objects = self.objects
+        modified = datetime.datetime(2030, 6, 1, tzinfo=datetime.timezone.utc)
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(key for key in objects if key.startswith(Prefix))
+                for start in range(0, len(keys), 2):
+                    yield {"Contents": [
+                        {"Key": key, "Size": len(objects[key]), "LastModified": modified} for key in keys[start:start + 2]
+                    ]}
+
+        return Paginator()
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.example/{Params['Key']}?expires={ExpiresIn}"
+
+    def generate_presigned_post(self, Bucket, Key, Fields, Conditions, ExpiresIn):
+        self.calls.append(Conditions)
+        return {"url": f"https://s3.example/{Bucket}", "fields": {"key": Key, **Fields}}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(boto3, "client", lambda *args, **kwargs: fake)
+    return fake
+
+
+def test_s3_storage(s3):
+    async def run():
+        media = S3MediaStorage("bucket", prefix="logos/")
+        await media.save("a.png", PNG, "image/png")
+        await media.save("b.png", b"b", "image/png")
+        await media.save("c.png", b"cc", "image/png")
+        assert list(s3.objects) == ["logos/a.png", "logos/b.png", "logos/c.png"]
+        assert await media.stat("a.png") == len(PNG)
+        assert await media.stat("missing.png") is None
+        assert await media.load("b.png") == b"b"
+        assert await media.load("missing.png") is None
+
+        listed = [item async for item in media.iter_objects()]
+        assert [(key, size) for key, size, _ in listed] == [("a.png", len(PNG)), ("b.png", 1), ("c.png", 2)]
+
+        assert await media.download_url("a.png") == "https://s3.example/logos/a.png?expires=3600"
+        target = await media.presign_upload("d.png", "image/png", 500, 60)
+        assert target == {"method": "POST", "url": "https://s3.example/bucket",
+                          "fields": {"key": "logos/d.png", "Content-Type": "image/png"}}
+        assert ["content-length-range", 1, 500] in s3.calls[-1]
+
+        await media.delete_many([f"{index}.png" for index in range(1500)] + ["a.png"])
+        assert s3.calls[-2:] == [1000, 501]
+        assert "logos/a.png" not in s3.objects
+
+    asyncio.run(run())
+
+
+def test_s3_public_urls(s3):
+    media = S3MediaStorage("bucket", prefix="logos/", public_base_url="https://cdn.example/")
+    assert asyncio.run(media.download_url("a.png")) == "https://cdn.example/logos/a.png"
+
+
+def test_storage_from_env(tmp_path, monkeypatch, s3):
+    monkeypatch.setenv("MEDIA_STORAGE", "s3")
+    monkeypatch.setenv("S3_BUCKET", "bucket")
+    assert isinstance(storage.storage_from_env(tmp_path), S3MediaStorage)
+    monkeypatch.setenv("MEDIA_STORAGE", "local")
+    monkeypatch.setenv("MEDIA_SIGNING_SECRET", "shared")
+    local = storage.storage_from_env(tmp_path)
+    assert isinstance(local, LocalMediaStorage) and local.signing_secret == b"shared"
+
+
+def presign(api, size=len(PNG), content_type="image/png"):
+    return api.post("/api/uploads/logo/presign", json={"filename": "logo.png", "content_type": content_type, "size": size})
+
+
+def test_presigned_upload_flow(api, media):
+    presigned = presign(api)
+    assert presigned.status_code == 200
+    key, target = presigned.json()["key"], presigned.json()["upload"]
+    assert target["method"] == "PUT"
+
+    # Completing before the bytes arrived is refused, as is an unknown key
+    assert api.post("/api/uploads/logo/complete", json={"key": key}).status_code == 400
+    assert api.post("/api/uploads/logo/complete", json={"key": "unknown.png"}).status_code == 404
+
+    uploaded = api.put(target["url"], content=PNG, headers=target["headers"])
+    assert uploaded.status_code == 200
+    assert uploaded.json() == {"success": True, "size": len(PNG)}
+
+    completed = api.post("/api/uploads/logo/complete", json={"key": key})
+    assert completed.status_code == 200
+    assert completed.json() == {"success": True, "url": f"/api/media/{key}", "filename": key}
+    assert (media.root / key).read_bytes() == PNG
+
+    assert presign(api, content_type="image/gif").status_code == 400
+    assert presign(api, size=6 * 1024 * 1024).status_code == 400
+
+
+def test_direct_upload_rejections(api, media):
+    target = presign(api).json()["upload"]
+    url, query = target["url"].split("?")
+    params = dict(pair.split("=") for pair in query.split("&"))
+
+    tampered = f"{url}?expires={params['expires']}&max_bytes={params['max_bytes']}&signature={'0' * 64}"
+    assert api.put(tampered, content=PNG, headers=target["headers"]).status_code == 403
+    assert api.put(target["url"], content=PNG, headers={"Content-Type": "image/jpeg"}).status_code == 403
+
+    key = url.rsplit("/", 1)[1]
+    expires = int(time.time()) - 1
+    signature = media.sign(key, "image/png", int(params["max_bytes"]), expires)
+    expired = f"{url}?expires={expires}&max_bytes={params['max_bytes']}&signature={signature}"
+    assert api.put(expired, content=PNG, headers=target["headers"]).status_code == 403
+
+    oversized = api.put(target["url"], content=b"x" * (int(params["max_bytes"]) + 1), headers=target["headers"])
+    assert oversized.status_code == 413
+    assert list(media.root.iterdir()) == []
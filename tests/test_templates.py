@@ -0,0 +1,109 @@
+"""
+Unit tests for copy-on-write template days, on the embedded SQLite store.
+Run with: python -m pytest tests/test_templates.py
+"""
+import asyncio
+import copy
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from embedded import EmbeddedClient  # noqa: E402
+from templates import SharedDayStore, day_hash, is_day_ref, make_day_ref  # noqa: E402
+
+
+def template_days():
+    return [
+        {"id": "d1", "date": "01-06-2030", "position": 0,
+         "rows": [{"id": "r1", "type": "item", "scene": "1", "cast": "Anna"}]},
+        {"id": "d2", "date": "02-06-2030", "position": 1,
+         "rows": [{"id": "r2", "type": "item", "scene": "2", "cast": "Ben"}]},
+    ]
+
+
+def store():
+    return SharedDayStore(EmbeddedClient(":memory:")["test"]["shared_days"])
+
+
+def test_share_stores_each_content_once():
+    async def run():
+        shared_days = store()
+        days = template_days()
+        # Same content on another date id shares the same hash
+        days.append({**copy.deepcopy(days[0]), "id": "d3", "position": 2})
+        tagged = await shared_days.share(days)
+
+        assert [day["shared_day"] for day in tagged] == [day_hash(day) for day in days]
+        assert tagged[0]["shared_day"] == tagged[2]["shared_day"]
+        assert await shared_days.collection.count_documents({}) == 2
+
+        # Sharing again (a later template save) adds nothing
+        await shared_days.share(tagged)
+        assert await shared_days.collection.count_documents({}) == 2
+
+    asyncio.run(run())
+
+
+def test_stubs_resolve_to_shared_content():
+    async def run():
+        shared_days = store()
+        tagged = await shared_days.share(template_days())
+        stubs = [make_day_ref({**day, "rank": rank}) for day, rank in zip(tagged, ["V", "a"])]
+        assert all(is_day_ref(stub) for stub in stubs)
+        assert "rows" not in stubs[0]
+
+        resolved = await shared_days.resolve({"name": "Copy", "days": stubs})
+        assert [day["rows"] for day in resolved["days"]] == [day["rows"] for day in template_days()]
+        assert [day["rank"] for day in resolved["days"]] == ["V", "a"]
+        assert all("shared_day" not in day for day in resolved["days"])
+
+    asyncio.run(run())
+
+
+def test_compact_keeps_unedited_days_as_stubs():
+    async def run():
+        shared_days = store()
+        stubs = [make_day_ref(day) for day in await shared_days.share(template_days())]
+        edited = (await shared_days.resolve({"days": stubs}))["days"]
+        edited[1]["rows"][0]["cast"] = "Cleo"
+
+        compacted = shared_days.compact(edited, stubs)
+        assert compacted[0] == stubs[0]
+        assert not is_day_ref(compacted[1]) and "shared_day" not in compacted[1]
+        assert compacted[1]["rows"][0]["cast"] == "Cleo"
+
+        # Without stubs in the stored version there is nothing to compact
+        assert shared_days.compact(edited, template_days()) is edited
+
+    asyncio.run(run())
+
+
+def test_editing_one_copy_leaks_nowhere():
+    async def run():
+        shared_days = store()
+        template = {"name": "Template", "is_template": True, "days": await shared_days.share(template_days())}
+        copy_a = {"name": "A", "days": [make_day_ref(day) for day in template["days"]]}
+        copy_b = {"name": "B", "days": [make_day_ref(day) for day in template["days"]]}
+
+        # Copy A edits its first day and is saved the way the server does it
+        view = await shared_days.resolve(copy_a)
+        view["days"][0]["rows"][0]["scene"] = "1 (reshoot)"
+        copy_a["days"] = shared_days.compact(view["days"], copy_a["days"])
+
+        resolved_a = await shared_days.resolve(copy_a)
+        resolved_b = await shared_days.resolve(copy_b)
+        resolved_template = await shared_days.resolve(template)
+        assert resolved_a["days"][0]["rows"][0]["scene"] == "1 (reshoot)"
+        assert resolved_b["days"][0]["rows"][0]["scene"] == "1"
+        assert resolved_template["days"][0]["rows"][0]["scene"] == "1"
+        assert is_day_ref(copy_a["days"][1]) and is_day_ref(copy_b["days"][0])
+
+        # A template edit is new shared content; the copies keep the old one
+        edited = copy.deepcopy(resolved_template["days"])
+        edited[1]["rows"][0]["cast"] = "Dora"
+        template["days"] = await shared_days.share(edited)
+        assert (await shared_days.resolve(copy_b))["days"][1]["rows"][0]["cast"] == "Ben"
+        assert (await shared_days.resolve(template))["days"][1]["rows"][0]["cast"] == "Dora"
+
+    asyncio.run(run())
@@ -0,0 +1,112 @@
+"""
+Tests for request ids, the JSON access log and the slow-operation log.
+Run with: python -m pytest tests/test_tracing.py
+"""
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from tracing import JsonFormatter, RequestContextFilter, SlowOperationListener, current_request
+
+
+class Captured(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(record.getMessage()))
+
+
+@pytest.fixture
+def captured():
+    """JSON lines written to the access and slow_operations loggers"""
+    handler = Captured()
+    loggers = [logging.getLogger(name) for name in ("access", "slow_operations")]
+    for logger in loggers:
+        logger.addHandler(handler)
+    yield handler.lines
+    for logger in loggers:
+        logger.removeHandler(handler)
+
+
+def test_access_log_has_request_id_and_route(api, captured):
+    project_id = api.post("/api/projects/save", json={"name": "Traced", "days": []}).json()["id"]
+
+    response = api.get(f"/api/projects/{project_id}", headers={"X-Request-ID": "trace-123"})
+    assert response.headers["X-Request-ID"] == "trace-123"
+    line = captured[-1]
+    assert line["type"] == "access"
+    assert line["request_id"] == "trace-123"
+    assert line["method"] == "GET"
+    assert line["route"] == "/api/projects/{project_id}"
+    assert line["path"] == f"/api/projects/{project_id}"
+    assert line["project_id"] == project_id
+    assert line["status"] == 200
+    assert line["duration_ms"] >= 0
+
+
+def test_invalid_request_ids_are_replaced(api, captured):
+    response = api.get("/api/projects/000000000000000000000000", headers={"X-Request-ID": "not valid!"})
+    assert response.status_code == 404
+    request_id = response.headers["X-Request-ID"]
+    assert request_id != "not valid!" and len(request_id) == 32
+    assert captured[-1]["request_id"] == request_id
+    assert captured[-1]["status"] == 404
+
+
+def request_context(path="/api/projects/p1", route_path="/api/projects/{project_id}"):
+    scope = {
+        "type": "http", "method": "PUT", "path": path,
+        "route": SimpleNamespace(path=route_path), "path_params": {"project_id": "p1"},
+    }
+    return current_request.set({"id": "req-1", "scope": scope})
+
+
+def test_log_records_carry_the_request():
+    record = logging.LogRecord("server", logging.ERROR, __file__, 1, "Save failed: %s", ("boom",), None)
+    token = request_context()
+    try:
+        RequestContextFilter().filter(record)
+    finally:
+        current_request.reset(token)
+    line = json.loads(JsonFormatter().format(record))
+    assert line["message"] == "Save failed: boom"
+    assert (line["level"], line["logger"]) == ("ERROR", "server")
+    assert (line["request_id"], line["route"], line["project_id"]) == ("req-1", "/api/projects/{project_id}", "p1")
+
+    outside = logging.LogRecord("server", logging.INFO, __file__, 1, "Startup", (), None)
+    RequestContextFilter().filter(outside)
+    assert outside.request_id == "-"
+    assert "request_id" not in json.loads(JsonFormatter().format(outside))
+
+
+def command_event(request_id, command_name, command, duration_ms=0):
+    return SimpleNamespace(
+        connection_id=("localhost", 27017), request_id=request_id, command_name=command_name,
+        command=command, database_name="filmschedule", duration_micros=int(duration_ms * 1000),
+    )
+
+
+def test_slow_operations_are_logged_with_their_request(captured):
+    listener = SlowOperationListener(threshold_ms=50)
+    token = request_context()
+    try:
+        listener.started(command_event(1, "find", {"find": "projects", "filter": {"name": "Secret", "workspace": "w"}}))
+        listener.started(command_event(2, "update", {"update": "projects", "updates": [{"q": {"_id": 1}}]}))
+    finally:
+        current_request.reset(token)
+
+    listener.succeeded(command_event(1, "find", {}, duration_ms=120))
+    listener.succeeded(command_event(2, "update", {}, duration_ms=5))
+    assert len(captured) == 1
+    line = captured[0]
+    assert line["type"] == "slow_operation"
+    assert (line["command"], line["collection"], line["duration_ms"]) == ("find", "projects", 120)
+    # Field names only, never the values
+    assert line["filter_keys"] == ["name", "workspace"]
+    assert "Secret" not in json.dumps(line)
+    assert (line["request_id"], line["route"], line["project_id"]) == ("req-1", "/api/projects/{project_id}", "p1")
+    assert listener._pending == {}
@@ -0,0 +1,73 @@
+"""
+Unit tests for the orphaned upload collector, on local media storage and the embedded SQLite store.
+Run with: python -m pytest tests/test_upload_gc.py
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from embedded import EmbeddedClient  # noqa: E402
+from storage import LocalMediaStorage  # noqa: E402
+from upload_gc import collect_orphaned_uploads, delete_unreferenced  # noqa: E402
+
+DAY = 24 * 3600
+
+
+async def uploads(tmp_path, db):
+    """A referenced, an orphaned and a recent upload, the first two a week old"""
+    storage = LocalMediaStorage(tmp_path, b"secret")
+    for key in ("kept.png", "orphan.png", "recent.png"):
+        await storage.save(key, b"x" * 10, "image/png")
+        await db.media.insert_one({"_id": key, "status": "ready"})
+    week_ago = time.time() - 7 * DAY
+    for key in ("kept.png", "orphan.png"):
+        os.utime(tmp_path / key, (week_ago, week_ago))
+    await db.projects.insert_one({"name": "Logo", "logo_url": "/api/media/kept.png"})
+    return storage
+
+
+def test_collects_orphans_and_their_records(tmp_path):
+    async def run():
+        db = EmbeddedClient(":memory:")["test"]
+        storage = await uploads(tmp_path, db)
+
+        report = await collect_orphaned_uploads(
+            storage, [db.projects, db.projects_cold], DAY, dry_run=True, media=db.media
+        )
+        assert (report["deleted"], report["referenced"], report["recent"]) == (1, 1, 1)
+        assert (tmp_path / "orphan.png").exists()
+
+        report = await collect_orphaned_uploads(storage, [db.projects, db.projects_cold], DAY, media=db.media)
+        assert report["reclaimed_bytes"] == 10
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["kept.png", "recent.png"]
+        assert sorted(doc["_id"] for doc in await db.media.find({}).to_list(length=None)) == ["kept.png", "recent.png"]
+
+    asyncio.run(run())
+
+
+def test_delete_unreferenced_spares_referenced_uploads(tmp_path):
+    async def run():
+        db = EmbeddedClient(":memory:")["test"]
+        storage = await uploads(tmp_path, db)
+        assert await delete_unreferenced(storage, [db.projects], ["kept.png", "recent.png", ""]) == ["recent.png"]
+        assert await storage.stat("recent.png") is None
+        assert await storage.stat("kept.png") == 10
+
+    asyncio.run(run())
+
+
+def test_local_listing_in_batches(tmp_path):
+    async def run():
+        storage = LocalMediaStorage(tmp_path, b"secret")
+        for index in range(5):
+            await storage.save(f"{index}.png", b"x" * index, "image/png")
+        (tmp_path / "nested").mkdir()
+
+        listed = [item async for item in storage.iter_objects(batch_size=2)]
+        assert sorted((key, size) for key, size, _ in listed) == [(f"{index}.png", index) for index in range(5)]
+
+    asyncio.run(run())
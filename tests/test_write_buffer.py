@@ -0,0 +1,147 @@
+"""
+Unit tests for the write-behind buffer that coalesces project saves.
+Run with: python -m pytest tests/test_write_buffer.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from write_buffer import WriteBehindBuffer  # noqa: E402
+
+
+class Recorder:
+    def __init__(self, fail_times=0):
+        self.writes = []
+        self.fail_times = fail_times
+
+    async def __call__(self, key, payload):
+        self.writes.append((key, payload))
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("database unavailable")
+        return {"key": key, "payload": payload, "version": len(self.writes)}
+
+
+def test_saves_within_the_window_become_one_write():
+    async def run():
+        flush = Recorder()
+        buffer = WriteBehindBuffer(flush, 0.05, combine=lambda pending, latest: {**pending, **latest})
+        results = await asyncio.gather(
+            buffer.submit("p1", {"name": "A", "notes": "x"}),
+            buffer.submit("p1", {"name": "B"}),
+            buffer.submit("p2", {"name": "Other"}),
+        )
+        assert sorted(flush.writes, key=lambda write: write[0]) == [
+            ("p1", {"name": "B", "notes": "x"}),
+            ("p2", {"name": "Other"}),
+        ]
+        # Every caller is acknowledged with the write that persisted its save
+        assert results[0] is results[1]
+        assert results[0]["payload"] == {"name": "B", "notes": "x"}
+        assert buffer._slots == {}
+
+    asyncio.run(run())
+
+
+def test_latest_payload_wins_without_combine():
+    async def run():
+        flush = Recorder()
+        buffer = WriteBehindBuffer(flush, 0.05)
+        await asyncio.gather(buffer.submit("p1", 1), buffer.submit("p1", 2), buffer.submit("p1", 3))
+        assert flush.writes == [("p1", 3)]
+
+    asyncio.run(run())
+
+
+def test_save_during_a_write_gets_a_write_of_its_own():
+    async def run():
+        release = asyncio.Event()
+        writes = []
+
+        async def slow_flush(key, payload):
+            writes.append(payload)
+            if len(writes) == 1:
+                await release.wait()
+            return payload
+
+        buffer = WriteBehindBuffer(slow_flush, 0.01)
+        first = asyncio.create_task(buffer.submit("p1", "first"))
+        while not writes:
+            await asyncio.sleep(0.005)
+        second = asyncio.create_task(buffer.submit("p1", "second"))
+        await asyncio.sleep(0.02)
+        release.set()
+        assert await first == "first"
+        assert await second == "second"
+        assert writes == ["first", "second"]
+
+    asyncio.run(run())
+
+
+def test_flush_all_writes_pending_saves_at_once():
+    async def run():
+        flush = Recorder()
+        buffer = WriteBehindBuffer(flush, 60)
+        pending = [asyncio.create_task(buffer.submit(key, key.upper())) for key in ("p1", "p2")]
+        await asyncio.sleep(0)
+        assert flush.writes == []
+
+        await asyncio.wait_for(buffer.flush_all(), 1)
+        assert sorted(flush.writes) == [("p1", "P1"), ("p2", "P2")]
+        assert [result["payload"] for result in await asyncio.gather(*pending)] == ["P1", "P2"]
+
+    asyncio.run(run())
+
+
+def test_failed_write_reaches_every_waiter_and_the_key_recovers():
+    async def run():
+        flush = Recorder(fail_times=1)
+        buffer = WriteBehindBuffer(flush, 0.02)
+        results = await asyncio.gather(
+            buffer.submit("p1", "a"), buffer.submit("p1", "b"), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert buffer._slots == {}
+
+        result = await buffer.submit("p1", "c")
+        assert result["payload"] == "c"
+        assert flush.writes == [("p1", "b"), ("p1", "c")]
+
+    asyncio.run(run())
+
+
+def test_zero_window_writes_through():
+    async def run():
+        flush = Recorder(fail_times=1)
+        buffer = WriteBehindBuffer(flush, 0)
+        with pytest.raises(RuntimeError):
+            await buffer.submit("p1", "a")
+        assert (await buffer.submit("p1", "b"))["version"] == 2
+
+    asyncio.run(run())
+
+
+def test_cancelled_writer_does_not_leave_callers_waiting():
+    async def run():
+        started = asyncio.Event()
+
+        async def hanging_flush(key, payload):
+            started.set()
+            await asyncio.Event().wait()
+
+        buffer = WriteBehindBuffer(hanging_flush, 0.01)
+        writing = asyncio.create_task(buffer.submit("p1", "a"))
+        await started.wait()
+        queued = asyncio.create_task(buffer.submit("p1", "b"))
+        await asyncio.sleep(0)
+        buffer._slots["p1"].task.cancel()
+        for caller in (writing, queued):
+            with pytest.raises(asyncio.CancelledError):
+                await asyncio.wait_for(caller, 1)
+        assert buffer._slots == {}
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+"""
+Tests for the Excel export, read back with openpyxl.
+Run with: python -m pytest tests/test_xlsx_export.py
+"""
+import io
+
+from openpyxl import load_workbook
+
+from xlsx_export import sheet_title, write_project_xlsx
+
+
+def render(project):
+    output = io.BytesIO()
+    write_project_xlsx(project, output)
+    output.seek(0)
+    return load_workbook(output)
+
+
+def values(sheet):
+    return [list(row) for row in sheet.iter_rows(values_only=True)]
+
+
+def test_sheet_titles():
+    used = set()
+    assert sheet_title("Day 1 01/06/2030: [Studio]", used) == "Day 1 01-06-2030- -Studio-"
+    assert sheet_title("Calltimes", used) == "Calltimes"
+    assert sheet_title("calltimes", used) == "calltimes (2)"
+    assert sheet_title("x" * 40, used) == "x" * 31
+    assert sheet_title("x" * 40, used) == "x" * 27 + " (2)"
+    assert sheet_title("", used) == "Sheet"
+
+
+def test_days_and_calltimes():
+    workbook = render({
+        "name": "Shoot",
+        "column_headers": {"scene": "Szene"},
+        "column_widths": {"notes": 50},
+        "days": [
+            {"date": "01-06-2030", "rows": [
+                {"type": "item", "time": "08:00", "scene": "1", "location": "Studio", "cast": "Anna", "notes": ""},
+                {"type": "text", "notes": "Lunch"},
+            ]},
+            {"date": "02-06-2030", "rows": []},
+        ],
+        "calltimes": [{"title": "Calls", "headers": {"name": "Crew"}, "rows": [
+            {"type": "item", "time": "07:00", "name": "Anna"},
+            {"type": "text", "name": "Catering"},
+        ]}],
+    })
+    assert workbook.sheetnames == ["Day 1 01-06-2030", "Day 2 02-06-2030", "Calltimes"]
+
+    day = workbook["Day 1 01-06-2030"]
+    assert values(day) == [
+        ["Time", "Szene", "Location", "Cast", "Notes"],
+        ["08:00", "1", "Studio", "Anna", None],
+        ["Lunch", None, None, None, None],
+    ]
+    assert day["A1"].font.bold and day["A3"].font.italic
+    assert day.freeze_panes == "A2"
+    assert day.column_dimensions["E"].width == 60
+    assert day.column_dimensions["A"].width == 18
+
+    assert values(workbook["Calltimes"]) == [
+        ["Calls", None],
+        ["Time", "Crew"],
+        ["07:00", "Anna"],
+        ["Catering", None],
+    ]
+
+
+def test_project_without_days_still_has_a_sheet():
+    workbook = render({"name": "Empty", "days": [], "calltimes": []})
+    assert workbook.sheetnames == ["Calltimes"]
+    assert values(workbook["Calltimes"]) == []
+
+
+def test_export_endpoint(api):
+    project_id = api.post("/api/projects/save", json={
+        "name": "Excel Export",
+        "days": [{"date": "01-06-2030", "rows": [{"type": "item", "scene": "7", "cast": "Ben"}]}],
+    }).json()["id"]
+
+    response = api.get(f"/api/projects/{project_id}/export.xlsx")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    workbook = load_workbook(io.BytesIO(response.content))
+    assert values(workbook["Day 1 01-06-2030"])[1] == [None, "7", None, "Ben", None]
+
+    assert api.get("/api/projects/000000000000000000000000/export.xlsx").status_code == 404